@@ -25,11 +25,82 @@ import os
 import json
 import re
 import copy
+import functools
+import hashlib
+import io
+import itertools
+
+from .scrape_cache import ScrapeCache
+from .record_index import RecordIndex
+from .query_cache import QueryCache
+from .layout import LayoutEngine
+from .type_names import TypeNames
+from .const_expr import ConstantEvaluator
+from .codec import Codecs
+from .dtypes import Dtypes
+from .ctype_classes import CtypeClasses
+from .address_index import AddressIndex
+from . import snapshot
+from . import readelf
+from . import elf
+from . import dwarf
+from . import mapfile
+from .json_stream import write_sections, JsonStreamReader
+from .records import copy_value, load_record, typedef_fingerprint, typedef_differences, VariableRecord, \
+                     FunctionRecord, EnumRecord, EnumValueRecord, TypedefRecord, TypedefElementRecord
+
+
+# A pre-processor directive, from the start of its line. Spaces and '/* */' comments may come before the '#'
+# e.g. '/* c */ #define X 1'. Comments and backslash-newline continuations are part of the directive.
+_DIRECTIVE = r'''(?:[ \t]|/\*(?:[^*]|\*(?!/))*\*/)*\#(?:[^\n\\/]+|\\.?|/\*.*?(?:\*/|\Z)|//[^\n]*|/)*'''
+_DIRECTIVE_RE = re.compile(_DIRECTIVE, re.DOTALL)
+
+# Tokens that CScrape.sanitize() has to recognise in a single pass over the C source.
+#   comment   - '//' or '/* */' comments (an unterminated '/*' runs to the end of the source)
+#   string    - string and character literals. These are kept, but must be skipped so that '//' etc. inside
+#               them are not mistaken for comments.
+#   directive - A pre-processor line (see _DIRECTIVE), including the newline before it.
+#   keyword   - Compiler extensions that pycparser does not understand.
+# The look ahead at the start lets the regex engine skip quickly over characters that can not start a token.
+_SANITIZE_RE = re.compile(r'''(?=[/"'_\n])(?:
+      (?P<comment>//[^\n]*|/\*.*?(?:\*/|\Z))
+    | (?P<string>"(?:\\.|[^"\\\n])*"?|'(?:\\.|[^'\\\n])*'?)
+    | (?P<directive>\n''' + _DIRECTIVE + r''')
+    | (?P<keyword>(?<![\w$])__(?:attribute__|declspec|asm__|asm|extension__)\b)
+    )''', re.DOTALL | re.VERBOSE)
+
+# Tokens that matter when looking for the bracket matching the '(' after an attribute/asm keyword.
+_BRACKET_RE = re.compile(r'''"(?:\\.|[^"\\\n])*"?|'(?:\\.|[^'\\\n])*'?|/\*.*?(?:\*/|\Z)|//[^\n]*|[()]''', re.DOTALL)
+
+# Whitespace and qualifiers that may appear between an asm keyword and its '('. e.g. '__asm__ __volatile__ ("nop")'
+_ASM_QUALIFIERS_RE = re.compile(r'(?:\s|\b(?:volatile|__volatile__|__volatile|inline|__inline__|goto)\b)*')
+_WHITESPACE_RE = re.compile(r'\s*')
+
+# '#include "file.h"' directive (includes using <file.h> are not followed), or a conditional directive. See
+# CScrape.find_includes()
+_INCLUDE_RE = re.compile(r'^[ \t]*#[ \t]*(?:include[ \t]*"([^"\n]+)"|(if|ifdef|ifndef|elif|else|endif)\b(.*))',
+                         re.MULTILINE)
+
+# A C identifier. See CScrape.scrape_cache_key()
+_IDENTIFIER_RE = re.compile(r'\b[A-Za-z_]\w*')
+
+# Keywords which may start a declaration that CScrape records within a function body
+_BODY_DECLARATIONS_RE = re.compile(r'\b(?:static|enum|typedef)\b')
+
+# File extensions of C header files. Each header is only parsed once. See CScrape.parse_file()
+HEADER_EXTENSIONS = ('.h', '.hh', '.hpp', '.hxx')
 
 
 class CScrape():
     class objx: 
         pass
+
+    # The pycparser parser shared by all CScrape objects. It is built the first time it is needed.
+    # See get_parser()
+    shared_parser = None
+    # Folder that pycparser v2.x writes its PLY lexer and parser tables to. See set_parser_table_dir()
+    parser_table_dir = None
+
     def __init__(self, debug_level=0):
         self.functions = []
         # The typdef member is a dict whose key is the typedef name and has the following keys
@@ -47,6 +118,9 @@ class CScrape():
         #      'ptr'         - Number of ptr specifiers. E.g. 'int**' would be 2.
         #      'offset'      - Bit offset of the element from the start of the list
         #      'size'        - Bit size of the element
+        #      'alignment'   - Alignment of the element in bits
+        #      'bit_field'   - Only present (and True) for a bit field e.g. 'unsigned x:3;'. 'size' is its width.
+        #      'types'       - Only present for a struct or union defined within the struct. List of its elements.
         self.typedefs = dict()
 
         # The variables member is an array of dict items with following keys
@@ -82,13 +156,31 @@ class CScrape():
         # Note: The naming of the types follows the naming defined in collate_types()
         self.types = dict()
 
-        self.previous_queries = dict() # Speeds up access to previously searched for queries
+        self.type_names = TypeNames()  # Canonical type names. See collate_types()
+        self.evaluator = ConstantEvaluator(self) # Evaluates constant expressions. See GetValue()
+        self.layout_engine = LayoutEngine(self) # Layouts of the types. See layout()
+        self.codecs = Codecs(self)     # Codecs of the variables and types. See codec()
+        self.dtypes = Dtypes(self)     # NumPy dtypes of the variables and types. See numpy_dtype()
+        self.ctype_classes = CtypeClasses(self) # ctypes classes of the variables and types. See ctype()
+        self.address_index = AddressIndex(self) # Variables and functions by address. See addr_lookup()
+        self.query_cache = QueryCache() # Results of previous var(), enum() and enum_type() queries
+        self.reset_indexes()
+        self.snapshot = None           # Snapshot the records are read from. See snapshot_load()
+        self.scrape_cache = None       # ScrapeCache object holding the results of previous parses. See set_scrape_cache()
+        self.typedefs_digest = None    # [typedefs, number hashed, hash] of the typedefs. See scrape_cache_key()
+        self.include_paths = []        # Folders searched for '#include "file.h"' after the folder of the including file
+        self.parsed_headers = dict()   # (real path, content hash) of each header parsed. The value is a list of the
+                                       # typedef names declared by the header (and the headers it includes).
+        self.typedef_names = []        # Names of typedefs declared by the source in the last parse_string() call.
+        self.injected_lines = set()    # Lines of the source holding typedefs from included headers. See parse_string()
         self.debug_level = debug_level # Debug output level
         self.source_lines = []         # Parsed source lines of previous parse call.
         self.within_function = None    # Set to the function name when processing inside a function.
-        self.level = 0                 # Set to the 'child' level currently processing
+        self.ignore_until_line_no = 0  # Nodes before this line are ignored (e.g. struct elements already processed)
+        self.last_line = 0             # Last source line printed (debug output)
         self.filename = None
         self.enum_type_mix = None
+        self.enum_values = None        # Values of the enum being processed. See enum_constant()
         self.class_name = 'CScrape'
         self.types['int8_t']             = { 'bit_size': 8, 'alignment': 8, 'signed': True  }
         self.types['uint8_t']            = { 'bit_size': 8, 'alignment': 8, 'signed': False }
@@ -149,6 +241,8 @@ class CScrape():
         self.POINTER_SIZE      = 32
         self.DEFAULT_ALIGNMENT = 32
         self.STRUCT_ALIGNMENT  = 32
+        self.type_names.rebuild(self.DEFAULT_CHAR_SIGN)
+        self.layout_engine.reset()
 
         
     # Take an array of type names, e.g. ['short', 'int'] and return a single name e.g. 'signed short'    
@@ -159,45 +253,19 @@ class CScrape():
     #   unsigned short int   --> unsigned short
     #   short unsigned int   --> unsigned short
     #   short int unsigned   --> unsigned short
+    # The names are looked up in a table built for the configuration (see type_names.TypeNames), so each
+    # name is only worked out once. The list of names is not changed.
     def collate_types(self, names):
-        # Sort the list into alphabetical order
-        names.sort();
-        str = ''
-        for n in names:
-            if n != '':
-                str += n + ' '
-        str = str[:-1]
-        # int
-        if str == 'int':                      str = 'signed int'
-        if str == 'int unsigned':             str = 'unsigned int'
-        if str == 'int signed':               str = 'signed int'
-        # short
-        if str == 'short':                    str = 'signed short'
-        if str == 'short unsigned':           str = 'unsigned short'
-        if str == 'short signed':             str = 'signed short'
-        if str == 'int short':                str = 'signed short'
-        if str == 'int short unsigned':       str = 'unsigned short'
-        if str == 'int short signed':         str = 'signed short'
-        # char
-        if str == 'char':                     str = self.DEFAULT_CHAR_SIGN + ' char'
-        if str == 'char unsigned':            str = 'unsigned char'
-        if str == 'char signed':              str = 'signed char'
-        # long
-        if str == 'long':                     str = 'signed long'
-        if str == 'long unsigned':            str = 'unsigned long'
-        if str == 'long signed':              str = 'signed long'
-        if str == 'int long':                 str = 'signed long'
-        if str == 'int long unsigned':        str = 'unsigned long'
-        if str == 'int long signed':          str = 'signed long'
-        # long long
-        if str == 'long long':                str = 'signed long long'
-        if str == 'long long unsigned':       str = 'unsigned long long'
-        if str == 'lobg long signed':         str = 'signed long long'
-        if str == 'int long long':            str = 'signed long long'
-        if str == 'int long long unsigned':   str = 'unsigned long long'
-        if str == 'int long long signed':     str = 'signed long long'
-
-        return str
+        if self.type_names.default_char_sign != self.DEFAULT_CHAR_SIGN:
+            self.type_names.rebuild(self.DEFAULT_CHAR_SIGN)
+        return self.type_names.collate(names)
+
+
+    # As collate_types(), but for a type name string e.g. 'short int' --> 'signed short'
+    def canonical_type(self, type_name):
+        if self.type_names.default_char_sign != self.DEFAULT_CHAR_SIGN:
+            self.type_names.rebuild(self.DEFAULT_CHAR_SIGN)
+        return self.type_names.canonical(type_name)
 
 
     # Return the size in bits of the given type    
@@ -206,8 +274,10 @@ class CScrape():
         if type_name[-1] == '*':
             return self.POINTER_SIZE
         # If the type name is something like 'unsigned char', make it into a formal name
-        if type_name.find(' ') != -1:
-            type_name = self.collate_types(type_name.split(' '))
+        type_name = self.canonical_type(type_name)
+        # Variables of an enum type are held in an ENUM_TYPE
+        if type_name == 'enum':
+            type_name = self.ENUM_TYPE
         # See if the type is a standard type
         try:
             return self.types[type_name]['bit_size']
@@ -226,6 +296,9 @@ class CScrape():
         # If the type name is a pointer, return the pointer alignment
         if type_name[-1] == '*':
             return self.POINTER_SIZE
+        type_name = self.canonical_type(type_name)
+        if type_name == 'enum':
+            type_name = self.ENUM_TYPE
         try:
             return self.types[type_name]['alignment']
         except:
@@ -239,70 +312,33 @@ class CScrape():
     
     # Get the value of the node.
     # If the node is an expression, it will be calculated e.g. '5 * sizeof(int)'
+    # The expression is evaluated as C would (see const_expr.ConstantEvaluator). It may use the values of
+    # enums declared before it. A SyntaxError is raised if the expression is not constant.
     def GetValue(self, node):
-        # See if the node is a simple value
-        if node.__class__.__name__ == 'Constant':
-            value = node.value
-            original_value = value
-            try:
-                while value[-1] == 'U' or \
-                      value[-1] == 'u' or \
-                      value[-1] == 'L' or \
-                      value[-1] == 'l':
-                    value = value[:-1]
-                if value[0] == "'":
-                    return ord(value[1])
-                value = eval(value)
-                if (type(value) is float) or (type(value) is int):
-                    return value
-                raise
-            except:
-                raise SyntaxError("Could not parse constant '" + original_value + "'")
-        
-        if node.__class__.__name__ == 'BinaryOp':
-            left  = self.GetValue(node.left)
-            right = self.GetValue(node.right)
-            if node.op == '+':
-                return left + right
-            if node.op == '-':
-                return left - right
-            if node.op == '*':
-                return left * right
-            if node.op == '/':
-                if (type(left)  is int) and \
-                   (type(right) is int):
-                    return left // right
-                else:
-                    return left / right
-            if node.op == '<<':
-                    return left << right
-            if node.op == '>>':
-                    return left >> right
-            if node.op == '&':
-                    return left & right
-            if node.op == '|':
-                    return left | right
-            if node.op == '^':
-                    return left ^ right
-            raise SyntaxError("Unknown BinaryOp '" + node.op + "'")
-        
-        if node.__class__.__name__ == 'UnaryOp':
-            right = self.GetValue(node.expr)
-            if node.op == '+':
-                return right
-            if node.op == '-':
-                return -right
-            if node.op == '~':
-                return ~right
-            if node.op == 'sizeof':
-                return (self.type_size(right) + 7) // 8  # Divide by 8 because sizeof() returns bytes
-            raise SyntaxError("Unknown UnaryOp '" + node.op + "'")
-        
         if node.__class__.__name__ == 'Typename':
             return self.collate_types(node.type.type.names)
-            
-        raise SyntaxError("Unknown expression type '" + node.__class__.__name__ + "'")
-        return 0
+        return self.evaluator.value(node)
+
+
+    # Return the value of the enum value with the given name (e.g. 'RED') or None if it is not known.
+    # Values of the enum being processed by handle_enum() are found too.
+    def enum_constant(self, name):
+        if self.enum_values != None and name in self.enum_values:
+            return self.enum_values[name]['value']
+        positions = self.enum_index.find(self.enums, { 'value': name })
+        if len(positions) == 0:
+            return None
+        return self.enums[positions[-1]]['values'][name]['value']
+
+
+    # Return the size in bits of the most recently declared variable with the given name, or None if there
+    # is none. Used for 'sizeof(my_var)'
+    def variable_size(self, name):
+        for position in reversed(self.variable_index.find(self.variables, { 'name': name })):
+            size = self.variables[position].get('size')
+            if size != None:
+                return size
+        return None
         
     
     # Process a Decl (variable declaration). 
@@ -334,7 +370,10 @@ class CScrape():
         if 'enumerators' in dir(node):
             # This happens when enums are used e.g.  'typedef enum Life_e {DEAD,ALIVE} Life_t;'. 
             return False
-        var_data = dict()
+        if node.coord == None:
+            # This happens for unnamed bit fields e.g. 'int :0;'
+            return False
+        var_data = VariableRecord()
         var_data['name']        = node.name
         var_data['filename']    = self.filename
         var_data['line_number'] = node.coord.line
@@ -398,7 +437,7 @@ class CScrape():
     #       'line'       - Source line the value was defined eith
     #       'value'      - Value of enum
     def handle_enum(self, node):
-        enum = dict()
+        enum = EnumRecord()
         enum['filename'] = self.filename
         enum['line_number'] = node.coord.line
         enum['function'] = self.within_function
@@ -406,13 +445,14 @@ class CScrape():
         enum['exception'] = None
         values = dict()
         enum_value = 0
+        self.enum_values = values  # So the values can be used by the values that follow. See enum_constant()
         # Get the values
         try:
             node = node.values
             if node == None:  # Does the enum have no enumerators e.g.   'enum my_enum_type var_name;'
                 return
             for value_node in node.enumerators:
-                enum_item = dict()
+                enum_item = EnumValueRecord()
                 enum_item['line_mumber'] = value_node.coord.line
                 enum_item['line'] = self.source_lines[value_node.coord.line]
                 if value_node.value == None:
@@ -423,6 +463,8 @@ class CScrape():
                 values[value_node.name] = enum_item
         except Exception as e:
             enum['exception'] = e
+        finally:
+            self.enum_values = None
         enum['values'] = values
         if self.debug_level >= 10:
             print('%s: Enum: %s' % (self.class_name, repr(enum)))
@@ -459,7 +501,7 @@ class CScrape():
         node_name, funcdecl_node  = decl_node.children()[0]
         node_name, paramlist_node = funcdecl_node.children()[0]
         func_name = decl_node.name
-        func_data = dict()
+        func_data = FunctionRecord()
         ptr = ''
         node = decl_node.type.type
         while node.__class__.__name__ == 'PtrDecl':
@@ -514,6 +556,10 @@ class CScrape():
     #      'ptr'         - Number of ptr specifiers. E.g. 'int**' would be 2.
     #      'offset'      - Bit offset of the element from the start of the list
     #      'size'        - Bit size of the element
+    #      'alignment'   - Alignment of the element in bits
+    #      'bit_field'   - Only present (and True) for a bit field e.g. 'unsigned x:3;'. 'size' is its width.
+    #      'types'       - Only present for a struct or union defined within the struct. List of its elements.
+    # The elements of structs and unions are placed by self.layout_engine. See aggregate_elements()
     def handle_typedef(self, node):
         # Determine the type of typedef
         typedef_type = 'unknown'
@@ -527,8 +573,9 @@ class CScrape():
             typedef_type = 'struct'
         except:
             pass
+        self.typedef_names.append(node.name)
             
-        typedef_data = dict()
+        typedef_data = TypedefRecord()
         typedef_data['filename'] = self.filename
         typedef_data['line_number'] = node.coord.line
         typedef_data['line'] = self.source_lines[node.coord.line]
@@ -537,7 +584,7 @@ class CScrape():
         ignore_until_line_no = 0
         if typedef_type == 'simple':
             types = []
-            type_element = dict()
+            type_element = TypedefElementRecord()
             type_element['typedef_type'] = typedef_type
             type_element['line_number'] = typedef_data['line_number']
             type_element['line'] = typedef_data['line']
@@ -552,85 +599,239 @@ class CScrape():
             typedef_data['types'] = types
             typedef_data['size'] = type_element['size']
             typedef_data['alignment'] = self.type_alignment(type_element['type_name'])
+        elif typedef_type == 'struct' and node.type.type.__class__.__name__ == 'Enum':
+            # This happens when enums are used e.g.  'typedef enum Life_e {DEAD,ALIVE} Life_t;'. 
+            # In this case, we want to add an enum type called 'Life_t' which is equivalent to 'Life_e'
+            # But this will not have been proocessed yet, so we will set a flag to indicate that when
+            # the enum is processed, the type should also be assigned.
+            if node.type.type.values != None:
+                self.enum_type_mix = typedef_name
+            self.ignore_until_line_no = 1
+            # Values of the type are held in an ENUM_TYPE, as variables declared 'enum Life_e x;' are
+            typedef_data['size'] = self.type_size(self.ENUM_TYPE)
+            typedef_data['alignment'] = self.type_alignment(self.ENUM_TYPE)
+            typedef_data['types'] = []
         elif typedef_type == 'struct':
-            types = []
             # Set self.within_function to None to ensure struct elements are added.
             within_function = self.within_function
             self.within_function = None
-            alignment = 1
-            offset = 0
-            # Search all children
-            for name, element_node in node.type.type.children():
-                if self.handle_decl(element_node):
-                    element = self.variables[-1]
-                    self.variables = self.variables[:-1]
-                    if element['exception'] != None:
-                        self.within_function = within_function
-                        raise element['exception']
-                
-                    # Align offset if required
-                    align = self.type_alignment(element['type'])
-                    offset = (offset + (align-1)) & ~(align-1)
-                    
-                    type_element = dict()
-                    type_element['type_name']   = element['type']
-                    type_element['var_name']    = element['name']
-                    type_element['line_number'] = element['line_number']
-                    type_element['line']        = element['line']
-                    type_element['size']        = element['size']
-                    type_element['array']       = element['array']
-                    type_element['ptr']         = element['ptr']
-                    type_element['exception']   = None
-                    type_element['offset']      = offset
-                    type_element['alignment']   = self.type_alignment(type_element['type_name'])
-                    if type_element['alignment'] > alignment:
-                        alignment = type_element['alignment']
-                    offset += type_element['size']
-                    types.append(type_element)
-                    ignore_until_line_no = element['line_number']
-                elif 'enumerators' in dir(element_node):
-                    # This happens when enums are used e.g.  'typedef enum Life_e {DEAD,ALIVE} Life_t;'. 
-                    # In this case, we want to add an enum type called 'Life_t' which is equivalent to 'Life_e'
-                    # But this will not have been proocessed yet, so we will set a flag to indicate that when
-                    # the enum is processed, the type should also be assigned.
-                    self.enum_type_mix = typedef_name
-            
-            self.ignore_until_line_no = ignore_until_line_no+1
-            typedef_data['size'] = offset
-            # Increase the size to match the alignment of structs
-            typedef_data['size'] = (typedef_data['size']+self.STRUCT_ALIGNMENT-1) & ~(self.STRUCT_ALIGNMENT-1)
+            try:
+                types = self.aggregate_elements(node.type.type)
+            finally:
+                # Restore self.within_function
+                self.within_function = within_function
+            size, alignment = self.layout_engine.place(types, node.type.type.__class__.__name__ == 'Union')
+            self.ignore_until_line_no = self.last_element_line(types)+1
+            typedef_data['size'] = size
             typedef_data['alignment'] = alignment
-            if alignment < self.STRUCT_ALIGNMENT:
-                typedef_data['alignment'] = self.STRUCT_ALIGNMENT
             typedef_data['types'] = types
-            # Restore self.within_function
-            self.within_function = within_function
 
+        # Calculate the fingerprint of the structure now, so duplicates of the typedef are quick to compare
+        typedef_data.fingerprint()
+        self.add_typedef(typedef_name, typedef_data)
+        if self.debug_level >= 10:
+            print('%s: typedef: %s' % (self.class_name, repr(typedef_data)))
+            
+
+    # Return a list of TypedefElementRecord objects for the members of a struct or union node. The offset of
+    # each member is set by self.layout_engine.place().
+    # A struct or union defined within the struct e.g. 'struct { int a; } b;' is an element whose 'type_name' is
+    # 'struct' (or 'union'), and whose 'types' is the list of its own members. Its 'var_name' is None if it has
+    # no name (e.g. 'union { int i; float f; };'). Bit fields e.g. 'unsigned x:3;' have 'bit_field' set to True
+    # and their 'size' is the width of the field.
+    # An exception is raised if the type of a member is not known.
+    def aggregate_elements(self, node):
+        types = []
+        for name, element_node in node.children():
+            nested, array, ptr = self.nested_aggregate(element_node)
+            if nested != None:
+                type_element = self.aggregate_element(element_node, nested, array, ptr)
+            elif element_node.bitsize != None:
+                type_element = self.bit_field_element(element_node)
+            elif self.handle_decl(element_node):
+                element = self.variables.pop()
+                if element['exception'] != None:
+                    raise element['exception']
+                type_element = TypedefElementRecord()
+                type_element['type_name']   = element['type']
+                type_element['var_name']    = element['name']
+                type_element['line_number'] = element['line_number']
+                type_element['line']        = element['line']
+                type_element['size']        = element['size']
+                type_element['array']       = element['array']
+                type_element['ptr']         = element['ptr']
+                type_element['exception']   = None
+                type_element['offset']      = 0
+                if element['ptr'] != 0:
+                    type_element['alignment'] = self.POINTER_SIZE
+                else:
+                    type_element['alignment'] = self.type_alignment(type_element['type_name'])
+            else:
+                continue
+            types.append(type_element)
+        return types
+
+
+    # If the Decl node declares a member whose type is a struct or union defined in the declaration,
+    # return (struct node, array, ptr). Otherwise return (None, None, None).
+    def nested_aggregate(self, node):
+        array = []
+        ptr = 0
+        node = node.type
+        while node.__class__.__name__ == 'ArrayDecl':
+            array.append(int(self.GetValue(node.dim)))
+            node = node.type
+        while node.__class__.__name__ == 'PtrDecl':
+            node = node.type
+            ptr += 1
+        if node.__class__.__name__ == 'TypeDecl':
+            node = node.type
+        if node.__class__.__name__ in ('Struct', 'Union') and node.decls != None:
+            return node, array, ptr
+        return None, None, None
+
+
+    # Return the TypedefElementRecord of a member of a struct whose type is a struct (or union) defined in the
+    # declaration. See aggregate_elements()
+    def aggregate_element(self, node, nested, array, ptr):
+        types = self.aggregate_elements(nested)
+        size, alignment = self.layout_engine.place(types, nested.__class__.__name__ == 'Union')
+        type_name = nested.__class__.__name__.lower()
+        if nested.name != None:
+            type_name += ' ' + nested.name
+        coord = node.coord or nested.coord
+        type_element = TypedefElementRecord()
+        type_element['type_name']   = type_name
+        type_element['var_name']    = node.name
+        type_element['line_number'] = coord.line
+        type_element['line']        = self.source_lines[coord.line]
+        if ptr != 0:
+            size = self.POINTER_SIZE
+            alignment = self.POINTER_SIZE
+        for i in array:
+            size *= i
+        type_element['size']        = size
+        type_element['array']       = array
+        type_element['ptr']         = ptr
+        type_element['exception']   = None
+        type_element['offset']      = 0
+        type_element['alignment']   = alignment
+        type_element['types']       = types
+        return type_element
+
+
+    # Return the TypedefElementRecord of a bit field e.g. 'unsigned x:3;'. See aggregate_elements()
+    def bit_field_element(self, node):
+        coord = node.coord or node.bitsize.coord
+        type_element = TypedefElementRecord()
+        type_element['type_name']   = self.collate_types(node.type.type.names)
+        type_element['var_name']    = node.name
+        type_element['line_number'] = coord.line
+        type_element['line']        = self.source_lines[coord.line]
+        type_element['size']        = int(self.GetValue(node.bitsize))
+        type_element['array']       = []
+        type_element['ptr']         = 0
+        type_element['exception']   = None
+        type_element['offset']      = 0
+        type_element['alignment']   = self.type_alignment(type_element['type_name'])
+        type_element['bit_field']   = True
+        if type_element['size'] < 0 or type_element['size'] > self.type_size(type_element['type_name']):
+            raise SyntaxError("Width of bit field '%s' is too large" % node.name)
+        return type_element
+
+
+    # Return the last line number of the elements of a typedef (including the members of nested structs)
+    @staticmethod
+    def last_element_line(types):
+        line_number = 0
+        for element in types:
+            line_number = max(line_number, element['line_number'],
+                              CScrape.last_element_line(element.get('types') or ()))
+        return line_number
+
+
+    # Return the Layout of the type with the given name. This lists each field of the type (including the
+    # members of structs held by the type) with its bit offset and size, and for bit fields, the shift and mask
+    # to get its value. Layouts are only worked out once for each type (see layout.LayoutEngine).
+    # e.g.
+    #   obj.layout('my_struct_t').size                   - Size of the type in bits
+    #   obj.layout('my_struct_t').member('a.b').offset   - Bit offset of member a.b
+    def layout(self, type_name):
+        return self.layout_engine.layout(type_name)
+
+
+    # Return the LayoutField of a member of a type. e.g. obj.member('my_struct_t', 'a.b')
+    def member(self, type_name, path):
+        return self.layout_engine.layout(type_name).member(path)
+
+
+    # Return the Codec which decodes and encodes the bytes of a variable or type. The codec is made the first
+    # time it is needed. See codec.Codec
+    def codec(self, name):
+        return self.codecs.codec(name)
+
+
+    # Return the value of a variable or type decoded from the bytes of buf (e.g. bytes, bytearray, memoryview or
+    # mmap) at the given byte offset. Structs are decoded as dicts and arrays as lists. e.g.
+    #   obj.decode('my_var', memory, obj.var('my_var')['addr'] - ram_start)
+    def decode(self, name, buf, offset=0):
+        return self.codecs.codec(name).decode_from(buf, offset)
+
+
+    # Return the bytes of a value of a variable or type (as returned by decode())
+    def encode(self, name, value):
+        return self.codecs.codec(name).encode(value)
+
+
+    # Return the NumPy structured dtype of a variable or type, so that many items can be decoded at once. e.g.
+    #   samples = numpy.frombuffer(memory, obj.numpy_dtype('sample_t'), count=4096, offset=start)
+    # Bit fields are their storage units. See dtypes.Dtypes. Raises ImportError if NumPy is not installed.
+    def numpy_dtype(self, name):
+        return self.dtypes.dtype(name)
+
+
+    # Return the ctypes class (a Structure, Union, Array or scalar type) of a variable or type, with the offsets,
+    # size and endian of its layout. See ctype_classes.CtypeClasses
+    def ctype(self, name):
+        return self.ctype_classes.ctype(name)
+
+
+    # Return a ctypes view of a variable or type in the writable buffer buf (e.g. a bytearray, or an mmap of a
+    # memory image opened with mmap.ACCESS_WRITE or mmap.ACCESS_COPY) at the given byte offset. The fields are
+    # read from and written to buf, with no copying. e.g.
+    #   rec = obj.view('my_var', memory, obj.var('my_var')['addr'] - ram_start)
+    #   print(rec.count, rec.points[2].x)
+    def view(self, name, buf, offset=0):
+        return self.ctype_classes.ctype(name).from_buffer(buf, offset)
+
+
+    # Add a typedef to self.typedefs. If a typedef with the same name already exists, it must describe the
+    # same type, otherwise an exception is raised listing the differences.
+    def add_typedef(self, typedef_name, typedef_data):
         # Check that there is not an existing typedef with the same name
         if typedef_name in self.typedefs:
-            # An existing typedef has the same name
-            # We will now compare them to see if it is the same typedef used twice. Filenames and line numbers need to be ignored.
-            a = typedef_data
-            b = self.typedefs[typedef_name]
-            a_str = json.dumps(a, sort_keys=True)
-            b_str = json.dumps(b, sort_keys=True)
-            # Delete  'line_number': <integer>
-            # Delete  'filename': None
-            # Delete  'filename': '<text>'
-            p = re.compile('("filename": null|"filename": ".*"|line_number": [0123456789]*)')
-            a_str = p.sub('', a_str)
-            b_str = p.sub('', b_str)
-            if a_str != b_str:
-                raise Exception("Duplicate typedef name '%s' in %s:%d and %s:%d" % (typedef_name, a['filename'], a['line_number'],
-                                                                                                  b['filename'], b['line_number']))
+            if self.typedef_conflict(typedef_name, typedef_data):
+                a = typedef_data
+                b = self.typedefs[typedef_name]
+                raise Exception("Duplicate typedef name '%s' in %s:%d and %s:%d (%s)" % (typedef_name, a['filename'], a['line_number'],
+                                                                                                       b['filename'], b['line_number'],
+                                                                                                       ', '.join(typedef_differences(a, b))))
         else:
             self.typedefs[typedef_name] = typedef_data
-        if self.debug_level >= 10:
-            print('%s: typedef: %s' % (self.class_name, repr(typedef_data)))
-            
+
+
+    # Return True if there is an existing typedef with the given name which is not the same as typedef_data.
+    # Typedefs are the same if their structure (size, alignment and the type, name, offset, size, array and
+    # ptr of each element) is the same, wherever they were declared. See records.typedef_fingerprint()
+    def typedef_conflict(self, typedef_name, typedef_data):
+        if not typedef_name in self.typedefs:
+            return False
+        return typedef_fingerprint(typedef_data) != typedef_fingerprint(self.typedefs[typedef_name])
+
         
     # Look at the node type and decide if it is one we are interested in
-    def handle_node(self, node):
+    # handlers - dict returned by node_handlers(). If None, it is created.
+    def handle_node(self, node, handlers=None):
         # Try and print the line currently being processed
         if self.debug_level >= 20:
             try:
@@ -645,46 +846,232 @@ class CScrape():
         # If the node type one of the ones we are looking out for?
         if self.debug_level >= 100:
             print("%s: node.__class__.__name__=%s" % (self.class_name, node.__class__.__name__))
-        if 'line' in dir(node.coord) and node.coord.line < self.ignore_until_line_no:
-            pass
-        else:
-            if node.__class__.__name__ == 'FuncDef':
-                self.handle_funcdef(node)
-            if node.__class__.__name__ == 'Decl':
-                self.handle_decl(node)
-            if node.__class__.__name__ == 'Typedef':
-                self.handle_typedef(node)
-            if node.__class__.__name__ == 'Enum':
-                self.handle_enum(node)
-        
+        line = getattr(node.coord, 'line', None)
+        if line != None and (line < self.ignore_until_line_no or line in self.injected_lines):
+            return
+        if handlers == None:
+            handlers = self.node_handlers()
+        handler = handlers.get(node.__class__)
+        if handler != None:
+            handler(node)
+
+
+    # Return a dict of the function that handles each pycparser node class we are interested in
+    def node_handlers(self):
+        from pycparser import c_ast
+        return { c_ast.FuncDef: self.handle_funcdef,
+                 c_ast.Decl:    self.handle_decl,
+                 c_ast.Typedef: self.handle_typedef,
+                 c_ast.Enum:    self.handle_enum }
+
+
     # Iterate through all nodes passing a node to handle_node
+    # The nodes below each top level node (e.g. a function definition) are walked using a stack rather than
+    # recursion, so deeply nested sources do not hit the recursion limit. self.within_function is reset
+    # after each top level node.
     def parse_node(self, node):
-        self.handle_node(node)
-        self.level += 1
-        if 'children' in dir(node):
-            for child_name, child_node in node.children():
-                self.parse_node(child_node)
-            if self.level == 2:
-                self.within_function = None
-        self.level -= 1
-    
+        handlers = self.node_handlers()
+        self.handle_node(node, handlers)
+        children = [child_node for child_name, child_node in node.children()]
+        for index in range(len(children)):
+            # The last line the top level node may be on. Used to decide if a function body can be skipped.
+            end_line = len(self.source_lines) - 1
+            if index + 1 < len(children):
+                end_line = getattr(children[index+1].coord, 'line', end_line)
+            self.walk_node(children[index], handlers, end_line)
+            self.within_function = None
+
+
+    # Pass the node and all the nodes below it to handle_node, in source order.
+    # The body of a function is skipped if none of its nodes could be handled. See body_has_declarations()
+    # end_line - The last line the node may be on.
+    def walk_node(self, node, handlers, end_line):
+        from pycparser import c_ast
+        FuncDef = c_ast.FuncDef
+        debug = self.debug_level >= 20
+        stack = [node]
+        pop = stack.pop
+        push = stack.append
+        while stack:
+            node = pop()
+            if debug:
+                self.handle_node(node, handlers)
+            else:
+                # Same as handle_node(), without the debug output
+                line = getattr(node.coord, 'line', None)
+                if line == None or (line >= self.ignore_until_line_no and not line in self.injected_lines):
+                    handler = handlers.get(node.__class__)
+                    if handler != None:
+                        handler(node)
+            children = node.children()
+            if node.__class__ is FuncDef and not debug and not self.body_has_declarations(node, end_line):
+                children = [child for child in children if child[1] is not node.body]
+            for child_name, child_node in reversed(children):
+                push(child_node)
+
+
+    # Return False if the body of the function definition can not contain anything handle_node() is
+    # interested in, i.e. the source of the function does not contain 'static', 'enum' or 'typedef'.
+    # end_line - The last line the function may be on.
+    def body_has_declarations(self, node, end_line):
+        start_line = getattr(node.coord, 'line', None)
+        if start_line == None:
+            return True
+        source = '\n'.join(self.source_lines[start_line:end_line+1])
+        return _BODY_DECLARATIONS_RE.search(source) != None
+
+
+    # Return the pycparser parser shared by all CScrape objects in this process, building it if required.
+    # We import pycparser here so that the library is only required if CScrape is used to parse C code.
+    @classmethod
+    def get_parser(cls):
+        if cls.shared_parser == None:
+            import pycparser
+            if cls.parser_table_dir == None:
+                cls.shared_parser = pycparser.CParser()
+            else:
+                # PLY imports the tables as modules, so the folder must be on the path
+                if not os.path.isdir(cls.parser_table_dir):
+                    os.makedirs(cls.parser_table_dir)
+                if not cls.parser_table_dir in sys.path:
+                    sys.path.append(cls.parser_table_dir)
+                cls.shared_parser = pycparser.CParser(lextab='pycscrape_lextab',
+                                                      yacctab='pycscrape_yacctab',
+                                                      taboutputdir=cls.parser_table_dir)
+        return cls.shared_parser
+
+
+    # Set the folder that pycparser writes its PLY lexer and parser tables to. The first process to use
+    # the folder builds and writes the tables, later processes load them and start much faster.
+    # None (the default) uses the tables supplied with pycparser.
+    # Note: pycparser v3.x does not use PLY, so the folder is not used.
+    @classmethod
+    def set_parser_table_dir(cls, dirname):
+        if dirname != None:
+            dirname = os.path.abspath(dirname)
+        if dirname != cls.parser_table_dir:
+            cls.parser_table_dir = dirname
+            cls.shared_parser = None
+
 
     # This function will parse a string containing C code.
     # filename - File containing C source code
-    def parse_file(self, filename):
+    # Header files (see HEADER_EXTENSIONS) are only parsed once. Parsing a header with the same path and
+    # contents again does nothing.
+    # follow_includes - If True, files included with '#include "file.h"' are parsed first (once only), and the
+    #                   typedef names they declare are made known to the parser, so the file can use them.
+    #                   Included files are looked for in the folder of the file, then in self.include_paths.
+    def parse_file(self, filename, follow_includes=False):
+        self.parse_source_file(filename, follow_includes)
+
+
+    # Parse a file as parse_file() does and return a list of the names of the typedefs declared by the
+    # file (including the headers it includes).
+    def parse_source_file(self, filename, follow_includes):
         # Read file to a string
         with open(filename, 'rb') as f:
-            c_source_code = f.read().decode('utf8')
-        self.parse_string(c_source_code, filename=filename)
-        
+            data = f.read()
+        key = None
+        if CScrape.is_header(filename):
+            key = CScrape.header_key(filename, data)
+            if key in self.parsed_headers:
+                return self.parsed_headers[key]
+            # Mark the header as parsed now, in case it (indirectly) includes itself.
+            self.parsed_headers[key] = []
+        c_source_code = data.decode('utf8')
+        include_typedefs = None
+        typedef_names = []
+        if follow_includes:
+            include_typedefs = dict()
+            for line_number, include_filename in self.find_includes(c_source_code, filename):
+                names = self.parse_source_file(include_filename, True)
+                include_typedefs[line_number] = include_typedefs.get(line_number, []) + names
+                typedef_names.extend(names)
+        self.parse_string(c_source_code, filename=filename, include_typedefs=include_typedefs)
+        typedef_names.extend(self.typedef_names)
+        if key != None:
+            self.parsed_headers[key] = typedef_names
+        return typedef_names
+
+
+    # Return a list of (line number, filename) tuples for each '#include "file.h"' in the source which can be
+    # found in the folder of the source file or self.include_paths.
+    # Includes in comments are ignored, as are those in blocks which are never compiled e.g. '#if 0'. Only
+    # conditions which are a number are worked out. The other blocks are assumed to be compiled.
+    def find_includes(self, str, filename=None):
+        includes = []
+        folders = list(self.include_paths)
+        if filename != None:
+            folders.insert(0, os.path.dirname(os.path.abspath(filename)))
+        str = CScrape.sanitize(str, keep_directives=True)
+        line_number = 1
+        position = 0
+        # [branch taken, block compiled] for each '#if' the include is within. 'Branch taken' is True once a
+        # branch of the '#if' is known to be compiled, so the '#elif' and '#else' branches after it are not.
+        blocks = []
+        for match in _INCLUDE_RE.finditer(str):
+            directive = match.group(2)
+            if directive != None:
+                condition = CScrape.condition_value(match.group(3)) if directive in ('if', 'elif') else None
+                if directive in ('if', 'ifdef', 'ifndef'):
+                    blocks.append([condition == True, condition != False])
+                elif len(blocks) == 0:
+                    continue
+                elif directive == 'endif':
+                    blocks.pop()
+                elif blocks[-1][0]:
+                    blocks[-1][1] = False
+                else:
+                    blocks[-1] = [directive == 'else' or condition == True, condition != False]
+                continue
+            if not all([compiled for taken, compiled in blocks]):
+                continue
+            line_number += str.count('\n', position, match.start())
+            position = match.start()
+            for folder in folders:
+                include_filename = os.path.join(folder, match.group(1))
+                if os.path.isfile(include_filename):
+                    includes.append((line_number, include_filename))
+                    break
+            else:
+                if self.debug_level >= 10:
+                    print('%s: Include file not found: %s' % (self.class_name, match.group(1)))
+        return includes
+
+
+    # Return the value of an '#if' condition as True or False, or None if it is not a number
+    @staticmethod
+    def condition_value(condition):
+        try:
+            return int(condition.strip().rstrip('uUlL'), 0) != 0
+        except ValueError:
+            return None
+
+
+    # Return True if the filename is a C header file
+    @staticmethod
+    def is_header(filename):
+        return os.path.splitext(filename)[1].lower() in HEADER_EXTENSIONS
+
+
+    # Return the key used in self.parsed_headers for a header with the given filename and contents (bytes)
+    @staticmethod
+    def header_key(filename, data):
+        return (os.path.realpath(filename), hashlib.sha256(data).hexdigest())
+
 
     # This function will parse a string containing C code.
     # str      - multi-line string of C source code
     # filename - Name of string - in case it came from a file. 
-    def parse_string(self, str, filename = None):
+    # include_typedefs - dict of typedef names declared in included files. The key is the line number of the
+    #                    '#include'. Used by parse_file() when following includes.
+    def parse_string(self, str, filename = None, include_typedefs = None):
+        self.materialize_snapshot()
         self.filename = filename
         self.last_line = 0
         self.ignore_until_line_no = 0
+        self.typedef_names = []
+        self.injected_lines = set()
         # Convert str to an array of lines
         self.source_lines = []
         self.source_lines.append('') # Make line 0 and empty line
@@ -697,16 +1084,292 @@ class CScrape():
             else:
                 i = None
 
-        # Pass the original string through CParser but remove comments, preprocessor lines and attricutes 
+        # Pass the original string through CParser but remove comments, preprocessor lines and attributes
         # because CParser does not handle them.
-        # We import pycparser here so that the library is only required if CScrape is used to parse C code.
-        import pycparser
-        self.parser = pycparser.CParser()
-        str = CScrape.remove_comments(str)
-        str = CScrape.remove_preprocessor(str)
-        str = CScrape.remove_attributes(str)
+        str = CScrape.sanitize(str)
+        if include_typedefs:
+            str = self.inject_typedefs(str, include_typedefs)
+        # Has the same source been parsed before with the same types and typedefs?
+        if self.scrape_cache != None:
+            key = self.scrape_cache_key(str, filename)
+            results = self.scrape_cache.get(key)
+            if results != None:
+                self.refresh_source_lines(results)
+                self.ast = None
+                self.typedef_names = list(results['typedef_names'])
+                self.merge_results(results)
+                return
+            mark = self.scrape_mark()
+        self.parser = CScrape.get_parser()
         self.ast = self.parser.parse(str)
+        self.evaluator.clear()
         self.parse_node(self.ast)
+        self.model_changed()
+        if self.scrape_cache != None:
+            self.scrape_cache.put(key, self.scrape_results(mark))
+
+
+    # Return a copy of the sanitized source with dummy typedefs for the typedef names declared in included
+    # files. pycparser must know the typedef names to parse the source. The dummy typedefs are put on the
+    # (blank) line of the '#include' so that line numbers do not change. Nodes on these lines are ignored.
+    # include_typedefs - dict of typedef names. The key is the line number of the '#include'.
+    def inject_typedefs(self, str, include_typedefs):
+        lines = str.split('\n')
+        declared = set()
+        for line_number in sorted(include_typedefs):
+            names = []
+            for name in include_typedefs[line_number]:
+                if not name in declared:
+                    declared.add(name)
+                    names.append(name)
+            if len(names) != 0 and line_number <= len(lines):
+                lines[line_number-1] = ' '.join(['typedef int %s;' % name for name in names])
+                self.injected_lines.add(line_number)
+        return '\n'.join(lines)
+
+
+    # Use an on disk cache of parse results. parse_string() and parse_file() will use the records stored
+    # in the cache, rather than parsing the source again, if the same source has been parsed before with
+    # the same types and typedefs.
+    # folder   - Folder to keep the cache files in. It may be shared by several processes.
+    # max_size - The least recently used results are deleted when the cache files use more bytes than this.
+    # Passing None for the folder stops the cache being used.
+    # See scrape_cache_report() for the cache hit/miss counts.
+    def set_scrape_cache(self, folder, max_size=256*1024*1024):
+        if folder == None:
+            self.scrape_cache = None
+        else:
+            self.scrape_cache = ScrapeCache(folder, max_size)
+
+
+    # Return a one line summary of the scrape cache hits and misses.
+    def scrape_cache_report(self):
+        if self.scrape_cache == None:
+            return 'Scrape cache: not used'
+        return self.scrape_cache.report()
+
+
+    # Set the maximum number of var(), enum() and enum_type() results kept. The least recently used result is
+    # dropped when the cache is full. Zero stops results being cached.
+    def set_query_cache_size(self, max_entries):
+        self.query_cache.resize(max_entries)
+
+
+    # Return a one line summary of the query cache hits and misses.
+    def query_cache_report(self):
+        return self.query_cache.report()
+
+
+    # Must be called after the records or map data are changed, so that stale query results are not returned.
+    # Changes made by this class call it. Records added or lists replaced by the caller are also noticed by
+    # cached_query(), but records changed in place are not.
+    def model_changed(self):
+        self.query_cache.invalidate()
+        self.codecs.reset()
+        self.dtypes.reset()
+        self.ctype_classes.reset()
+        self.address_index.reset()
+
+
+    # Return a copy of the cached result of the given query or None if there is none
+    def cached_query(self, query):
+        self.check_query_cache()
+        return self.query_cache.get(query)
+
+
+    # Invalidate the query cache if records have been added or lists replaced since the last query
+    def check_query_cache(self):
+        self.query_cache.check((id(self.variables), len(self.variables), id(self.enums), len(self.enums),
+                                id(self.map_var_data), len(self.map_var_data)))
+
+
+    # Return the scrape cache key for the given sanitized source. The key covers everything that affects the
+    # records found: the source, filename, type configuration, the typedefs already known and the values of the
+    # enums and sizes of the variables already known that the source names.
+    def scrape_cache_key(self, sanitized_str, filename):
+        # Typedefs are only ever added, so only the typedefs added since the last call are added to the hash.
+        # Each typedef is given by its name and the fingerprint of its structure. See records.typedef_fingerprint()
+        digest = self.typedefs_digest
+        if digest == None or digest[0] is not self.typedefs or digest[1] > len(self.typedefs):
+            digest = [self.typedefs, 0, hashlib.sha256()]
+            self.typedefs_digest = digest
+        if digest[1] != len(self.typedefs):
+            for name, typedef in itertools.islice(self.typedefs.items(), digest[1], None):
+                digest[2].update(('%s %s\n' % (name, typedef_fingerprint(typedef))).encode('utf8'))
+            digest[1] = len(self.typedefs)
+        config = dict()
+        config['version']  = __version__
+        config['format']   = ScrapeCache.FORMAT
+        config['filename'] = filename
+        config['types']    = self.types
+        config['typedefs'] = digest[2].hexdigest()
+        # Enum values and variables declared before the source may be used by it e.g. 'int x[A3];'. See
+        # enum_constant() and variable_size()
+        constants = []
+        for name in sorted(set(_IDENTIFIER_RE.findall(sanitized_str))):
+            value = self.enum_constant(name)
+            size = self.variable_size(name)
+            if value != None or size != None:
+                constants.append((name, value, size))
+        config['constants'] = constants
+        for name in ('DEFAULT_CHAR_SIGN', 'ENUM_TYPE', 'POINTER_SIZE', 'DEFAULT_ALIGNMENT', 'STRUCT_ALIGNMENT'):
+            config[name] = getattr(self, name)
+        h = hashlib.sha256(json.dumps(config, sort_keys=True).encode('utf8'))
+        h.update(sanitized_str.encode('utf8'))
+        return h.hexdigest()
+
+
+    # Set the 'line' of each record returned by scrape_results() from self.source_lines.
+    # Used for cached results, because the key only covers the sanitized source, so comments may have changed.
+    def refresh_source_lines(self, results):
+        for record in results['functions'] + results['variables']:
+            record['line'] = self.source_lines[record['line_number']]
+        for enum in results['enums']:
+            for value in enum['values'].values():
+                value['line'] = self.source_lines[value['line_mumber']]
+        for name, typedef in results['typedefs']:
+            typedef['line'] = self.source_lines[typedef['line_number']]
+            for element in typedef.get('types') or ():
+                element['line'] = self.source_lines[element['line_number']]
+
+
+    # Parse a list of C files, using up to 'workers' processes (None uses one process per CPU).
+    # The result is the same as calling parse_file() for each file in turn.
+    # Each file is parsed in a worker process, starting from the types and typedefs known before the call.
+    # The records found are sent back and merged in order. A file is parsed again in this process if its
+    # result may depend on the typedefs, enum values or variable sizes of an earlier file in the list, i.e. when
+    # the worker raised an exception, a record has an exception or a typedef conflicts with one already known.
+    # follow_includes - As parse_file(). All of the included headers are parsed (once each) in this process
+    #                   before the files in the list, whatever the number of workers.
+    def parse_files(self, filenames, workers=None, follow_includes=False):
+        filenames = list(filenames)
+        if follow_includes:
+            for filename in filenames:
+                with open(filename, 'rb') as f:
+                    c_source_code = f.read().decode('utf8')
+                for line_number, include_filename in self.find_includes(c_source_code, filename):
+                    self.parse_source_file(include_filename, True)
+        if workers == None:
+            workers = os.cpu_count()
+        if workers <= 1 or len(filenames) <= 1:
+            for filename in filenames:
+                self.parse_file(filename, follow_includes)
+            return
+
+        # Headers that have been parsed before (or appear twice in the list) are skipped, as parse_file() would.
+        tasks = []
+        keys = set(self.parsed_headers)
+        for filename in filenames:
+            key = None
+            if CScrape.is_header(filename):
+                with open(filename, 'rb') as f:
+                    key = CScrape.header_key(filename, f.read())
+                if key in keys:
+                    continue
+                keys.add(key)
+            tasks.append((filename, key))
+
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                                 initializer=_parse_files_worker_init,
+                                 initargs=(self.scrape_state(),)) as executor:
+            futures = [executor.submit(_parse_files_worker, filename, follow_includes) for filename, key in tasks]
+            # Workers only know the typedefs of this object, not its enums and variables
+            model_added = len(self.enums) != 0 or len(self.variables) != 0
+            for (filename, key), future in zip(tasks, futures):
+                try:
+                    results, typedef_names, cache_stats = future.result()
+                    if self.scrape_cache != None:
+                        self.scrape_cache.add_stats(cache_stats)
+                except Exception:
+                    results = None
+                if results == None or \
+                   (model_added and CScrape.results_have_exceptions(results)) or \
+                   any(self.typedef_conflict(name, data) for name, data in results['typedefs']):
+                    # Parse it here to get exactly the same result (or exception) as parse_file()
+                    mark = self.scrape_mark()
+                    self.parse_file(filename, follow_includes)
+                    results = self.scrape_results(mark)
+                else:
+                    self.merge_results(results)
+                    self.typedef_names = results['typedef_names']
+                    if key != None:
+                        self.parsed_headers[key] = typedef_names
+                # The typedefs, enum values and variable sizes of a file may be used by the files after it
+                if len(results['typedefs']) != 0 or len(results['enums']) != 0 or len(results['variables']) != 0:
+                    model_added = True
+
+
+    # Return the state a CScrape object needs to parse a file in the same way as this object.
+    # See parse_files()
+    def scrape_state(self):
+        state = dict()
+        state['debug_level'] = self.debug_level
+        state['types']       = self.types
+        state['typedefs']    = self.typedefs
+        for name in ('DEFAULT_CHAR_SIGN', 'endian', 'ENUM_TYPE', 'POINTER_SIZE', 'DEFAULT_ALIGNMENT', 'STRUCT_ALIGNMENT'):
+            state[name] = getattr(self, name)
+        state['include_paths']  = self.include_paths
+        state['parsed_headers'] = self.parsed_headers
+        state['scrape_cache'] = None
+        if self.scrape_cache != None:
+            state['scrape_cache'] = (self.scrape_cache.folder, self.scrape_cache.max_size)
+        return state
+
+
+    # Set up this object from a state returned by scrape_state()
+    def set_scrape_state(self, state):
+        for name in state:
+            if name == 'scrape_cache':
+                if state[name] != None:
+                    self.set_scrape_cache(*state[name])
+            else:
+                setattr(self, name, state[name])
+
+
+    # Return a mark which can be passed to scrape_results() to get the records added after this call
+    def scrape_mark(self):
+        return (len(self.functions), len(self.variables), len(self.enums), len(self.typedefs))
+
+
+    # Return a dict of the records added since scrape_mark() returned 'mark'. The keys are
+    #   'functions'     - List of functions added to self.functions
+    #   'variables'     - List of variables added to self.variables
+    #   'enums'         - List of enums added to self.enums
+    #   'typedefs'      - List of (name, typedef) tuples added to self.typedefs (in the order they were added)
+    #   'typedef_names' - Names of the typedefs declared by the source of the last parse_string() call
+    def scrape_results(self, mark):
+        results = dict()
+        results['typedef_names'] = list(self.typedef_names)
+        results['functions'] = self.functions[mark[0]:]
+        results['variables'] = self.variables[mark[1]:]
+        results['enums']     = self.enums[mark[2]:]
+        results['typedefs']  = [(name, self.typedefs[name]) for name in list(self.typedefs)[mark[3]:]]
+        return results
+
+
+    # Add the records returned by scrape_results() to this object
+    def merge_results(self, results):
+        self.materialize_snapshot()
+        self.functions.extend(results['functions'])
+        self.variables.extend(results['variables'])
+        self.enums.extend(results['enums'])
+        for name, data in results['typedefs']:
+            self.add_typedef(name, data)
+        self.model_changed()
+
+
+    # Return True if any record returned by scrape_results() has an exception
+    @staticmethod
+    def results_have_exceptions(results):
+        for key in ('functions', 'variables', 'enums'):
+            for record in results[key]:
+                if record['exception'] != None:
+                    return True
+        for name, data in results['typedefs']:
+            if data['exception'] != None:
+                return True
+        return False
 
 
     # Parse a GNU readelf output and put data into self.map_var_data & self.map_func_data
@@ -716,7 +1379,11 @@ class CScrape():
     #   arm-linux-gnueabi-ld -T test.ld startup.o cstartup.o myprogram.o -o results.elf
     #   arm-linux-gnueabi-objcopy -O binary results.elf results.bin
     #   readelf --all results.elf >results.data
-    # Here, the file results.data would be passed to this function
+    # Here, the file results.data would be passed to this function. filename may also be a file object opened
+    # in text or binary mode, such as the stdout of readelf. E.g.
+    #   process = subprocess.Popen(['readelf', '-s', '-W', 'results.elf'], stdout=subprocess.PIPE)
+    #   obj.parse_readelf_output(process.stdout)
+    # The -W (--wide) option stops readelf shortening long names to 'name[...]'.
     #
     # Note: Some variables/functions may be optimised away unless no optimisation (-O0) is selected as 
     # a compile flag or '__attribute__((used))' is added to fix the variable/function. E.g.
@@ -757,93 +1424,87 @@ class CScrape():
     #       impossible to tell them apart.
  
     def parse_readelf_output(self, filename):
-        data_lines = []
-        # Read file to a string
-        with open(filename, 'rb') as f:
-            map_data_str = f.read().decode('utf8')
-        # Look for the line 'Symbol table '<string>' contains <number> entries:'
-        
-        sym_search = re.compile("^Symbol table '.*' contains [0-9]* entries:$", re.MULTILINE)
-        match = sym_search.search(map_data_str)
-        # Is there no symbol table in the file?
-        if match == None:
-            raise Exception("No symbol table found in %s" % filename)
-        # Look at all the symbol tables
-        while match != None:
-            # Delete everything before the line and the line itself
-            start = match.end()+1
-            # Move end to after the 'Symbol table' line
-            # Typically 'Num:    Value  Size Type    Bind   Vis      Ndx Name'
-            while map_data_str[start] != '\n':
-                start += 1
-            start += 1
-            # Find a blank line
-            end = map_data_str.find('\n\n', start)
-            if end == -1:
-                end = len(map_data_str)
-            data_lines.extend(map_data_str[start:end].split('\n'))
-            # Is there another symbol table?
-            match = sym_search.search(map_data_str, end)
-        
-        # data_lines is an array of string of the format
-        #    '    33: 00010010    52 FUNC    GLOBAL DEFAULT    2 c_put'
-        file      = None
-        for line in data_lines:
-            parts=line.split()
-            # [0] Symbol ID - ignore
-            # [1] Symbol address (hex)
-            # [2] Symbol size (decimal)
-            # [3] Symbol type (string)  'FILE', 'FUNC', 'OBJECT'
-            # [4] Symbol scope 'LOCAL', 'GLOBAL'
-            # [5] 'Vis' ? - Ignore
-            # [6] 'Ndx' ? - Ignore
-            # [7] Symbol name. Note: Static function variables may have .<number> appended.
-
-            # Initialise an empty object
-            data = dict()
-            data['name'] = None
-            data['addr'] = None
-            data['size'] = None
-            data['file'] = None
-            if parts[3] == 'FILE':
-                file = parts[7]
-            if parts[3] == 'FUNC':
-                data['name'] = parts[7]
-                data['addr'] = int(parts[1], base=16)
-                data['size'] = int(parts[2], base=10)
-                data['func'] = None # Can't figure out how to associate a static function variable to a function from map file data.
-                if parts[4] == 'LOCAL':
-                    data['file'] = file
-                self.map_func_data.append(data)
-            if parts[3] == 'OBJECT':
-                # If the name is NAME.1234, remove the .1234
-                if parts[7].find('.') != -1:
-                    parts[7] = parts[7][:parts[7].find('.')]
-                data['name'] = parts[7]
-                data['addr'] = int(parts[1], base=16)
-                data['size'] = int(parts[2], base=10)
-                data['func'] = None  # We can not work out the function from this data
-                if parts[4] == 'LOCAL':
-                    data['file'] = file
-                self.map_var_data.append(data)
-                
+        self.materialize_snapshot()
+        # The output is read a line at a time, so a large 'readelf --all' output (or a pipe from readelf) is
+        # not held in memory. See readelf.iter_symbols()
+        self.add_symbols(readelf.iter_symbols(filename))
+
+
+    # Read the symbol table of an ELF file (e.g. results.elf) and put the data into self.map_var_data &
+    # self.map_func_data. The data is the same as parse_readelf_output() gives for the output of readelf for
+    # the file, but readelf is not needed. ELF32 and ELF64 files of either endian can be read. See elf.iter_symbols()
+    def parse_elf(self, filename):
+        self.materialize_snapshot()
+        self.add_symbols(elf.iter_symbols(filename))
+
+
+    # Read the typedefs, variables and enums of a linked ELF file (e.g. results.elf built with 'gcc -g') from its
+    # DWARF debug information instead of parsing the C source. The offsets and sizes of the members of structs
+    # (including packed structs, unions and bit fields) are those the compiler used. The addresses of the
+    # variables and functions are added to self.map_var_data & self.map_func_data, so parse_elf() is not also
+    # needed. A static variable of a function has the function as its 'func', so static variables of the same
+    # name in different functions (e.g. 'my_static_function_var.4270' in the symbol table) are told apart.
+    # The configuration (e.g. POINTER_SIZE and endian) should match the target, as for parsing the source.
+    # See dwarf.DwarfRecords
+    def parse_dwarf(self, filename):
+        self.materialize_snapshot()
+        dwarf.read(self, filename)
+        self.map_var_index.sync(self.map_var_data)
+        self.model_changed()
+
+
+    # Add the ('var', data) and ('func', data) items of symbols to self.map_var_data & self.map_func_data
+    def add_symbols(self, symbols):
+        add_func = self.map_func_data.append
+        add_var = self.map_var_data.append
+        for kind, data in symbols:
+            if kind == 'func':
+                add_func(data)
+            else:
+                add_var(data)
+        # Index the map data now, so the first var() query does not have to
+        self.map_var_index.sync(self.map_var_data)
+        self.model_changed()
+
+
+    # Read the symbols of a GNU ld map file (e.g. from 'ld -Map=results.map') and put the data into
+    # self.map_var_data & self.map_func_data. The map only lists GLOBAL symbols, without their sizes, so
+    # parse_elf() gives more. Building with 'gcc -ffunction-sections -fdata-sections' gives each function and
+    # variable an input section of its own, so the sizes and STATIC functions and variables are found too.
+    # filename may be a file object opened in text or binary mode. See mapfile.gnu_ld_symbols()
+    def parse_gnu_ld_map(self, filename):
+        self.materialize_snapshot()
+        self.add_symbols(mapfile.gnu_ld_symbols(filename))
+
+
+    # Read the image symbol table of a Keil armlink map file (e.g. from 'armlink --map --symbols --list
+    # results.map') and put the data into self.map_var_data & self.map_func_data. filename may be a file object
+    # opened in text or binary mode. See mapfile.armlink_symbols()
+    def parse_armlink_map(self, filename):
+        self.materialize_snapshot()
+        self.add_symbols(mapfile.armlink_symbols(filename))
+
 
     # This function parses the given map (or equivalent) file and adds the data to the existing C Scrape data.
-    # It tries all of the map file parsers it knows of until it finds one that does not throw an exception.
+    # The format is found from the first few KB of the file (see mapfile.sniff()), and the file is read once by
+    # the parser for that format:
+    #   An ELF file                - parse_elf()
+    #   The output of readelf      - parse_readelf_output()
+    #   A GNU ld map file          - parse_gnu_ld_map()
+    #   A Keil armlink map file    - parse_armlink_map()
+    # filename may be a file object (e.g. a pipe) opened in text or binary mode. An exception is raised if the
+    # format is not known, or by the parser if the file does not hold the symbols (e.g. a map file without a
+    # symbol table).
     #
     def parse_output(self, filename):
-        data = None
-
-        # Try all the map file parsers
-        try:
-            if data == None:
-                data = self.parse_readelf_output(filename)
-        except:
-            pass
-        ####
-
-        if data == None:
-            raise Exception("Could not extract data from %s" % filename)
+        self.materialize_snapshot()
+        name = filename if isinstance(filename, str) else getattr(filename, 'name', 'map file')
+        kind, source = mapfile.identify(filename)
+        parsers = { 'elf': elf.iter_symbols, 'readelf': readelf.iter_symbols, 'gnu_ld': mapfile.gnu_ld_symbols,
+                    'armlink': mapfile.armlink_symbols }
+        if kind == None:
+            raise Exception("Unknown map file format of %s" % name)
+        self.add_symbols(parsers[kind](source, name))
 
     # This function returns all of the class data as a json string. The purpose of this function is to allow
     # the class to parse a C project, store the data to a file. The file can then be released with the project 
@@ -851,21 +1512,52 @@ class CScrape():
     #
     # NOTE: The source lines defining functions and variables are included in the data (including comments)
     #
+    # NOTE: Exceptions in the 'exception' keys are written as {'error': <class name>, 'message': <text>}
+    #
     def json_dump(self):
-        data = dict()
-        data['functions']     = self.functions
-        data['typedefs']      = self.typedefs
-        data['variables']     = self.variables
-        data['enums']         = self.enums
-        data['types']         = self.types
-        data['map_var_data']  = self.map_var_data
-        data['map_func_data'] = self.map_func_data
-        return json.dumps(data)
+        f = io.StringIO()
+        self.json_dump_to(f)
+        return f.getvalue()
+
+    # As json_dump() but the data is written to the file object fp (opened in text mode) a record at a time,
+    # so a large model does not have to be held as one string.
+    #
+    def json_dump_to(self, fp):
+        write_sections(fp, self.json_sections())
+
+    # Return the (key, value) pairs written by json_dump()
+    def json_sections(self):
+        return [('functions',     self.functions),
+                ('typedefs',      self.typedefs),
+                ('variables',     self.variables),
+                ('enums',         self.enums),
+                ('types',         self.types),
+                ('map_var_data',  self.map_var_data),
+                ('map_func_data', self.map_func_data)]
 
     # This function takes a string returned by json_out() and re-creates the data
     #
     def json_load(self, str):
-        data = json.loads(str)
+        self.json_load_from(io.StringIO(str))
+
+    # As json_load() but the data is read from the file object fp (text or binary mode, or a pipe) a record
+    # at a time, so the whole file never has to be held in memory.
+    #
+    def json_load_from(self, fp):
+        record_classes = { 'functions': FunctionRecord, 'variables': VariableRecord, 'enums': EnumRecord,
+                           'map_var_data': dict, 'map_func_data': dict }
+        data = dict()
+        reader = JsonStreamReader(fp)
+        for key in reader.members():
+            if key in record_classes:
+                data[key] = [load_record(record_classes[key], record) for record in reader.elements()]
+            elif key == 'typedefs':
+                data[key] = dict()
+                for name in reader.members():
+                    data[key][name] = load_record(TypedefRecord, reader.value())
+            else:
+                data[key] = reader.value()
+        self.close_snapshot()
         self.functions        = data['functions']
         self.typedefs         = data['typedefs']
         self.variables        = data['variables']
@@ -873,14 +1565,88 @@ class CScrape():
         self.types            = data['types']
         self.map_var_data     = data['map_var_data']
         self.map_func_data    = data['map_func_data']
+        self.model_changed()
+
+    # Write the class data to a binary snapshot file. A snapshot holds the same data as json_dump() but can be
+    # loaded by snapshot_load() in a few milliseconds however big it is, because only the records used by
+    # queries are read from the file. This suits tools which only need a few addresses or enum values.
+    def snapshot_dump(self, filename):
+        snapshot.write(filename, { 'functions':     self.functions,
+                                   'variables':     self.variables,
+                                   'enums':         self.enums,
+                                   'typedefs':      self.typedefs,
+                                   'map_var_data':  self.map_var_data,
+                                   'map_func_data': self.map_func_data }, self.types)
+
+
+    # Replace the class data with the data of a snapshot file written by snapshot_dump().
+    # The file is mapped into memory and records are read from it when they are first used. var(), enum()
+    # and enum_type() use the indexes in the file. The lists of records can not be changed until
+    # materialize_snapshot() is called. parse_file() etc. call it.
+    def snapshot_load(self, filename):
+        self.close_snapshot()
+        self.snapshot       = snapshot.Snapshot(filename)
+        self.functions      = snapshot.SnapshotRecords(self.snapshot.table('functions'))
+        self.variables      = snapshot.SnapshotRecords(self.snapshot.table('variables'))
+        self.enums          = snapshot.SnapshotRecords(self.snapshot.table('enums'))
+        self.typedefs       = snapshot.SnapshotTypedefs(self.snapshot.table('typedefs'))
+        self.map_var_data   = snapshot.SnapshotRecords(self.snapshot.table('map_var_data'))
+        self.map_func_data  = snapshot.SnapshotRecords(self.snapshot.table('map_func_data'))
+        self.types          = self.snapshot.types()
+        self.variable_index = snapshot.SnapshotIndex(self.snapshot.table('variables'))
+        self.enum_index     = snapshot.SnapshotIndex(self.snapshot.table('enums'))
+        self.map_var_index  = snapshot.SnapshotMapIndex(self.snapshot.table('map_var_data'))
+        self.model_changed()
+
+
+    # Read all the records of the snapshot loaded by snapshot_load() into ordinary lists, so they can be changed
+    # and added to. Does nothing if no snapshot is loaded.
+    def materialize_snapshot(self):
+        if self.snapshot == None:
+            return
+        self.functions      = list(self.functions)
+        self.variables      = list(self.variables)
+        self.enums          = list(self.enums)
+        self.typedefs       = dict(self.typedefs)
+        self.map_var_data   = list(self.map_var_data)
+        self.map_func_data  = list(self.map_func_data)
+        self.close_snapshot()
+
+
+    # Stop using the snapshot loaded by snapshot_load() (if any)
+    def close_snapshot(self):
+        if self.snapshot != None:
+            self.snapshot.close()
+            self.snapshot = None
+            self.reset_indexes()
+            self.model_changed()
+
+
+    # Create the indexes used to search self.variables, self.enums and self.map_var_data
+    def reset_indexes(self):
+        # Indexes used to search self.variables and self.enums. See var(), enum() and enum_type()
+        self.variable_index = RecordIndex({ 'name':     CScrape.record_name,
+                                            'filename': CScrape.record_filename,
+                                            'function': CScrape.record_function,
+                                            'type':     CScrape.record_type })
+        self.enum_index     = RecordIndex({ 'value':    CScrape.enum_value_names,
+                                            'name':     CScrape.record_name,
+                                            'filename': CScrape.record_filename,
+                                            'function': CScrape.record_function })
+        # Index used to find the map data for a variable. See map_var_match()
+        self.map_var_index  = RecordIndex({ 'name_file': CScrape.map_name_file })
+
 
     # Return the basename (including extension) of the given filename. If the parameter is None, return None
+    # The same few filenames are given for every symbol of a map file, so the results are kept.
     @staticmethod
+    @functools.lru_cache(maxsize=4096)
     def simple_filename(filename):
         if filename == None:
             return None
         return os.path.basename(filename)
 
+
     # Return a copy of the C source with comments removed
     # Comment characters are replaced with a space, newlines are preserved.
     @staticmethod
@@ -1018,6 +1784,182 @@ class CScrape():
                 return result + str[start:]
 
 
+    # Return a copy of the C source with comments, pre-processor directives, attributes and other compiler
+    # extensions (__declspec, __asm__ and __extension__) removed. This does the job of remove_comments(),
+    # remove_preprocessor() and remove_attributes() in a single pass.
+    # Characters are replaced with a space, newlines are preserved. So line numbers and column positions
+    # in the returned string match the original source.
+    # Pre-processor lines continued with a backslash are removed completely.
+    # If keep_directives is True, pre-processor directives are kept (with their comments removed). See find_includes()
+    @staticmethod
+    def sanitize(str, keep_directives=False):
+        # Start with a newline so that a directive on the first line is found. It is removed at the end.
+        str = '\n' + str
+        result = []
+        start = 0  # Start of the text not yet copied to result
+        pos = 0    # Position to search from
+        search = _SANITIZE_RE.search
+        while True:
+            match = search(str, pos)
+            if match == None:
+                break
+            kind = match.lastgroup
+            pos = match.end()
+            if kind == 'string':
+                # Keep string and character literals as they are
+                continue
+            if kind == 'directive' and keep_directives:
+                # Search the directive for comments, strings and keywords as if it were code
+                pos = match.start() + 1
+                continue
+            if kind == 'keyword':
+                keyword = match.group(kind)
+                if keyword != '__extension__':
+                    pos = CScrape.skip_brackets(str, pos, keyword.startswith('__asm'))
+            elif kind == 'comment' and match.group(kind).find('\n') != -1 and not keep_directives:
+                # A directive after a comment ending on a later line e.g. '/* a\n b */ #define X 1'
+                directive = _DIRECTIVE_RE.match(str, pos)
+                if directive != None:
+                    pos = directive.end()
+            result.append(str[start:match.start()])
+            result.append(CScrape.blank(str[match.start():pos]))
+            start = pos
+        result.append(str[start:])
+        return ''.join(result)[1:]
+
+    # Return the position after the brackets following an attribute/asm keyword.
+    # e.g. for '__attribute__ ((used)) x', pos is the position after '__attribute__' and the position
+    # of ' x' is returned. If there are no brackets or they are not matched, pos is returned.
+    @staticmethod
+    def skip_brackets(str, pos, asm=False):
+        if asm:
+            q = _ASM_QUALIFIERS_RE.match(str, pos).end()
+        else:
+            q = _WHITESPACE_RE.match(str, pos).end()
+        if not str.startswith('(', q):
+            return pos
+        count = 0
+        for match in _BRACKET_RE.finditer(str, q):
+            token = match.group(0)
+            if token == '(':
+                count += 1
+            elif token == ')':
+                count -= 1
+                if count == 0:
+                    return match.end()
+        return pos
+
+    # Return a string the same length as the given string, with every character other than newline
+    # replaced by a space.
+    @staticmethod
+    def blank(str):
+        if str.find('\n') == -1:
+            return ' ' * len(str)
+        return '\n'.join([' ' * len(line) for line in str.split('\n')])
+
+
+    # Return the map data (an item of self.map_var_data) for the given variable (an item of self.variables) or None
+    # if there is none. An exception is raised if more than one item matches.
+    # query - Query string used in the exception message.
+    # Map data with a 'file' of None (e.g. global objects) matches a variable in any file. Map data with a 'func'
+    # of None matches a variable in any function.
+    def map_var_match(self, value, query):
+        position = self.map_var_position(value, query)
+        if position == None:
+            return None
+        return self.map_var_data[position]
+
+
+    # As map_var_match() but the position of the map data in self.map_var_data is returned
+    def map_var_position(self, value, query):
+        index = self.map_var_index
+        index.sync(self.map_var_data)
+        filename  = self.simple_filename(value['filename'])
+        positions = index.indexes['name_file'].get((value['name'], None), [])
+        if filename != None:
+            positions = positions + index.indexes['name_file'].get((value['name'], filename), [])
+        match = None
+        for position in sorted(positions):
+            map_data = self.map_var_data[position]
+            if map_data['func'] != None and value['function'] != map_data['func']:
+                continue
+            if match != None:
+                raise Exception("Duplicate variable in map '%s'  %s:%d and %s:%d" % (query,
+                           value['filename'], value['line_number'],
+                           value['filename'], value['line_number']))
+            match = position
+        return match
+
+
+    # Set the 'addr' of every variable in self.variables from the map data (None if the variable is not in the
+    # map data). Returns the number of variables given an address.
+    # An exception is raised if more than one item of map data matches a variable.
+    def resolve_all_addresses(self):
+        count = 0
+        for value in self.variables:
+            query = 'var:%s:%s:*:%s' % (self.simple_filename(value['filename']), value['function'], value['name'])
+            map_data = self.map_var_match(value, query)
+            if map_data != None:
+                value['addr'] = map_data['addr']
+                count += 1
+            else:
+                value['addr'] = None
+        return count
+
+
+    # Return the position of the only record matching a query.
+    # matches - List of the positions of the matching records (in order)
+    # records - List the positions refer to e.g. self.variables
+    # An exception is raised if there is no match or more than one match. 'duplicate_name' and 'missing_name'
+    # are used in the exception message.
+    @staticmethod
+    def single_match(matches, records, duplicate_name, query, missing_name=None):
+        if len(matches) == 0:
+            raise Exception("Missing %s '%s'" % (missing_name or duplicate_name, query))
+        if len(matches) > 1:
+            index, match = matches[1], matches[0]
+            raise Exception("Duplicate %s '%s'  %s:%d and %s:%d" % (duplicate_name, query,
+                       records[index]['filename'], records[index]['line_number'],
+                       records[match]['filename'], records[match]['line_number']))
+        return matches[0]
+
+
+    # Return a dict of RecordIndex search criteria from the keyword arguments, leaving out wildcards ('*')
+    @staticmethod
+    def query_criteria(**kwargs):
+        criteria = dict()
+        for name in kwargs:
+            if kwargs[name] != '*':
+                criteria[name] = kwargs[name]
+        return criteria
+
+
+    # Functions returning the keys a record is indexed under. See RecordIndex
+    @staticmethod
+    def record_name(record):
+        return (record['name'],)
+
+    @staticmethod
+    def record_filename(record):
+        return (CScrape.simple_filename(record['filename']),)
+
+    @staticmethod
+    def record_function(record):
+        return (record.get('function'),)
+
+    @staticmethod
+    def record_type(record):
+        return (record.get('type'),)
+
+    @staticmethod
+    def map_name_file(record):
+        return ((record['name'], CScrape.simple_filename(record['file'])),)
+
+    @staticmethod
+    def enum_value_names(record):
+        return tuple(record['values'])
+
+
     # This function returns the value of the specifed enum.
     # If the same query had been made before, the cache value is returned.
     # The search can be narrowed down by specifying the file and/or function and/or enum typename for the enum.
@@ -1026,38 +1968,31 @@ class CScrape():
     def enum(self, name, filename='*', function='*', typename='*'):
         query = 'enum:' + filename + ':' + function + ':' + typename + ':' + name
         # Have we asked for this before?
-        try:
-            return self.previous_queries[query] 
-        except:
-            pass        
-        
-        # Search all enums
-        match = None
-        for index in range(len(self.enums)):
-            matched = True
-            if matched and function != '*' and function != self.enums[index]['function']:
-                matched = False
-            if matched and filename != '*' and filename != self.simple_filename(self.enums[index]['filename']):
-                matched = False
-            if matched and typename != '*' and typename != self.enums[index]['name']:
-                matched = False
-            if matched and not name in self.enums[index]['values']:
-                matched = False
-            if matched and match != None:
-                raise Exception("Duplicate enum '%s'  %s:%d and %s:%d" % (query, 
-                           self.enums[index]['filename'], self.enums[index]['line_number'],  
-                           self.enums[match]['filename'], self.enums[match]['line_number']))
-            # If we have a match, remember the index
-            if matched:
-                match = index
-        if match == None:
-            raise Exception("Missing enum '%s'" % query)
-        
-        value = self.enums[match]['values'][name]['value']
-        self.previous_queries[query] = value
+        value = self.cached_query(query)
+        if value != None:
+            return value
+        value = self.find_enum(query, name, filename, function, typename)
+        self.query_cache.put(query, value)
         return value
 
 
+    # Search the enums for a value called 'name'. See enum()
+    def find_enum(self, query, name, filename, function, typename):
+        matches = self.enum_index.find(self.enums, CScrape.query_criteria(value=name, filename=filename,
+                                                                           function=function, name=typename))
+        match = self.single_match(matches, self.enums, "enum", query)
+        return self.enums[match]['values'][name]['value']
+
+
+    # Return a list of the values of many enums. Each item of queries is either the enum name or a tuple
+    # of the enum() parameters e.g. ('RED', '*', '*', 'colour_t'). The results are in the same order as the queries.
+    # If a query does not match exactly one enum, its result is the exception that enum() would raise.
+    # Usage:
+    #   red, green = obj.enums_bulk(['RED', ('GREEN', 'colours.c')])
+    def enums_bulk(self, queries):
+        return self.bulk_query(queries, 'enum', self.find_enum)
+
+
     # This function returns a dict() of all the enums matching the query. The key for the
     # dict is the enum name. Each element is itself a dict with the following values
     #       'value'      - Value of enum
@@ -1071,32 +2006,16 @@ class CScrape():
     def enum_type(self, filename='*', function='*', typename='*'):
         query = 'enum_type:' + filename + ':' + function + ':' + typename
         # Have we asked for this before?
-        try:
-            return self.previous_queries[query] 
-        except:
-            pass        
+        value = self.cached_query(query)
+        if value != None:
+            return value
         
-        # Search all enums
-        match = None
-        for index in range(len(self.enums)):
-            matched = True
-            if matched and function != '*' and function != self.enums[index]['function']:
-                matched = False
-            if matched and filename != '*' and filename != self.simple_filename(self.enums[index]['filename']):
-                matched = False
-            if matched and typename != '*' and typename != self.enums[index]['name']:
-                matched = False
-            if matched and match != None:
-                raise Exception("Duplicate enum '%s'  %s:%d and %s:%d" % (query, 
-                           self.enums[index]['filename'], self.enums[index]['line_number'],  
-                           self.enums[match]['filename'], self.enums[match]['line_number']))
-            if matched:
-                match = index
-        if match == None:
-            raise Exception("Missing enum '%s'" % query)
-                    
-        value = self.enums[match]['values']
-        self.previous_queries[query] = value
+        # Search the enums
+        matches = self.enum_index.find(self.enums, CScrape.query_criteria(filename=filename, function=function,
+                                                                           name=typename))
+        match = self.single_match(matches, self.enums, "enum", query)
+        value = copy_value(self.enums[match]['values'])
+        self.query_cache.put(query, value)
         return value
 
 
@@ -1116,56 +2035,129 @@ class CScrape():
     def var(self, name, filename='*', function='*', typename='*'):
         query = 'var:' + filename + ':' + function + ':' + typename + ':' + name
         # Have we asked for this before?
-        try:
-            return self.previous_queries[query] 
-        except:
-            pass        
-        
-        # Search all variables
-        match = None
-        for index in range(len(self.variables)):
-            matched = True
-            if matched and name     != '*' and name     != self.variables[index]['name']:
-                matched = False
-            if matched and function != '*' and function != self.variables[index]['function']:
-                matched = False
-            if matched and filename != '*' and filename != self.simple_filename(self.variables[index]['filename']):
-                matched = False
-            if matched and typename != '*' and typename != self.variables[index]['type']:
-                matched = False
-            if matched and match != None:
-                raise Exception("Duplicate variables '%s'  %s:%d and %s:%d" % (query, 
-                           self.variables[index]['filename'], self.variables[index]['line_number'],  
-                           self.variables[match]['filename'], self.variables[match]['line_number']))
-            if matched:
-                match = index
-        if match == None:
-            raise Exception("Missing variable '%s'" % query)
-        value = self.variables[match]
-
-        # Incorporate the address of the variable from the map data
-        match = None
-        for index in range(len(self.map_var_data)):
-            matched = True
-            if matched and value['name'] != self.map_var_data[index]['name']:
-                matched = False
-            if matched and self.map_var_data[index]['func'] != None and value['function'] != self.map_var_data[index]['func']:
-                matched = False
-            if matched and self.simple_filename(self.map_var_data[index]['file']) != None and self.simple_filename(value['filename']) != self.simple_filename(self.map_var_data[index]['file']):
-                matched = False
-            if matched and match != None:
-                raise Exception("Duplicate variable in map '%s'  %s:%d and %s:%d" % (query, 
-                           value['filename'], value['line_number'],  
-                           value['filename'], value['line_number']))
-            if matched:
-                match = index
-        if match != None:
-            value['addr'] = self.map_var_data[match]['addr']
+        value = self.cached_query(query)
+        if value != None:
+            return value
+        value = self.find_var(query, name, filename, function, typename)
+        self.query_cache.put(query, value)
+        return value
+
+
+    # Search the variables. See var()
+    def find_var(self, query, name, filename, function, typename):
+        matches = self.variable_index.find(self.variables, CScrape.query_criteria(name=name, filename=filename,
+                                                                                   function=function, type=typename))
+        match = self.single_match(matches, self.variables, "variables", query, "variable")
+        # Incorporate the address of the variable from the map data into a copy of the variable
+        value = copy_value(self.variables[match])
+        map_data = self.map_var_match(value, query)
+        if map_data != None:
+            value['addr'] = map_data['addr']
         else:
             value['addr'] = None
-
-                    
-        self.previous_queries[query] = value
         return value
 
 
+    # Return the variable or function at an address, and the member and array items of the variable holding it,
+    # as an AddressMatch (or None if no variable or function holds the address). The addresses and sizes come
+    # from the map data (e.g. parse_elf()) and the members from the layouts of the types. e.g.
+    #   match = obj.addr_lookup(0x20000134)
+    #   print(match.location())       # e.g. 'samples[12].flags+0x1'
+    # See address_index.AddressIndex
+    def addr_lookup(self, addr):
+        return self.address_index.lookup(addr)
+
+
+    # Return the AddressMatch (or None) of each of a list of addresses (e.g. from a bus trace), in the same order.
+    # The symbols of all the addresses are found in one search. obj.address_index.find() gives just the symbols
+    # of a large array of addresses.
+    def addr_lookup_bulk(self, addresses):
+        return self.address_index.lookup_bulk(addresses)
+
+
+    # Return a list of the details of many variables. Each item of queries is either the variable name or a tuple
+    # of the var() parameters e.g. ('count', 'main.c', 'main'). The results are in the same order as the queries.
+    # If a query does not match exactly one variable, its result is the exception that var() would raise.
+    # Usage:
+    #   for value in obj.vars_bulk(names):
+    #       if isinstance(value, Exception):
+    #           ...
+    def vars_bulk(self, queries):
+        return self.bulk_query(queries, 'var', self.find_var)
+
+
+    # Resolve each of the queries for vars_bulk() or enums_bulk().
+    # kind - 'var' or 'enum'. The start of the query string.
+    # find - find_var() or find_enum()
+    # The query cache is checked once for the whole list and repeated queries are only resolved once.
+    def bulk_query(self, queries, kind, find):
+        self.check_query_cache()
+        resolved = dict()  # Key is the query string. Value is the result.
+        results = []
+        for item in queries:
+            try:
+                if isinstance(item, str):
+                    item = (item,)
+                name, filename, function, typename = tuple(item) + ('*',) * (4 - len(item))
+                query = kind + ':' + filename + ':' + function + ':' + typename + ':' + name
+            except Exception as e:
+                results.append(Exception("Bad %s query %r: %s" % (kind, item, e)))
+                continue
+            if query in resolved:
+                value = resolved[query]
+                if not isinstance(value, Exception):
+                    value = copy_value(value)
+                results.append(value)
+                continue
+            value = self.query_cache.get(query)
+            if value == None:
+                try:
+                    value = find(query, name, filename, function, typename)
+                    self.query_cache.put(query, value)
+                except Exception as e:
+                    value = e
+            resolved[query] = value
+            results.append(value)
+        return results
+
+
+# The CScrape object used by a parse_files() worker process
+_worker_scrape = None
+
+# Set up a parse_files() worker process
+def _parse_files_worker_init(state):
+    global _worker_scrape
+    _worker_scrape = CScrape()
+    _worker_scrape.set_scrape_state(state)
+
+# Parse a file in a parse_files() worker process and return a tuple of
+#   - the records found. See CScrape.scrape_results()
+#   - the typedef names declared by the file. See CScrape.parse_source_file()
+#   - the scrape cache counts for the file (or None if there is no scrape cache).
+# The records are removed from the worker's CScrape object, so each file starts from the same state.
+def _parse_files_worker(filename, follow_includes):
+    mark = _worker_scrape.scrape_mark()
+    parsed_headers = set(_worker_scrape.parsed_headers)
+    cache = _worker_scrape.scrape_cache
+    if cache != None:
+        cache.hits = cache.misses = cache.stores = cache.evictions = 0
+    try:
+        typedef_names = _worker_scrape.parse_source_file(filename, follow_includes)
+        results = _worker_scrape.scrape_results(mark)
+        if cache != None:
+            return results, typedef_names, cache.stats()
+        return results, typedef_names, None
+    finally:
+        del _worker_scrape.functions[mark[0]:]
+        del _worker_scrape.variables[mark[1]:]
+        del _worker_scrape.enums[mark[2]:]
+        # The next file may add as many records as were removed, which the indexes would not notice
+        _worker_scrape.variable_index.reset()
+        _worker_scrape.enum_index.reset()
+        for name in list(_worker_scrape.typedefs)[mark[3]:]:
+            del _worker_scrape.typedefs[name]
+        # The typedefs of the next file may be as many as those removed, so the digest must start again
+        _worker_scrape.typedefs_digest = None
+        for key in list(_worker_scrape.parsed_headers):
+            if not key in parsed_headers:
+                del _worker_scrape.parsed_headers[key]
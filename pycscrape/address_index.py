@@ -0,0 +1,255 @@
+#-----------------------------------------------------------------
+#    pycscrape: Python library for gathering information from C source files.
+#    Copyright (C) 2017  Mike Morgan  (mikemorgan@blueyonder.co.uk)
+#
+#    This library is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this library.  If not, see <http://www.gnu.org/licenses/>.
+#-----------------------------------------------------------------
+#
+#  Finding the variable or function (and the member of the variable) at an address. See CScrape.addr_lookup()
+#-----------------------------------------------------------------
+
+import bisect
+
+# NumPy is only used (if installed) to look up many addresses at once. See AddressIndex.find()
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# The variable or function at an address. Offsets are in bytes.
+#   kind     - 'var' or 'func'
+#   name     - Name of the variable or function
+#   symbol   - The map data (an item of CScrape.map_var_data or CScrape.map_func_data) holding the address
+#   offset   - Offset of the address from the start of the variable or function
+#   variable - The variable (an item of CScrape.variables) the map data is for, or None if it is not known
+#   path     - The array items and members holding the address e.g. '[2].pts[1].x' for 'rec_t recs[4];' or
+#              '.count' for 'rec_t rec;'. '' if the address is not in an item or member (e.g. a function, or a
+#              variable of unknown type).
+#   index    - The array indexes in the path e.g. (2, 1)
+#   field    - The LayoutField of the innermost member in the path, or None
+#   remainder - Offset of the address from the start of the innermost member or item in the path
+class AddressMatch():
+    __slots__ = ('kind', 'name', 'symbol', 'offset', 'variable', 'path', 'index', 'field', 'remainder')
+
+    def __init__(self, kind, symbol, offset, variable=None, path='', index=(), field=None, remainder=None):
+        self.kind      = kind
+        self.name      = symbol['name']
+        self.symbol    = symbol
+        self.offset    = offset
+        self.variable  = variable
+        self.path      = path
+        self.index     = tuple(index)
+        self.field     = field
+        self.remainder = offset if remainder == None else remainder
+
+    # Return the address as text e.g. 'recs[2].pts[1].x', 'recs[3]+0x4' or 'main+0x1c'
+    def location(self):
+        if self.remainder == 0:
+            return self.name + self.path
+        return '%s%s+0x%x' % (self.name, self.path, self.remainder)
+
+    def __repr__(self):
+        return 'AddressMatch(%r, %r, offset=%d, path=%r, index=%r)' % (self.kind, self.name, self.offset, self.path,
+                                                                       self.index)
+
+
+# Return the indexes of item number n of an array with the given sizes e.g. (1, 2) for n = 5 of 'x[3][3]'
+def array_indexes(n, array):
+    indexes = []
+    for size in reversed(array):
+        n, i = divmod(n, size)
+        indexes.append(i)
+    return indexes[::-1]
+
+
+# Finds the variable or function at an address, from the addresses and sizes of the map data (see
+# CScrape.parse_elf()), and the member of a variable from the layout of its type (see CScrape.layout()).
+#
+# The map data is made into a sorted list of intervals that do not overlap, each belonging to the symbol
+# holding it, so an address is found with a binary search (bisect, or numpy.searchsorted() for many addresses).
+# Where symbols overlap, an address belongs to the one starting last. A symbol of unknown (or zero) size only
+# holds its own address.
+#
+# The index is built when first needed, and built again if the map data, variables or configuration change.
+class AddressIndex():
+    def __init__(self, scrape):
+        self.scrape = scrape
+        self.reset()
+
+
+    # Drop the index. It is built again when next needed.
+    def reset(self):
+        self.key       = None
+        self.symbols   = []       # (kind, map data, position in the map data list) of each symbol
+        self.starts    = []       # Sorted start addresses of the intervals
+        self.owners    = []       # Position in self.symbols of the symbol holding each interval, or -1 for a gap
+        self.arrays    = None     # self.starts and self.owners as NumPy arrays (made when first needed)
+        self.variables = dict()   # The variable of each symbol, by position in self.symbols
+        self.children  = dict()   # Members of each type, by type name. See members()
+
+
+    # Build the index if it has not been built since the data it depends on changed
+    def sync(self):
+        scrape = self.scrape
+        key = (id(scrape.map_var_data), len(scrape.map_var_data), id(scrape.map_func_data),
+               len(scrape.map_func_data), id(scrape.variables), len(scrape.variables),
+               scrape.layout_engine.settings())
+        if key != self.key:
+            self.reset()
+            self.build()
+            self.key = key
+
+
+    # Build the intervals of the symbols
+    def build(self):
+        scrape = self.scrape
+        starts = []
+        ends = []
+        for kind, records in (('var', scrape.map_var_data), ('func', scrape.map_func_data)):
+            for position, data in enumerate(records):
+                if data['addr'] == None:
+                    continue
+                self.symbols.append((kind, data, position))
+                starts.append(data['addr'])
+                ends.append(data['addr'] + max(data['size'] or 0, 1))
+        bounds = sorted(set(starts) | set(ends))
+        where = dict([(bound, i) for i, bound in enumerate(bounds)])
+        owners = [-1] * len(bounds)
+        # The intervals of symbols starting later (or smaller ones starting at the same address) are written over
+        # those of the symbols they overlap. Of two symbols with the same interval, the first is kept.
+        for n in sorted(range(len(starts)), key=lambda n: (starts[n], -ends[n], -n)):
+            for i in range(where[starts[n]], where[ends[n]]):
+                owners[i] = n
+        self.starts = bounds
+        self.owners = owners
+        # The variable of each item of map data. Variables matching more than one item of map data are skipped.
+        by_position = dict([(position, n) for n, (kind, data, position) in enumerate(self.symbols) if kind == 'var'])
+        for value in scrape.variables:
+            try:
+                position = scrape.map_var_position(value, value['name'])
+            except Exception:
+                continue
+            if position != None and position in by_position:
+                self.variables[by_position[position]] = value
+
+
+    # Return the position in self.symbols of the symbol holding each of the addresses, or -1 for an address
+    # without a symbol. If NumPy is installed the addresses are looked up together with numpy.searchsorted() and
+    # a NumPy array is returned, otherwise a list.
+    def find(self, addresses):
+        self.sync()
+        if numpy != None:
+            if self.arrays == None:
+                self.arrays = (numpy.array(self.starts, dtype=numpy.uint64),
+                               numpy.array(self.owners + [-1], dtype=numpy.int64))
+            starts, owners = self.arrays
+            # An index of -1 (before the first interval) is the -1 at the end of owners
+            return owners[numpy.searchsorted(starts, numpy.asarray(addresses, dtype=numpy.uint64), 'right') - 1]
+        starts, owners, search = self.starts, self.owners, bisect.bisect_right
+        return [owners[search(starts, address) - 1] if address >= starts[0] else -1 for address in addresses] \
+               if len(starts) != 0 else [-1] * len(addresses)
+
+
+    # Return the AddressMatch of an address, or None if no variable or function holds it. One address is found
+    # with bisect, which is quicker than making NumPy arrays for it.
+    def lookup(self, address):
+        self.sync()
+        i = bisect.bisect_right(self.starts, address) - 1
+        return self.match(self.owners[i] if i >= 0 else -1, address)
+
+
+    # Return the AddressMatch (or None) of each of the addresses. Each different address is only matched once.
+    def lookup_bulk(self, addresses):
+        matches = dict()
+        results = []
+        for n, address in zip(self.find(addresses), addresses):
+            if address in matches:
+                results.append(matches[address])
+            else:
+                match = self.match(int(n), address)
+                matches[address] = match
+                results.append(match)
+        return results
+
+
+    # Return the AddressMatch of an address held by symbol number n (or None if n is -1)
+    def match(self, n, address):
+        if n < 0:
+            return None
+        kind, data, position = self.symbols[n]
+        offset = address - data['addr']
+        variable = self.variables.get(n)
+        if variable == None:
+            return AddressMatch(kind, data, offset)
+        path, index, field, remainder = self.member_at(variable, offset)
+        return AddressMatch(kind, data, offset, variable, path, index, field, remainder)
+
+
+    # Return (path, array indexes, LayoutField, remainder) of the member of a variable at a byte offset. See
+    # AddressMatch. Of the members of a union (or bit fields sharing a byte), the first declared is given.
+    def member_at(self, variable, offset):
+        scrape = self.scrape
+        path = ''
+        index = []
+        field = None
+        array = variable['array'] or ()
+        try:
+            size = scrape.POINTER_SIZE if variable['ptr'] else scrape.layout(variable['type']).size
+        except Exception:
+            return path, index, field, offset      # A type which is not known
+        bit = offset * 8
+        count = 1
+        for i in array:
+            count *= i
+        if len(array) != 0 and size != 0 and bit // size < count:
+            index = array_indexes(bit // size, array)
+            path = ''.join(['[%d]' % i for i in index])
+            bit -= (bit // size) * size
+        start = 0
+        prefix = ''
+        members = dict() if variable['ptr'] else self.members(variable['type'])
+        while True:
+            # The member of this level holding the byte, if any. A member with an array of structs lists the
+            # members of its first item.
+            for member in members.get(prefix, ()):
+                if member.offset < bit + 8 and member.offset + member.size > bit:
+                    break
+            else:
+                break
+            field = member
+            path += '.' + member.path[len(prefix):]
+            start = member.offset
+            if len(member.array) != 0:
+                item = member.item_size()
+                n = min((bit - member.offset) // item, member.count() - 1) if item != 0 else 0
+                indexes = array_indexes(n, member.array)
+                index += indexes
+                path += ''.join(['[%d]' % i for i in indexes])
+                bit -= n * item
+            prefix = member.path + '.'
+        return path, index, field, (bit - start) // 8
+
+
+    # Return a dict of the members of a struct (or union) type, by the path of the member holding them plus '.'
+    # ('' for the members of the type itself). See Layout.fields
+    def members(self, type_name):
+        members = self.children.get(type_name)
+        if members == None:
+            members = dict()
+            for field in self.scrape.layout(type_name).fields:
+                if field.path != '':
+                    members.setdefault(field.path[:field.path.rfind('.') + 1], []).append(field)
+            self.children[type_name] = members
+        return members
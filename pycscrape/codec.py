@@ -0,0 +1,403 @@
+#-----------------------------------------------------------------
+#    pycscrape: Python library for gathering information from C source files.
+#    Copyright (C) 2017  Mike Morgan  (mikemorgan@blueyonder.co.uk)
+#
+#    This library is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this library.  If not, see <http://www.gnu.org/licenses/>.
+#-----------------------------------------------------------------
+#
+#  Decoding and encoding the bytes of variables and types. See CScrape.decode() and CScrape.encode()
+#-----------------------------------------------------------------
+
+import struct
+
+
+# struct module format character of each size (in bytes) of integer
+INTEGER_CODES = { 1: 'b', 2: 'h', 4: 'i', 8: 'q' }
+FLOAT_CODES   = { 4: 'f', 8: 'd' }
+
+
+# Return the product of the array sizes
+def count(array):
+    count = 1
+    for i in array:
+        count *= i
+    return count
+
+
+# Return nested lists of the values[start:] with the given array sizes e.g. dims (2, 3) gives [[a,b,c], [d,e,f]]
+def reshape(values, start, dims):
+    if len(dims) == 1:
+        return list(values[start:start+dims[0]])
+    step = count(dims[1:])
+    return [reshape(values, start + n * step, dims[1:]) for n in range(dims[0])]
+
+
+# Return a flat list of the values of (nested) lists with the given array sizes. Missing values are default.
+def items(values, dims, default=0):
+    if len(dims) == 1:
+        values = list(values)
+        if len(values) > dims[0]:
+            raise ValueError('Too many values (%d) for an array of %d' % (len(values), dims[0]))
+        return values + [default] * (dims[0] - len(values))
+    if len(values) > dims[0]:
+        raise ValueError('Too many values (%d) for an array of %d' % (len(values), dims[0]))
+    flat = []
+    for n in range(dims[0]):
+        flat.extend(items(values[n] if n < len(values) else (), dims[1:], default))
+    return flat
+
+
+# Return the value of a bit field which is not in a unit decoded by the struct of the codec
+def read_bits(buf, offset, length, byteorder, shift, width, signed):
+    value = (int.from_bytes(buf[offset:offset+length], byteorder) >> shift) & ((1 << width) - 1)
+    if signed and value >= 1 << (width - 1):
+        value -= 1 << width
+    return value
+
+
+# Set the value of a bit field which is not in a unit encoded by the struct of the codec
+def write_bits(buf, offset, length, byteorder, shift, width, value):
+    mask = ((1 << width) - 1) << shift
+    unit = int.from_bytes(buf[offset:offset+length], byteorder) & ~mask
+    buf[offset:offset+length] = (unit | ((value << shift) & mask)).to_bytes(length, byteorder)
+
+
+# Decodes and encodes the bytes of a variable or type. The values are
+#   - int (or float, or bool) for a single value
+#   - list for an array (nested lists for arrays of arrays)
+#   - dict for a struct or union, whose key is the name of each member. Members of anonymous structs and unions
+#     are members of the struct holding them.
+#
+# The functions are generated Python code (see 'source') which unpack all the values with one struct.Struct
+# and build the value with no tests for the type of each member. Structs held in arrays and members which
+# share bytes with another member (e.g. the second member of a union) are decoded by their own codecs.
+#
+# When encoding, missing members and array items are zero. For a union, give only the member to be written
+# (if more than one is given, they are written in order).
+class Codec():
+    def __init__(self, name, size, source, names):
+        self.name   = name
+        self.size   = size      # Size in bytes
+        self.source = source    # The Python source of the functions
+        code = compile(source, '<codec %s>' % name, 'exec')
+        exec(code, names)
+        self.decode_from = names['decode']
+        self.encode_into = names['encode_into']
+
+    # Return the value decoded from buf (bytes, bytearray, memoryview or mmap) at the given byte offset. The
+    # bytes are not copied.
+    def decode(self, buf, offset=0):
+        return self.decode_from(buf, offset)
+
+    # Return the bytes of the value
+    def encode(self, value):
+        buf = bytearray(self.size)
+        self.encode_into(buf, 0, value)
+        return bytes(buf)
+
+    def __repr__(self):
+        return 'Codec(%r, size=%d)' % (self.name, self.size)
+
+
+# Builds the source of the functions of one Codec. See Codecs.
+class CodecCompiler():
+    def __init__(self, codecs, size):
+        self.codecs     = codecs
+        self.scrape     = codecs.scrape
+        self.byteorder  = codecs.byteorder
+        self.size       = size          # Size in bytes
+        self.format     = []            # struct format of the values decoded together
+        self.pos        = 0             # Byte offset of the end of the format
+        self.items      = 0             # Number of values unpacked by the format
+        self.args       = []            # Expression(s) giving each value packed by the format
+        self.statements = []            # Statements encoding the values not in the format
+        self.units      = dict()        # Key is (byte offset, length) of a bit field unit. Value is (index of
+                                        # its value, index of its item of args)
+        self.names      = { 'reshape': reshape, 'items': items, 'read_bits': read_bits, 'write_bits': write_bits,
+                            'EMPTY': dict() }
+
+
+    # Add a global name for the generated code and return the name
+    def global_name(self, prefix, value):
+        name = '%s%d' % (prefix, len(self.names))
+        self.names[name] = value
+        return name
+
+
+    # Add count values of the struct format code at the byte offset. Returns the index of the first value.
+    def add(self, offset, code, count):
+        if offset > self.pos:
+            self.format.append('%dx' % (offset - self.pos))
+        self.format.append(code if count == 1 else '%d%s' % (count, code))
+        self.pos = offset + struct.calcsize('<' + code) * count
+        index = self.items
+        self.items += count
+        return index
+
+
+    # Return the Python source of the codec functions for a value whose bits start at bit_offset
+    # (see value() for the parameters)
+    def source(self, type_name, array, ptr, types):
+        decode = self.value(type_name, array, ptr, types, 0, 'value', None)
+        if self.pos < self.size:
+            self.format.append('%dx' % (self.size - self.pos))
+        main = self.global_name('S', struct.Struct(self.codecs.prefix + ''.join(self.format)))
+        args = ''.join([', ' + ' | '.join(parts or ['0']) for parts in self.args])
+        lines = ['def decode(buf, offset=0):',
+                 '    v = %s.unpack_from(buf, offset)' % main,
+                 '    return %s' % decode,
+                 '',
+                 'def encode_into(buf, offset, value):',
+                 '    %s.pack_into(buf, offset%s)' % (main, args)]
+        lines += ['    ' + statement for statement in self.statements]
+        return '\n'.join(lines) + '\n'
+
+
+    # Return the expression decoding a value, and add the code encoding it.
+    #   type_name - Name of the type
+    #   array     - Array sizes
+    #   ptr       - Number of ptr specifiers
+    #   types     - Elements of a struct (or union) defined within a struct. Otherwise None
+    #   bit_offset- Bit offset of the value from the start of the codec
+    #   source    - Expression giving the value to encode
+    #   guard     - Condition for encoding the value if it is not in the struct format (e.g. the second
+    #               member of a union is only written if it is given) or None.
+    def value(self, type_name, array, ptr, types, bit_offset, source, guard):
+        kind, info, item_size = self.codecs.resolve(type_name, ptr, types)
+        offset = bit_offset // 8
+        array = tuple(array or ())
+        prefix = '' if guard == None else 'if %s: ' % guard
+        if kind == 'scalar':
+            n = count(array)
+            if offset >= self.pos:
+                index = self.add(offset, info, n)
+                if len(array) == 0:
+                    self.args.append([source])
+                    return 'v[%d]' % index
+                self.args.append(['*items(%s, %r)' % (source, array)])
+                if len(array) == 1:
+                    return 'list(v[%d:%d])' % (index, index + n)
+                return 'reshape(v, %d, %r)' % (index, array)
+            # The value shares bytes with a value already in the format
+            separate = self.global_name('S', struct.Struct(self.codecs.prefix + '%d%s' % (n, info)))
+            if len(array) == 0:
+                self.statements.append('%s%s.pack_into(buf, offset + %d, %s)' % (prefix, separate, offset, source))
+                return '%s.unpack_from(buf, offset + %d)[0]' % (separate, offset)
+            self.statements.append('%s%s.pack_into(buf, offset + %d, *items(%s, %r))' % (prefix, separate, offset,
+                                                                                        source, array))
+            return 'reshape(%s.unpack_from(buf, offset + %d), 0, %r)' % (separate, offset, array)
+
+        # A struct or union
+        if len(array) == 0 and offset >= self.pos:
+            return self.members(info, bit_offset, source)
+        codec = self.global_name('C', self.codecs.aggregate(type_name, info, item_size))
+        if len(array) == 0:
+            self.statements.append('%s%s.encode_into(buf, offset + %d, %s)' % (prefix, codec, offset, source))
+            return '%s.decode_from(buf, offset + %d)' % (codec, offset)
+        stride = item_size // 8
+        self.statements.append('%sfor n, item in enumerate(items(%s, %r, EMPTY)): %s.encode_into(buf, offset + %d + n * %d, item)' % (
+                               prefix, source, array, codec, offset, stride))
+        decode = '[%s.decode_from(buf, offset + %d + n * %d) for n in range(%d)]' % (codec, offset, stride, count(array))
+        if len(array) == 1:
+            return decode
+        return 'reshape(%s, 0, %r)' % (decode, array)
+
+
+    # Return the expression decoding the members of a struct (or union) as a dict
+    def members(self, elements, bit_offset, source):
+        return '{' + ', '.join(['%r: %s' % pair for pair in self.member_pairs(elements, bit_offset, source)]) + '}'
+
+
+    # Return a list of (name, expression) of the members of a struct (or union)
+    def member_pairs(self, elements, bit_offset, source):
+        pairs = []
+        for element in elements:
+            name = element['var_name']
+            offset = bit_offset + element['offset']
+            if name == None:
+                if element.get('types') != None:
+                    # An anonymous struct or union. Its members are members of this struct.
+                    pairs += self.member_pairs(element['types'], offset, source)
+                continue
+            if element.get('bit_field'):
+                if element['size'] != 0:
+                    pairs.append((name, self.bit_field(element, offset, '%s.get(%r, 0)' % (source, name),
+                                                       '%r in %s' % (name, source))))
+                continue
+            if element.get('types') != None or (len(element['array'] or ()) == 0 and not element['ptr'] and
+                                               self.codecs.resolve(element['type_name'], 0, None)[0] != 'scalar'):
+                default = 'EMPTY'
+            elif len(element['array'] or ()) != 0:
+                default = '()'
+            else:
+                default = '0'
+            guard = None
+            if offset // 8 < self.pos:
+                guard = '%r in %s' % (name, source)
+            pairs.append((name, self.value(element['type_name'], element['array'], element['ptr'], element.get('types'),
+                                           offset, '%s.get(%r, %s)' % (source, name, default), guard)))
+        return pairs
+
+
+    # Return the expression decoding a bit field, and add the code encoding it. The bits are decoded from a
+    # unit of the struct format: the unit of the bit field's type if it can be added (or has been added for
+    # a previous bit field), otherwise the smallest unit holding the bits. Bits which share bytes with values
+    # already in the format are only written if guard (e.g. the member is given) is true.
+    def bit_field(self, element, bit_offset, source, guard):
+        scrape = self.scrape
+        width = element['size']
+        type_name = scrape.evaluator.value_type(element['type_name'])
+        signed = scrape.types[type_name]['signed'] and type_name not in ('bool', '_Bool')
+        unit_bits = scrape.type_size(type_name)
+        start = bit_offset // 8
+        end = (bit_offset + width + 7) // 8
+        candidates = [((bit_offset - element['offset'] % unit_bits) // 8, unit_bits // 8)]
+        for length in (1, 2, 4, 8):
+            if length >= end - start:
+                candidates.append((start, length))
+        for unit_offset, length in candidates:
+            unit = self.units.get((unit_offset, length))
+            if unit == None and unit_offset >= self.pos and unit_offset + length <= self.size:
+                unit = (self.add(unit_offset, INTEGER_CODES[length].upper(), 1), len(self.args))
+                self.args.append([])
+                self.units[(unit_offset, length)] = unit
+            if unit != None:
+                index, arg = unit
+                shift = self.shift(bit_offset - unit_offset * 8, width, length)
+                mask = (1 << width) - 1
+                self.args[arg].append('((%s & %d) << %d)' % (source, mask, shift))
+                decode = '(v[%d] >> %d & %d)' % (index, shift, mask)
+                if signed:
+                    sign = 1 << (width - 1)
+                    return '((%s ^ %d) - %d)' % (decode, sign, sign)
+                return decode
+        # The bits share bytes with values already in the format
+        length = end - start
+        shift = self.shift(bit_offset - start * 8, width, length)
+        self.statements.append('if %s: write_bits(buf, offset + %d, %d, %r, %d, %d, %s)' % (guard, start, length,
+                               self.byteorder, shift, width, source))
+        return 'read_bits(buf, offset + %d, %d, %r, %d, %d, %r)' % (start, length, self.byteorder, shift, width,
+                                                                    signed)
+
+
+    # Return the shift of a bit field at the given bit position of a unit of length bytes. Bit fields are
+    # placed from the least significant bit of the unit for little endian and the most significant for big.
+    def shift(self, position, width, length):
+        if self.byteorder == 'big':
+            return length * 8 - position - width
+        return position
+
+
+# Makes and keeps the codec of each variable and type. The codecs are dropped when the configuration of the
+# CScrape object (e.g. its endian) or its model changes. See CScrape.codec()
+class Codecs():
+    def __init__(self, scrape):
+        self.scrape  = scrape
+        self.codecs  = dict()   # Key is the variable or type name
+        self.nested  = dict()   # Codecs of structs and unions defined within structs. Key is id(elements)
+        self.abi     = None
+
+
+    def reset(self):
+        self.codecs.clear()
+        self.nested.clear()
+        self.abi = None
+
+
+    # Drop the codecs if the settings have changed
+    def check(self):
+        abi = self.scrape.layout_engine.settings()
+        if abi != self.abi:
+            self.reset()
+            self.abi = abi
+        self.byteorder = self.scrape.endian
+        self.prefix = '>' if self.scrape.endian == 'big' else '<'
+
+
+    # Return the Codec of a variable or type. A name which is not a type is looked up with CScrape.var().
+    def codec(self, name):
+        self.check()
+        codec = self.codecs.get(name)
+        if codec == None:
+            if self.is_type(name):
+                codec = self.compile(name, name, (), 0, None, self.scrape.type_size(name))
+            else:
+                var = self.scrape.var(name)
+                if var['exception'] != None:
+                    raise var['exception']
+                codec = self.compile(name, var['type'], var['array'], var['ptr'], None, var['size'])
+            self.codecs[name] = codec
+        return codec
+
+
+    # Return the Codec of the elements of a struct (used for arrays of structs)
+    def aggregate(self, type_name, elements, size):
+        if type_name in self.scrape.typedefs:
+            return self.codec(type_name)
+        codec = self.nested.get(id(elements))
+        if codec == None or codec[0] is not elements:
+            codec = (elements, self.compile(type_name, type_name, (), 0, elements, size))
+            self.nested[id(elements)] = codec
+        return codec[1]
+
+
+    def compile(self, name, type_name, array, ptr, types, size):
+        compiler = CodecCompiler(self, size // 8)
+        source = compiler.source(type_name, array, ptr, types)
+        return Codec(name, size // 8, source, compiler.names)
+
+
+    def is_type(self, name):
+        if name in self.scrape.typedefs:
+            return True
+        try:
+            self.scrape.evaluator.arithmetic_type(name)
+            return True
+        except SyntaxError:
+            return False
+
+
+    # Return (kind, info, item size in bits) for a value. kind is 'scalar', with info the struct format code,
+    # or 'aggregate' for a struct or union, with info its elements.
+    def resolve(self, type_name, ptr, types):
+        scrape = self.scrape
+        if ptr:
+            return 'scalar', INTEGER_CODES[scrape.POINTER_SIZE // 8].upper(), scrape.POINTER_SIZE
+        if types != None:
+            return 'aggregate', types, self.aggregate_size(types)
+        typedef = scrape.typedefs.get(type_name)
+        if typedef != None and not scrape.evaluator.is_enum(type_name):
+            elements = typedef.get('types') or []
+            if len(elements) == 1 and elements[0].get('typedef_type') == 'simple':
+                return self.resolve(elements[0]['type_name'], 0, None)
+            return 'aggregate', elements, typedef['size']
+        ctype = scrape.evaluator.value_type(type_name)
+        bits = scrape.types[ctype]['bit_size']
+        if ctype in ('float', 'double', 'double long'):
+            return 'scalar', FLOAT_CODES[bits // 8], bits
+        if ctype in ('bool', '_Bool'):
+            return 'scalar', '?', bits
+        code = INTEGER_CODES[bits // 8]
+        if not scrape.types[ctype]['signed']:
+            code = code.upper()
+        return 'scalar', code, bits
+
+
+    # Return the size in bits of a struct (or union) defined within a struct
+    def aggregate_size(self, types):
+        size = 0
+        for element in types:
+            size = max(size, element['offset'] + element['size'])
+        alignment = max([element['alignment'] for element in types] + [self.scrape.STRUCT_ALIGNMENT])
+        return (size + alignment - 1) // alignment * alignment
@@ -0,0 +1,501 @@
+#-----------------------------------------------------------------
+#    pycscrape: Python library for gathering information from C source files.
+#    Copyright (C) 2017  Mike Morgan  (mikemorgan@blueyonder.co.uk)
+#
+#    This library is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this library.  If not, see <http://www.gnu.org/licenses/>.
+#-----------------------------------------------------------------
+#
+#  Evaluation of C constant expressions (e.g. array sizes and enum values). See CScrape.GetValue()
+#-----------------------------------------------------------------
+
+import operator
+
+
+# Rank of each integer type, used to find the type of the result of an operator (see common_type())
+RANKS = { 'bool': 0, '_Bool': 0,
+          'signed char': 1, 'unsigned char': 1, 'signed short': 2, 'unsigned short': 2,
+          'signed int': 3, 'unsigned int': 3, 'signed long': 4, 'unsigned long': 4,
+          'signed long long': 5, 'unsigned long long': 5 }
+FLOATS = ('float', 'double', 'double long')
+
+# The types an integer constant may have, in the order they are tried. See integer_literal()
+DECIMAL_TYPES     = ('signed int', 'signed long', 'signed long long')
+NON_DECIMAL_TYPES = ('signed int', 'unsigned int', 'signed long', 'unsigned long', 'signed long long',
+                     'unsigned long long')
+
+# Escapes of a character constant e.g. '\n'
+ESCAPES = { 'n': 10, 't': 9, 'r': 13, 'a': 7, 'b': 8, 'f': 12, 'v': 11, 'e': 27, '\\': 92, "'": 39, '"': 34, '?': 63 }
+
+
+# Return the value of a C integer division, which rounds towards zero (Python's // rounds down)
+def c_divide(left, right):
+    quotient = abs(left) // abs(right)
+    if (left < 0) != (right < 0):
+        return -quotient
+    return quotient
+
+
+# Return the remainder of a C integer division. It has the same sign as left.
+def c_remainder(left, right):
+    return left - right * c_divide(left, right)
+
+
+# Operators which work out a value from two values of the same type
+ARITHMETIC = { '+': operator.add, '-': operator.sub, '*': operator.mul, '/': c_divide, '%': c_remainder,
+               '&': operator.and_, '|': operator.or_, '^': operator.xor }
+COMPARISONS = { '<': operator.lt, '>': operator.gt, '<=': operator.le, '>=': operator.ge, '==': operator.eq,
+                '!=': operator.ne }
+SHIFTS = { '<<': operator.lshift, '>>': operator.rshift }
+
+
+# Return (value, suffix, decimal) of an integer constant e.g. '0x10UL' --> (16, 'ul', False)
+# The constant may be decimal, hex ('0x'), binary ('0b') or octal (leading '0').
+# Raises ValueError if the text is not an integer constant.
+def integer_literal(text):
+    end = len(text)
+    while end > 0 and text[end-1] in 'uUlL':
+        end -= 1
+    digits = text[:end]
+    suffix = text[end:].lower()
+    if suffix not in ('', 'u', 'l', 'ul', 'lu', 'll', 'ull', 'llu'):
+        raise ValueError(text)
+    if digits[:2] in ('0x', '0X'):
+        return int(digits[2:], 16), suffix, False
+    if digits[:2] in ('0b', '0B'):
+        return int(digits[2:], 2), suffix, False
+    if len(digits) > 1 and digits[0] == '0':
+        return int(digits[1:], 8), suffix, False
+    if not digits.isdigit():
+        raise ValueError(text)
+    return int(digits), suffix, True
+
+
+# Return the list of character codes of the text between the quotes of a character constant e.g. 'a\n'
+def character_codes(text):
+    codes = []
+    i = 0
+    while i < len(text):
+        c = text[i]
+        i += 1
+        if c != '\\':
+            codes.append(ord(c))
+            continue
+        c = text[i]
+        i += 1
+        if c in ESCAPES:
+            codes.append(ESCAPES[c])
+        elif c in '01234567':
+            end = i - 1
+            while end < len(text) and end < i + 2 and text[end] in '01234567':
+                end += 1
+            codes.append(int(text[i-1:end], 8))
+            i = end
+        elif c in 'xuU':
+            end = i
+            limit = { 'x': len(text), 'u': i + 4, 'U': i + 8 }[c]
+            while end < len(text) and end < limit and text[end] in '0123456789abcdefABCDEF':
+                end += 1
+            if end == i:
+                raise ValueError(text)
+            codes.append(int(text[i:end], 16))
+            i = end
+        else:
+            raise ValueError(text)
+    return codes
+
+
+# Evaluates C constant expressions held as pycparser nodes. Values have a C type (e.g. 'unsigned int') and the
+# C rules for working out the type of the result of each operator are followed, with the sizes of the types
+# taken from the CScrape object's configuration. So, for example, 7 / -2 is -3, -1 < 0u is false and ~0u is
+# 0xFFFFFFFF. Signed integer overflow is undefined in C; the value is kept as it is.
+#
+# Results are remembered for each node, so a node evaluated more than once (e.g. an array size) is only
+# worked out once, and for the text of each constant. Call clear() when the nodes are no longer needed.
+class ConstantEvaluator():
+    def __init__(self, scrape):
+        self.scrape = scrape
+        self.handlers = { 'Constant':  self.constant,
+                          'BinaryOp':  self.binary_op,
+                          'UnaryOp':   self.unary_op,
+                          'TernaryOp': self.ternary_op,
+                          'Cast':      self.cast,
+                          'ID':        self.identifier }
+        self.settings = None     # Settings of the CScrape object the results are for. See value()
+        self.results  = dict()   # Key is id(node). Value is (node, (value, type))
+        self.literals = dict()   # Key is the text of a constant. Value is (value, type)
+        self.limits   = dict()   # Key is an integer type. Value is (lowest value, highest value, mask)
+        self.common_types = dict()  # Key is (type, type). See common_type()
+
+
+    # Forget the results of evaluating nodes (e.g. when a new source is parsed). The values of constants
+    # are kept, as they only depend on the settings.
+    def clear(self):
+        self.results.clear()
+
+
+    # Return the value of an expression node. The value is an int, or a float for a floating point expression.
+    def value(self, node):
+        settings = (self.scrape.DEFAULT_CHAR_SIGN, self.scrape.POINTER_SIZE, self.scrape.ENUM_TYPE)
+        if settings != self.settings:
+            self.configure()
+            self.settings = settings
+        try:
+            return self.evaluate(node)[0]
+        except (ArithmeticError, LookupError, ValueError, TypeError) as e:
+            raise SyntaxError('Could not evaluate constant expression (%s)' % e)
+
+
+    # Forget everything worked out for the previous settings and work out the range of each integer type
+    def configure(self):
+        self.results.clear()
+        self.literals.clear()
+        self.common_types.clear()
+        self.limits.clear()
+        for ctype in RANKS:
+            info = self.scrape.types.get(ctype)
+            if info != None:
+                bits = info['bit_size']
+                if info['signed']:
+                    self.limits[ctype] = (-(1 << (bits - 1)), (1 << (bits - 1)) - 1, None)
+                else:
+                    self.limits[ctype] = (0, (1 << bits) - 1, (1 << bits) - 1)
+
+
+    # Return (value, type) of an expression node
+    def evaluate(self, node):
+        if node.__class__.__name__ == 'Constant':
+            try:
+                return self.literals[node.value]
+            except KeyError:
+                return self.constant(node)
+        result = self.results.get(id(node))
+        if result != None and result[0] is node:
+            return result[1]
+        handler = self.handlers.get(node.__class__.__name__)
+        if handler == None:
+            raise SyntaxError("Unknown expression type '" + node.__class__.__name__ + "'")
+        value = handler(node)
+        self.results[id(node)] = (node, value)
+        return value
+
+
+    # Return (value, type) of a Constant node e.g. '0x10u', '1.5f' or '\n'
+    def constant(self, node):
+        text = node.value
+        try:
+            return self.literals[text]
+        except KeyError:
+            pass
+        try:
+            if node.type == 'char' or text[-1] == "'":
+                value = self.character_literal(text)
+            elif node.type in ('float', 'double', 'long double') or \
+                 (text[:2] not in ('0x', '0X') and ('.' in text or 'e' in text or 'E' in text)) or \
+                 (text[:2] in ('0x', '0X') and ('p' in text or 'P' in text)):
+                value = self.float_literal(text)
+            else:
+                value = self.integer_literal(text)
+        except (ValueError, IndexError):
+            raise SyntaxError("Could not parse constant '" + text + "'")
+        self.literals[text] = value
+        return value
+
+
+    # Return (value, type) of an integer constant. The type is the first of the C types that the value fits,
+    # allowed by the suffix.
+    def integer_literal(self, text):
+        value, suffix, decimal = integer_literal(text)
+        types = DECIMAL_TYPES if decimal else NON_DECIMAL_TYPES
+        if 'u' in suffix:
+            types = ('unsigned int', 'unsigned long', 'unsigned long long')
+        if suffix.count('l') == 2:
+            types = [ctype for ctype in types if ctype.endswith('long long')]
+        elif 'l' in suffix:
+            types = [ctype for ctype in types if ctype.endswith('long') or ctype.endswith('long long')]
+        for ctype in types:
+            if self.fits(value, ctype):
+                return value, ctype
+        return value, 'unsigned long long'
+
+
+    # Return (value, type) of a floating point constant e.g. '1.5e3f'
+    def float_literal(self, text):
+        ctype = 'double'
+        if text[-1] in 'fF':
+            ctype = 'float'
+            text = text[:-1]
+        elif text[-1] in 'lL':
+            ctype = 'double long'
+            text = text[:-1]
+        if text[:2] in ('0x', '0X'):
+            return float.fromhex(text), ctype
+        return float(text), ctype
+
+
+    # Return (value, type) of a character constant e.g. 'a', '\x41' or L'a'
+    def character_literal(self, text):
+        prefix = text[:text.index("'")]
+        codes = character_codes(text[len(prefix)+1:-1])
+        if len(codes) == 0:
+            raise ValueError(text)
+        if prefix == '':
+            if len(codes) == 1:
+                value = codes[0] & 0xFF
+                # A plain char is converted to int, so '\xff' is -1 if char is signed
+                if self.scrape.DEFAULT_CHAR_SIGN == 'signed' and value >= 0x80:
+                    value -= 0x100
+                return value, 'signed int'
+            # Multi-character constants e.g. 'ab' are as gcc
+            value = 0
+            for code in codes:
+                value = (value << 8) | (code & 0xFF)
+            return self.convert(value, 'signed int'), 'signed int'
+        if prefix == 'u':
+            return codes[-1] & 0xFFFF, 'unsigned short'
+        return codes[-1], 'unsigned int'
+
+
+    # Return (value, type) of the value of an enum e.g. 'RED'. Only enums are constants in C.
+    def identifier(self, node):
+        value = self.scrape.enum_constant(node.name)
+        if value == None:
+            raise SyntaxError("'%s' is not a constant" % node.name)
+        return value, self.arithmetic_type(self.scrape.ENUM_TYPE)
+
+
+    def binary_op(self, node):
+        op = node.op
+        if op == '&&':
+            return int(bool(self.evaluate(node.left)[0]) and bool(self.evaluate(node.right)[0])), 'signed int'
+        if op == '||':
+            return int(bool(self.evaluate(node.left)[0]) or bool(self.evaluate(node.right)[0])), 'signed int'
+        left, left_type = self.evaluate(node.left)
+        right, right_type = self.evaluate(node.right)
+        if op in SHIFTS:
+            ctype = self.promote(left_type)
+            if ctype in FLOATS or right_type in FLOATS:
+                raise SyntaxError("Invalid operands to '%s'" % op)
+            if right < 0:
+                raise SyntaxError('Negative shift count')
+            return self.wrap(SHIFTS[op](left, right), ctype), ctype
+        ctype = self.common_type(left_type, right_type)
+        left = self.convert(left, ctype)
+        right = self.convert(right, ctype)
+        function = COMPARISONS.get(op)
+        if function != None:
+            return int(function(left, right)), 'signed int'
+        function = ARITHMETIC.get(op)
+        if function == None:
+            raise SyntaxError("Unknown BinaryOp '" + op + "'")
+        if ctype in FLOATS:
+            if op == '/':
+                return left / right, ctype
+            if not op in '+-*':
+                raise SyntaxError("Invalid operands to '%s'" % op)
+        elif op in '/%' and right == 0:
+            raise SyntaxError('Division by zero in constant expression')
+        return self.wrap(function(left, right), ctype), ctype
+
+
+    def unary_op(self, node):
+        op = node.op
+        if op == 'sizeof':
+            if node.expr.__class__.__name__ == 'Typename':
+                size = self.type_bits(node.expr.type)
+            else:
+                size = self.expression_bits(node.expr)
+            return (size + 7) // 8, self.size_type()  # Divide by 8 because sizeof() returns bytes
+        value, ctype = self.evaluate(node.expr)
+        if op == '!':
+            return int(not value), 'signed int'
+        ctype = self.promote(ctype)
+        value = self.convert(value, ctype)
+        if op == '+':
+            return value, ctype
+        if op == '-':
+            return self.wrap(-value, ctype), ctype
+        if op == '~':
+            if ctype in FLOATS:
+                raise SyntaxError("Invalid operand to '~'")
+            return self.wrap(~value, ctype), ctype
+        raise SyntaxError("Unknown UnaryOp '" + op + "'")
+
+
+    def ternary_op(self, node):
+        if self.evaluate(node.cond)[0]:
+            return self.evaluate(node.iftrue)
+        return self.evaluate(node.iffalse)
+
+
+    def cast(self, node):
+        value, ctype = self.evaluate(node.expr)
+        to_type = node.to_type.type
+        if to_type.__class__.__name__ == 'PtrDecl':
+            ctype = self.unsigned_type(self.scrape.POINTER_SIZE)
+        else:
+            ctype = self.arithmetic_type(self.type_name(to_type))
+        return self.convert(value, ctype), ctype
+
+
+    # Return the name of the type of a TypeDecl node e.g. 'unsigned int'
+    def type_name(self, node):
+        if node.__class__.__name__ == 'TypeDecl':
+            node = node.type
+        if node.__class__.__name__ == 'IdentifierType':
+            return self.scrape.collate_types(node.names)
+        if node.__class__.__name__ == 'Enum':
+            return self.scrape.ENUM_TYPE
+        raise SyntaxError("Unknown type '%s'" % getattr(node, 'name', node.__class__.__name__))
+
+
+    # Return the size in bits of the type given by a node of a Typename (e.g. 'int', 'char *' or 'int [4]')
+    def type_bits(self, node):
+        if node.__class__.__name__ == 'PtrDecl':
+            return self.scrape.POINTER_SIZE
+        if node.__class__.__name__ == 'ArrayDecl':
+            return self.type_bits(node.type) * int(self.evaluate(node.dim)[0])
+        return self.scrape.type_size(self.type_name(node))
+
+
+    # Return the size in bits of the value of an expression e.g. 'sizeof(my_var)' or 'sizeof(1L)'
+    def expression_bits(self, node):
+        if node.__class__.__name__ == 'ID':
+            size = self.scrape.variable_size(node.name)
+            if size != None:
+                return size
+        return self.bits(self.evaluate(node)[1])
+
+
+    # Return the type of the value of sizeof(). This is an unsigned type the size of a pointer.
+    def size_type(self):
+        return self.unsigned_type(self.scrape.POINTER_SIZE)
+
+
+    # Return the unsigned integer type with the given number of bits
+    def unsigned_type(self, bits):
+        for ctype in ('unsigned int', 'unsigned long', 'unsigned long long', 'unsigned short', 'unsigned char'):
+            if self.bits(ctype) == bits:
+                return ctype
+        raise SyntaxError('No unsigned type of %d bits' % bits)
+
+
+    # Return the integer or floating point type (one of RANKS or FLOATS) for a type name. Typedefs and types
+    # such as 'uint32_t' are followed to the type they are a name for.
+    def arithmetic_type(self, type_name):
+        type_name = self.scrape.canonical_type(type_name)
+        for count in range(100):
+            if type_name in RANKS or type_name in FLOATS:
+                return type_name
+            type_info = self.scrape.types.get(type_name)
+            if type_info != None:
+                for ctype in RANKS:
+                    ctype_info = self.scrape.types.get(ctype)
+                    if ctype_info != None and ctype_info['bit_size'] == type_info['bit_size'] and \
+                       ctype_info['signed'] == type_info['signed'] and RANKS[ctype] != 0:
+                        return ctype
+            typedef = self.scrape.typedefs.get(type_name)
+            if typedef == None or len(typedef.get('types') or ()) != 1 or \
+               typedef['types'][0].get('typedef_type') != 'simple':
+                break
+            type_name = typedef['types'][0]['type_name']
+        raise SyntaxError("'%s' is not an arithmetic type" % type_name)
+
+
+    # Return the integer or floating point type of a value of a type name, as arithmetic_type() but enums are
+    # ENUM_TYPE. Used for the members of structs. See layout.LayoutEngine and codec.Codecs
+    def value_type(self, type_name):
+        if type_name == 'enum' or self.is_enum(type_name):
+            type_name = self.scrape.ENUM_TYPE
+        return self.arithmetic_type(type_name)
+
+
+    # Return True if type_name is the name of an enum type e.g. 'Life_t' from 'typedef enum {...} Life_t;'
+    def is_enum(self, type_name):
+        return len(self.scrape.enum_index.find(self.scrape.enums, { 'name': type_name })) != 0
+
+
+    def bits(self, ctype):
+        return self.scrape.types[ctype]['bit_size']
+
+
+    # Return True if the value can be held by the integer type
+    def fits(self, value, ctype):
+        low, high, mask = self.limits[ctype]
+        return low <= value <= high
+
+
+    # Return the type that a value of the given type is promoted to in an expression. Integer types smaller
+    # than int become int.
+    def promote(self, ctype):
+        if ctype in FLOATS or RANKS[ctype] >= RANKS['signed int']:
+            return ctype
+        return 'signed int'
+
+
+    # Return the type both values of a binary operator are converted to (C's usual arithmetic conversions)
+    def common_type(self, left, right):
+        try:
+            return self.common_types[(left, right)]
+        except KeyError:
+            pass
+        ctype = self.usual_conversion(left, right)
+        self.common_types[(left, right)] = ctype
+        return ctype
+
+
+    def usual_conversion(self, left, right):
+        if left in FLOATS or right in FLOATS:
+            for ctype in ('double long', 'double', 'float'):
+                if ctype in (left, right):
+                    return ctype
+        left = self.promote(left)
+        right = self.promote(right)
+        if left == right:
+            return left
+        left_signed = self.scrape.types[left]['signed']
+        right_signed = self.scrape.types[right]['signed']
+        if left_signed == right_signed:
+            return left if RANKS[left] >= RANKS[right] else right
+        unsigned, signed = (right, left) if left_signed else (left, right)
+        if RANKS[unsigned] >= RANKS[signed]:
+            return unsigned
+        if self.bits(signed) > self.bits(unsigned):
+            return signed
+        return 'unsigned' + signed[len('signed'):]
+
+
+    # Return the result of an operator for the type. Unsigned values wrap around.
+    def wrap(self, value, ctype):
+        limits = self.limits.get(ctype)
+        if limits == None or limits[2] == None:
+            return value
+        return value & limits[2]
+
+
+    # Return a value converted to the type (e.g. by a cast). Values which do not fit an integer type wrap
+    # around, as gcc does.
+    def convert(self, value, ctype):
+        limits = self.limits.get(ctype)
+        if limits != None and type(value) is int and limits[0] <= value <= limits[1] and RANKS[ctype] != 0:
+            return value
+        if ctype in FLOATS:
+            return float(value)
+        if RANKS[ctype] == 0:
+            return int(value != 0)
+        value = int(value)
+        bits = self.bits(ctype)
+        value &= (1 << bits) - 1
+        if self.scrape.types[ctype]['signed'] and value >= (1 << (bits - 1)):
+            value -= 1 << bits
+        return value
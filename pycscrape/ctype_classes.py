@@ -0,0 +1,229 @@
+#-----------------------------------------------------------------
+#    pycscrape: Python library for gathering information from C source files.
+#    Copyright (C) 2017  Mike Morgan  (mikemorgan@blueyonder.co.uk)
+#
+#    This library is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this library.  If not, see <http://www.gnu.org/licenses/>.
+#-----------------------------------------------------------------
+#
+#  ctypes classes of variables and types, for views of memory images. See CScrape.ctype() and CScrape.view()
+#-----------------------------------------------------------------
+
+import ctypes
+
+
+# ctypes type of each struct module format code (see codec.Codecs.resolve())
+SCALAR_TYPES = { 'b': ctypes.c_int8,  'B': ctypes.c_uint8,
+                 'h': ctypes.c_int16, 'H': ctypes.c_uint16,
+                 'i': ctypes.c_int32, 'I': ctypes.c_uint32,
+                 'q': ctypes.c_int64, 'Q': ctypes.c_uint64,
+                 'f': ctypes.c_float, 'd': ctypes.c_double,
+                 '?': ctypes.c_bool }
+
+# Base classes of structs and unions for each endian
+BASES = { 'little': (ctypes.LittleEndianStructure, getattr(ctypes, 'LittleEndianUnion', None)),
+          'big':    (ctypes.BigEndianStructure,    getattr(ctypes, 'BigEndianUnion', None)) }
+
+
+# Return a property reading and writing a bit field held in the bytes [start, start+length) of a struct.
+# See codec.CodecCompiler.shift() for the numbering of the bits.
+def bit_field_property(start, length, byteorder, shift, width, signed):
+    mask = (1 << width) - 1
+
+    def get(self):
+        unit = int.from_bytes(ctypes.string_at(ctypes.addressof(self) + start, length), byteorder)
+        value = (unit >> shift) & mask
+        if signed and value >= 1 << (width - 1):
+            value -= 1 << width
+        return value
+
+    def set(self, value):
+        address = ctypes.addressof(self) + start
+        unit = int.from_bytes(ctypes.string_at(address, length), byteorder) & ~(mask << shift)
+        unit |= (value & mask) << shift
+        ctypes.memmove(address, unit.to_bytes(length, byteorder), length)
+
+    return property(get, set)
+
+
+# Makes and keeps the ctypes class of each variable and type. An instance made with from_buffer() is a view
+# of the bytes of a memory image (e.g. a bytearray or an mmap of a RAM dump), so fields are read and written
+# in place with no copying.
+#
+#   - A struct or union is a ctypes Structure (or Union) of the configured endian. _pack_ is 1 and the gaps
+#     are filled with padding fields, so the offsets and size are those of the layout of the type (see
+#     layout.LayoutEngine), whatever the ABI of the machine running Python.
+#   - Members of anonymous structs and unions are attributes of the struct holding them (see _anonymous_).
+#   - An array is a ctypes Array e.g. 'short x[2][3];' is (c_int16 * 3) * 2
+#   - A pointer is an unsigned integer of POINTER_SIZE, as it is an address of the target
+#   - A bit field is a property reading and writing its bits
+#
+# The classes are kept per type (or variable) and per configuration (see layout.LayoutEngine.settings()), so
+# they are only made once. They are dropped when the model changes.
+class CtypeClasses():
+    def __init__(self, scrape):
+        self.scrape  = scrape
+        self.classes = dict()   # Key is (variable or type name, settings)
+        self.made    = 0        # Number of classes made
+
+
+    def reset(self):
+        self.classes.clear()
+
+
+    # Return the ctypes class of a variable or type. A name which is not a type is looked up with CScrape.var().
+    def ctype(self, name):
+        key = (name, self.scrape.layout_engine.settings())
+        cls = self.classes.get(key)
+        if cls == None:
+            self.byteorder = self.scrape.endian
+            if self.scrape.codecs.is_type(name):
+                cls = self.item(name, name, 0, None)
+            else:
+                var = self.scrape.var(name)
+                if var['exception'] != None:
+                    raise var['exception']
+                cls = self.value(name, var['type'], var['array'], var['ptr'], None)
+            self.classes[key] = cls
+        return cls
+
+
+    # Return the ctypes class of a value
+    #   name      - Name of the class e.g. 'my_struct_t.member'
+    #   type_name - Name of the type of the value
+    #   array     - Array sizes e.g. (2, 3)
+    #   ptr       - Number of ptr specifiers
+    #   types     - Elements of a struct (or union) defined within a struct. Otherwise None
+    def value(self, name, type_name, array, ptr, types):
+        if ptr == 0 and types == None and type_name in self.scrape.typedefs:
+            cls = self.ctype(type_name)
+        else:
+            cls = self.item(name, type_name, ptr, types)
+        for size in reversed(tuple(array or ())):
+            cls = cls * size
+        return cls
+
+
+    # Return the ctypes class of one item of a value (see value())
+    def item(self, name, type_name, ptr, types):
+        kind, info, item_size = self.scrape.codecs.resolve(type_name, ptr, types)
+        if kind == 'scalar':
+            # e.g. c_uint32.__ctype_be__ is a big endian c_uint32. Single bytes do not have an endian.
+            return getattr(SCALAR_TYPES[info], '__ctype_be__' if self.byteorder == 'big' else '__ctype_le__',
+                           SCALAR_TYPES[info])
+        union = type_name.split(' ')[0] == 'union' or is_union(info)
+        return self.aggregate(name, info, item_size, union)
+
+
+    # Return a Structure (or Union) class of the elements of a struct (or union) of size bits
+    def aggregate(self, name, elements, size, union):
+        structure, union_base = BASES[self.byteorder]
+        base = structure
+        if union:
+            base = union_base
+            if base == None:
+                raise Exception("ctypes of this version of Python does not support %s endian unions" % self.byteorder)
+        fields = []
+        anonymous = []
+        properties = dict()
+        self.add_members(name, elements, 0, fields, anonymous, properties, union)
+        if union:
+            # A member covering the whole union makes the size of the class the size of the union
+            fields.append(('_size', ctypes.c_uint8 * (size // 8)))
+        else:
+            self.pad(fields, position(fields), size // 8)
+        namespace = { '_pack_': 1, '_anonymous_': anonymous, '_fields_': fields }
+        namespace.update(properties)
+        cls = type(name, (base,), namespace)
+        # The class already has its endian, so it may be a member of a struct of either endian
+        cls.__ctype_be__ = cls
+        cls.__ctype_le__ = cls
+        self.made += 1
+        if ctypes.sizeof(cls) != size // 8:
+            raise Exception("ctypes class of '%s' is %d bytes, not %d" % (name, ctypes.sizeof(cls), size // 8))
+        return cls
+
+
+    # Add the (name, class) fields of the members of a struct (or union) at bit offset base to fields. Bit fields
+    # are added to properties.
+    def add_members(self, name, elements, base, fields, anonymous, properties, union):
+        for element in elements:
+            member = element['var_name']
+            offset = base + element['offset']
+            if element.get('bit_field'):
+                if member != None and element['size'] != 0:
+                    properties[member] = self.bit_field(element, offset)
+                continue
+            types = element.get('types')
+            if member == None:
+                if types == None:
+                    continue
+                # An anonymous struct or union. Its members are members of this struct. Its bit fields are
+                # properties of this struct, as _anonymous_ only makes the fields of a member visible.
+                member = '_anonymous%d' % len(anonymous)
+                anonymous.append(member)
+                self.add_bit_fields(types, offset, properties)
+            cls = self.value('%s.%s' % (name, member), element['type_name'], element['array'], element['ptr'], types)
+            if union:
+                fields.append((member, cls))
+                continue
+            start = offset // 8
+            current = position(fields)
+            if start < current:
+                raise Exception("Member '%s' of '%s' overlaps the member before it" % (member, name))
+            self.pad(fields, current, start)
+            fields.append((member, cls))
+
+
+    # Add the bit fields of an anonymous struct (or union) at bit offset base to properties
+    def add_bit_fields(self, elements, base, properties):
+        for element in elements:
+            offset = base + element['offset']
+            if element.get('bit_field'):
+                if element['var_name'] != None and element['size'] != 0:
+                    properties[element['var_name']] = self.bit_field(element, offset)
+            elif element['var_name'] == None and element.get('types') != None:
+                self.add_bit_fields(element['types'], offset, properties)
+
+
+    # Return the property of a bit field at bit offset 'offset'
+    def bit_field(self, element, offset):
+        scrape = self.scrape
+        width = element['size']
+        type_name = scrape.evaluator.value_type(element['type_name'])
+        signed = scrape.types[type_name]['signed'] and type_name not in ('bool', '_Bool')
+        start = offset // 8
+        length = (offset + width + 7) // 8 - start
+        position = offset - start * 8
+        if self.byteorder == 'big':
+            shift = length * 8 - position - width
+        else:
+            shift = position
+        return bit_field_property(start, length, self.byteorder, shift, width, signed)
+
+
+    # Add a padding field to fields from byte offset start to end
+    def pad(self, fields, start, end):
+        if end > start:
+            fields.append(('_pad%d' % start, ctypes.c_uint8 * (end - start)))
+
+
+# Return the byte offset after the last of the fields of a Structure (with _pack_ 1)
+def position(fields):
+    return sum([ctypes.sizeof(cls) for name, cls in fields])
+
+
+# Return True if the elements of a struct (or union) are all at offset 0. A struct whose members are all at
+# offset 0 has the same layout as a union of them.
+def is_union(elements):
+    return len(elements) > 1 and all([element['offset'] == 0 for element in elements])
@@ -0,0 +1,145 @@
+#-----------------------------------------------------------------
+#    pycscrape: Python library for gathering information from C source files.
+#    Copyright (C) 2017  Mike Morgan  (mikemorgan@blueyonder.co.uk)
+#
+#    This library is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this library.  If not, see <http://www.gnu.org/licenses/>.
+#-----------------------------------------------------------------
+#
+#  NumPy structured dtypes of variables and types. See CScrape.numpy_dtype()
+#-----------------------------------------------------------------
+
+# NumPy is only needed by numpy_dtype()
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Return the NumPy type string of a struct module format code e.g. ('<', 'H', 16) --> '<u2'
+def scalar_type(prefix, code, bits):
+    if code == '?':
+        return '?'
+    if code in 'fd':
+        return '%sf%d' % (prefix, bits // 8)
+    if code.isupper():
+        return '%su%d' % (prefix, bits // 8)
+    return '%si%d' % (prefix, bits // 8)
+
+
+# Makes and keeps the NumPy dtype of each variable and type. The dtypes follow the layout of the types (see
+# layout.LayoutEngine), so the padding, offsets and endian are those of the configuration of the CScrape object.
+#
+#   - A struct or union is a structured dtype with a field for each member at its offset. Members of
+#     anonymous structs and unions are fields of the struct holding them. The members of a union overlap.
+#   - An array is a sub-array dtype e.g. 'short x[2][3];' is ('<i2', (2, 3))
+#   - A pointer is an unsigned integer of POINTER_SIZE
+#   - A bit field is its storage unit, an unsigned integer of the bit field's type. Its value is
+#     CScrape.member(type_name, path).extract(unit) (sign extended for signed types), which works on NumPy
+#     arrays of units too.
+#
+# The dtypes are dropped when the configuration or the model changes.
+class Dtypes():
+    def __init__(self, scrape):
+        self.scrape = scrape
+        self.dtypes = dict()    # Key is the variable or type name
+        self.abi    = None
+
+
+    def reset(self):
+        self.dtypes.clear()
+        self.abi = None
+
+
+    # Drop the dtypes if the settings have changed
+    def check(self):
+        abi = self.scrape.layout_engine.settings()
+        if abi != self.abi:
+            self.reset()
+            self.abi = abi
+        self.prefix = '>' if self.scrape.endian == 'big' else '<'
+
+
+    # Return the dtype of a variable or type. A name which is not a type is looked up with CScrape.var().
+    def dtype(self, name):
+        if numpy == None:
+            raise ImportError("numpy_dtype() needs NumPy, which is not installed")
+        self.check()
+        dtype = self.dtypes.get(name)
+        if dtype == None:
+            if self.scrape.codecs.is_type(name):
+                dtype = self.item(name, 0, None)
+            else:
+                var = self.scrape.var(name)
+                if var['exception'] != None:
+                    raise var['exception']
+                dtype = self.value(var['type'], var['array'], var['ptr'], None)
+            self.dtypes[name] = dtype
+        return dtype
+
+
+    # Return the dtype of a value
+    #   type_name - Name of the type of the value
+    #   array     - Array sizes e.g. (2, 3)
+    #   ptr       - Number of ptr specifiers
+    #   types     - Elements of a struct (or union) defined within a struct. Otherwise None
+    def value(self, type_name, array, ptr, types):
+        if ptr == 0 and types == None and type_name in self.scrape.typedefs:
+            dtype = self.dtype(type_name)
+        else:
+            dtype = self.item(type_name, ptr, types)
+        array = tuple(array or ())
+        if len(array) != 0:
+            dtype = numpy.dtype((dtype, array))
+        return dtype
+
+
+    # Return the dtype of one item of a value (see value())
+    def item(self, type_name, ptr, types):
+        kind, info, item_size = self.scrape.codecs.resolve(type_name, ptr, types)
+        if kind == 'scalar':
+            return numpy.dtype(scalar_type(self.prefix, info, item_size))
+        return self.aggregate(info, item_size)
+
+
+    # Return the structured dtype of the elements of a struct (or union) of size bits
+    def aggregate(self, elements, size):
+        names = []
+        formats = []
+        offsets = []
+        self.add_members(elements, 0, names, formats, offsets)
+        return numpy.dtype({ 'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': size // 8 })
+
+
+    # Add the name, dtype and byte offset of each member of a struct (or union) at bit offset base to the lists
+    def add_members(self, elements, base, names, formats, offsets):
+        scrape = self.scrape
+        for element in elements:
+            name = element['var_name']
+            offset = base + element['offset']
+            if name == None:
+                if element.get('types') != None:
+                    # An anonymous struct or union. Its members are members of this struct.
+                    self.add_members(element['types'], offset, names, formats, offsets)
+                continue
+            if element.get('bit_field'):
+                if element['size'] != 0:
+                    type_name = scrape.evaluator.value_type(element['type_name'])
+                    unit_size = scrape.type_size(type_name)
+                    names.append(name)
+                    formats.append(numpy.dtype(scalar_type(self.prefix, 'B', unit_size)))
+                    offsets.append((offset - element['offset'] % unit_size) // 8)
+                continue
+            names.append(name)
+            formats.append(self.value(element['type_name'], element['array'], element['ptr'], element.get('types')))
+            offsets.append(offset // 8)
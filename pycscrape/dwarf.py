@@ -0,0 +1,1173 @@
+#-----------------------------------------------------------------
+#    pycscrape: Python library for gathering information from C source files.
+#    Copyright (C) 2017  Mike Morgan  (mikemorgan@blueyonder.co.uk)
+#
+#    This library is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this library.  If not, see <http://www.gnu.org/licenses/>.
+#-----------------------------------------------------------------
+#
+#  Reading the types, variables and enums of an ELF file from its DWARF debug information. See CScrape.parse_dwarf()
+#-----------------------------------------------------------------
+
+import struct
+import zlib
+
+from . import elf
+from .records import VariableRecord, EnumRecord, EnumValueRecord, TypedefRecord, TypedefElementRecord
+
+# Tags of the debugging information entries (DIEs)
+DW_TAG_array_type            = 0x01
+DW_TAG_class_type            = 0x02
+DW_TAG_enumeration_type      = 0x04
+DW_TAG_lexical_block         = 0x0b
+DW_TAG_member                = 0x0d
+DW_TAG_pointer_type          = 0x0f
+DW_TAG_reference_type        = 0x10
+DW_TAG_compile_unit          = 0x11
+DW_TAG_structure_type        = 0x13
+DW_TAG_subroutine_type       = 0x15
+DW_TAG_typedef               = 0x16
+DW_TAG_union_type            = 0x17
+DW_TAG_subrange_type         = 0x21
+DW_TAG_base_type             = 0x24
+DW_TAG_const_type            = 0x26
+DW_TAG_enumerator            = 0x28
+DW_TAG_packed_type           = 0x2d
+DW_TAG_subprogram            = 0x2e
+DW_TAG_variable              = 0x34
+DW_TAG_volatile_type         = 0x35
+DW_TAG_restrict_type         = 0x37
+DW_TAG_namespace             = 0x39
+DW_TAG_shared_type           = 0x40
+DW_TAG_rvalue_reference_type = 0x42
+DW_TAG_atomic_type           = 0x47
+DW_TAG_immutable_type        = 0x4b
+
+# Attributes
+DW_AT_location             = 0x02
+DW_AT_name                 = 0x03
+DW_AT_byte_size            = 0x0b
+DW_AT_bit_offset           = 0x0c
+DW_AT_bit_size             = 0x0d
+DW_AT_stmt_list            = 0x10
+DW_AT_low_pc               = 0x11
+DW_AT_high_pc              = 0x12
+DW_AT_const_value          = 0x1c
+DW_AT_lower_bound          = 0x22
+DW_AT_upper_bound          = 0x2f
+DW_AT_abstract_origin      = 0x31
+DW_AT_count                = 0x37
+DW_AT_data_member_location = 0x38
+DW_AT_decl_column          = 0x39
+DW_AT_decl_file            = 0x3a
+DW_AT_decl_line            = 0x3b
+DW_AT_declaration          = 0x3c
+DW_AT_encoding             = 0x3e
+DW_AT_external             = 0x3f
+DW_AT_specification        = 0x47
+DW_AT_type                 = 0x49
+DW_AT_data_bit_offset      = 0x6b
+DW_AT_str_offsets_base     = 0x72
+DW_AT_addr_base            = 0x73
+DW_AT_alignment            = 0x88
+
+# Forms of the attribute values
+DW_FORM_addr           = 0x01
+DW_FORM_block2         = 0x03
+DW_FORM_block4         = 0x04
+DW_FORM_data2          = 0x05
+DW_FORM_data4          = 0x06
+DW_FORM_data8          = 0x07
+DW_FORM_string         = 0x08
+DW_FORM_block          = 0x09
+DW_FORM_block1         = 0x0a
+DW_FORM_data1          = 0x0b
+DW_FORM_flag           = 0x0c
+DW_FORM_sdata          = 0x0d
+DW_FORM_strp           = 0x0e
+DW_FORM_udata          = 0x0f
+DW_FORM_ref_addr       = 0x10
+DW_FORM_ref1           = 0x11
+DW_FORM_ref2           = 0x12
+DW_FORM_ref4           = 0x13
+DW_FORM_ref8           = 0x14
+DW_FORM_ref_udata      = 0x15
+DW_FORM_indirect       = 0x16
+DW_FORM_sec_offset     = 0x17
+DW_FORM_exprloc        = 0x18
+DW_FORM_flag_present   = 0x19
+DW_FORM_strx           = 0x1a
+DW_FORM_addrx          = 0x1b
+DW_FORM_ref_sup4       = 0x1c
+DW_FORM_strp_sup       = 0x1d
+DW_FORM_data16         = 0x1e
+DW_FORM_line_strp      = 0x1f
+DW_FORM_ref_sig8       = 0x20
+DW_FORM_implicit_const = 0x21
+DW_FORM_loclistx       = 0x22
+DW_FORM_rnglistx       = 0x23
+DW_FORM_ref_sup8       = 0x24
+DW_FORM_strx1          = 0x25
+DW_FORM_strx2          = 0x26
+DW_FORM_strx3          = 0x27
+DW_FORM_strx4          = 0x28
+DW_FORM_addrx1         = 0x29
+DW_FORM_addrx2         = 0x2a
+DW_FORM_addrx3         = 0x2b
+DW_FORM_addrx4         = 0x2c
+
+# Base type encodings
+DW_ATE_signed        = 0x05
+DW_ATE_signed_char   = 0x06
+DW_ATE_unsigned_char = 0x08
+
+# Location expression operations
+DW_OP_addr           = 0x03
+DW_OP_plus_uconst    = 0x23
+DW_OP_addrx          = 0xa1
+DW_OP_GNU_addr_index = 0xfb
+
+# Line number program content types (DWARF 5)
+DW_LNCT_path            = 0x1
+DW_LNCT_directory_index = 0x2
+
+# Unit types (DWARF 5)
+DW_UT_type          = 0x02
+DW_UT_skeleton      = 0x04
+DW_UT_split_compile = 0x05
+DW_UT_split_type    = 0x06
+
+ELFCOMPRESS_ZLIB = 1
+SHF_COMPRESSED   = 0x800
+
+# The sections read. The DWARF is in .debug_info. The other sections hold the abbreviations, strings, file
+# names and addresses it refers to.
+SECTIONS = ('.debug_info', '.debug_abbrev', '.debug_str', '.debug_line_str', '.debug_line',
+            '.debug_str_offsets', '.debug_addr')
+
+# Tags which add nothing to the layout of the type they refer to e.g. 'const int'
+QUALIFIER_TAGS = frozenset((DW_TAG_const_type, DW_TAG_volatile_type, DW_TAG_restrict_type, DW_TAG_atomic_type,
+                            DW_TAG_immutable_type, DW_TAG_packed_type, DW_TAG_shared_type))
+POINTER_TAGS   = frozenset((DW_TAG_pointer_type, DW_TAG_reference_type, DW_TAG_rvalue_reference_type))
+AGGREGATE_TAGS = frozenset((DW_TAG_structure_type, DW_TAG_class_type, DW_TAG_union_type))
+
+# Size in bits of the constant forms, which may hold a signed value. See DebugInfo.signed()
+DATA_BITS = { DW_FORM_data1: 8, DW_FORM_data2: 16, DW_FORM_data4: 32, DW_FORM_data8: 64 }
+ADDRESS_FORMS = frozenset((DW_FORM_addr, DW_FORM_addrx, DW_FORM_addrx1, DW_FORM_addrx2, DW_FORM_addrx3,
+                           DW_FORM_addrx4))
+
+
+# Return (value, position after it) of the unsigned LEB128 number at buf[pos]
+def uleb(buf, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+# Return (value, position after it) of the signed LEB128 number at buf[pos]
+def sleb(buf, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            if byte & 0x40:
+                value -= 1 << shift
+            return value, pos
+
+
+# Return the string ending with a 0 at buf[pos]
+def cstring(buf, pos):
+    return buf[pos:buf.index(b'\0', pos)].decode('utf8')
+
+
+# Return (prefix, sections) of an ELF file in buf. prefix is the struct endian ('<' or '>') and sections is a
+# dict of the DWARF sections (see SECTIONS) by name. Each is a bytes object. Compressed sections (e.g. gcc -gz)
+# are decompressed.
+def debug_sections(buf, name):
+    prefix, formats, header = elf.elf_header(buf, name)
+    named = elf.named_sections(buf, header, elf.section_headers(buf, prefix, formats, name))
+    sections = dict()
+    for section_name in SECTIONS:
+        section = named.get(section_name)
+        if section == None:
+            continue
+        data = bytes(buf[section[4]:section[4] + section[5]])
+        if section[2] & SHF_COMPRESSED:
+            # The data starts with a compression header: ch_type, (ch_reserved,) ch_size, ch_addralign
+            chdr = struct.Struct(prefix + ('III' if buf[4] == elf.ELFCLASS32 else 'IIQQ'))
+            if chdr.unpack_from(data)[0] != ELFCOMPRESS_ZLIB:
+                raise Exception("Unsupported compression of section %s in %s" % (section_name, name))
+            data = zlib.decompress(data[chdr.size:])
+        sections[section_name] = data
+    return prefix, sections
+
+
+# A debugging information entry. attrs is a dict of the values of its attributes, with references as offsets
+# into .debug_info. forms is the dict of the form of each attribute (shared by the DIEs of an abbreviation).
+class Die():
+    __slots__ = ('offset', 'tag', 'attrs', 'forms', 'children', 'unit')
+
+    def __init__(self, offset, tag, attrs, forms, children, unit):
+        self.offset   = offset
+        self.tag      = tag
+        self.attrs    = attrs
+        self.forms    = forms
+        self.children = children
+        self.unit     = unit
+
+
+# The header of a unit of .debug_info and the values of its compile unit DIE that the other DIEs depend on
+class Unit():
+    def __init__(self, offset):
+        self.offset           = offset
+        self.die              = None    # The compile unit DIE
+        self.str_offsets_base = None    # Set once the compile unit DIE has been read
+        self.addr_base        = None
+        self.files            = None    # Names of the files of DW_AT_decl_file. See DebugInfo.file_name()
+
+
+# The DIEs of the units of .debug_info. DWARF versions 2 to 5, in 32 and 64 bit formats, are read.
+class DebugInfo():
+    def __init__(self, prefix, sections, name):
+        self.name = name
+        self.info = sections.get('.debug_info')
+        if self.info == None:
+            raise Exception("No DWARF debug information (.debug_info) found in %s" % name)
+        self.abbrev      = sections.get('.debug_abbrev', b'')
+        self.str         = sections.get('.debug_str', b'')
+        self.line_str    = sections.get('.debug_line_str', b'')
+        self.line        = sections.get('.debug_line')
+        self.str_offsets = sections.get('.debug_str_offsets', b'')
+        self.addr        = sections.get('.debug_addr', b'')
+        self.big_endian  = prefix == '>'
+        self.formats     = dict([(size, struct.Struct(prefix + code))
+                                 for size, code in ((1, 'B'), (2, 'H'), (4, 'I'), (8, 'Q'))])
+        self.strings     = dict()   # Strings of .debug_str by offset. The same names are used by every unit.
+        self.abbrevs     = dict()   # Abbreviation tables by offset. See abbreviations()
+        self.plans       = dict()   # Decoding plans of the abbreviation tables. See decode_plans()
+        self.dies        = dict()   # Every DIE by its offset
+        self.units       = []
+        self.read_units()
+
+
+    # Read the units of .debug_info
+    def read_units(self):
+        info = self.info
+        u16, u32, u64 = self.formats[2], self.formats[4], self.formats[8]
+        pos = 0
+        while pos + 11 <= len(info):
+            unit = Unit(pos)
+            length = u32.unpack_from(info, pos)[0]
+            pos += 4
+            unit.offset_size = 4
+            if length == 0xffffffff:
+                length = u64.unpack_from(info, pos)[0]
+                pos += 8
+                unit.offset_size = 8
+            end = pos + length
+            unit.version = u16.unpack_from(info, pos)[0]
+            pos += 2
+            if unit.version < 2 or unit.version > 5:
+                raise Exception("Unsupported DWARF version %d at offset 0x%x of .debug_info in %s" %
+                                (unit.version, unit.offset, self.name))
+            offset_format = self.formats[unit.offset_size]
+            if unit.version >= 5:
+                unit_type, unit.address_size = info[pos], info[pos + 1]
+                abbrev_offset = offset_format.unpack_from(info, pos + 2)[0]
+                pos += 2 + unit.offset_size
+                if unit_type in (DW_UT_skeleton, DW_UT_split_compile):
+                    pos += 8                          # dwo_id
+                elif unit_type in (DW_UT_type, DW_UT_split_type):
+                    pos += 8 + unit.offset_size       # type_signature, type_offset
+            else:
+                abbrev_offset = offset_format.unpack_from(info, pos)[0]
+                unit.address_size = info[pos + unit.offset_size]
+                pos += unit.offset_size + 1
+            unit.offset_format = offset_format
+            unit.address_format = self.formats.get(unit.address_size)
+            if unit.address_format == None:
+                raise Exception("Unsupported address size %d at offset 0x%x of .debug_info in %s" %
+                                (unit.address_size, unit.offset, self.name))
+            self.read_dies(unit, self.decode_plans(abbrev_offset, unit), pos, end)
+            self.units.append(unit)
+            pos = end
+
+
+    # Return the abbreviation table at the given offset of .debug_abbrev. The key is the abbreviation code and
+    # the value is (tag, has children, ((attribute, form, implicit constant), ...), dict of form by attribute)
+    def abbreviations(self, offset):
+        table = self.abbrevs.get(offset)
+        if table != None:
+            return table
+        buf = self.abbrev
+        table = dict()
+        pos = offset
+        while True:
+            code, pos = uleb(buf, pos)
+            if code == 0:
+                break
+            tag, pos = uleb(buf, pos)
+            children = buf[pos] != 0
+            pos += 1
+            specs = []
+            forms = dict()
+            while True:
+                attr, pos = uleb(buf, pos)
+                form, pos = uleb(buf, pos)
+                if attr == 0 and form == 0:
+                    break
+                const = None
+                if form == DW_FORM_implicit_const:
+                    const, pos = sleb(buf, pos)
+                specs.append((attr, form, const))
+                forms[attr] = form
+            table[code] = (tag, children, tuple(specs), forms)
+        self.abbrevs[offset] = table
+        return table
+
+
+    # Return the decoding plan of each abbreviation of an abbreviation table, for the forms of a unit. The key
+    # is the abbreviation code and the value is (tag, has children, forms, steps, constants). Each step is either
+    # a run of attributes with fixed size forms, read with one struct unpack:
+    #   (struct, attributes, references, .debug_str attributes, .debug_line_str attributes)
+    # or one attribute read by value(): (attribute, form, implicit constant). constants are the (attribute,
+    # value) of the forms which take no space (DW_FORM_flag_present and DW_FORM_implicit_const).
+    def decode_plans(self, offset, unit):
+        key = (offset, unit.offset_size, unit.address_size, unit.version == 2)
+        plans = self.plans.get(key)
+        if plans != None:
+            return plans
+        offset_code = 'I' if unit.offset_size == 4 else 'Q'
+        address_code = { 1: 'B', 2: 'H', 4: 'I', 8: 'Q' }[unit.address_size]
+        codes = { DW_FORM_data1: 'B', DW_FORM_ref1: 'B', DW_FORM_flag: 'B', DW_FORM_data2: 'H',
+                  DW_FORM_ref2: 'H', DW_FORM_data4: 'I', DW_FORM_ref4: 'I', DW_FORM_ref_sup4: 'I',
+                  DW_FORM_data8: 'Q', DW_FORM_ref8: 'Q', DW_FORM_ref_sig8: 'Q', DW_FORM_ref_sup8: 'Q',
+                  DW_FORM_addr: address_code, DW_FORM_sec_offset: offset_code, DW_FORM_strp_sup: offset_code,
+                  DW_FORM_strp: offset_code, DW_FORM_line_strp: offset_code,
+                  DW_FORM_ref_addr: address_code if unit.version == 2 else offset_code }
+        prefix = '>' if self.big_endian else '<'
+        plans = dict()
+        for code, (tag, children, specs, forms) in self.abbreviations(offset).items():
+            steps = []
+            constants = []
+            run = None
+            for attr, form, const in specs:
+                if form == DW_FORM_flag_present or form == DW_FORM_implicit_const:
+                    constants.append((attr, True if form == DW_FORM_flag_present else const))
+                elif form in codes:
+                    if run == None:
+                        run = ['', [], [], [], []]
+                        steps.append(run)
+                    run[0] += codes[form]
+                    run[1].append(attr)
+                    if form in (DW_FORM_ref1, DW_FORM_ref2, DW_FORM_ref4, DW_FORM_ref8):
+                        run[2].append(attr)
+                    elif form == DW_FORM_strp:
+                        run[3].append(attr)
+                    elif form == DW_FORM_line_strp:
+                        run[4].append(attr)
+                else:
+                    run = None
+                    steps.append((attr, form, const))
+            steps = tuple([(struct.Struct(prefix + step[0]), tuple(step[1]), tuple(step[2]), tuple(step[3]),
+                            tuple(step[4])) if type(step) is list else step for step in steps])
+            plans[code] = (tag, children, forms, steps, tuple(constants))
+        self.plans[key] = plans
+        return plans
+
+
+    # Read the DIEs of a unit from pos to end, with the decoding plans of its abbreviations (see decode_plans())
+    def read_dies(self, unit, plans, pos, end):
+        info = self.info
+        dies = self.dies
+        value = self.value
+        string = self.string
+        unit_offset = unit.offset
+        parents = []
+        while pos < end:
+            offset = pos
+            code = info[pos]
+            if code < 0x80:
+                pos += 1
+            else:
+                code, pos = uleb(info, pos)
+            if code == 0:
+                # The end of the children of the DIE at the top of the stack (or padding)
+                if len(parents) != 0:
+                    parents.pop()
+                continue
+            plan = plans.get(code)
+            if plan == None:
+                raise Exception("Unknown abbreviation %d at offset 0x%x of .debug_info in %s" % (code, offset, self.name))
+            tag, has_children, forms, steps, constants = plan
+            attrs = dict(constants)
+            for step in steps:
+                if len(step) == 5:
+                    fixed, names, refs, strps, line_strps = step
+                    attrs.update(zip(names, fixed.unpack_from(info, pos)))
+                    pos += fixed.size
+                    for attr in refs:
+                        attrs[attr] += unit_offset
+                    for attr in strps:
+                        attrs[attr] = string(self.str, attrs[attr])
+                    for attr in line_strps:
+                        attrs[attr] = string(self.line_str, attrs[attr])
+                else:
+                    attr, form, const = step
+                    attrs[attr], pos = value(unit, form, const, pos)
+            die = Die(offset, tag, attrs, forms, [] if has_children else (), unit)
+            dies[offset] = die
+            if len(parents) != 0:
+                parents[-1].children.append(die)
+            elif unit.die == None:
+                self.unit_die(unit, die)
+            if has_children:
+                parents.append(die)
+
+
+    # Set the compile unit DIE of a unit. The string and address indexes of its own attributes are looked up
+    # now that the bases are known (see value()).
+    def unit_die(self, unit, die):
+        unit.die = die
+        unit.str_offsets_base = die.attrs.get(DW_AT_str_offsets_base, 8)
+        unit.addr_base = die.attrs.get(DW_AT_addr_base, 8)
+        for attr, value in die.attrs.items():
+            if type(value) is tuple:
+                die.attrs[attr] = self.indexed(unit, value[0], value[1])
+
+
+    # Return (value, position after it) of an attribute value of the given form at pos in .debug_info.
+    # Strings are str, references are offsets into .debug_info, blocks and expressions are bytes and constants
+    # are int. Constant forms of a fixed size are unsigned (see signed()).
+    def value(self, unit, form, const, pos):
+        info = self.info
+        if form == DW_FORM_strp or form == DW_FORM_line_strp:
+            offset = unit.offset_format.unpack_from(info, pos)[0]
+            return self.string(self.str if form == DW_FORM_strp else self.line_str, offset), pos + unit.offset_size
+        if form == DW_FORM_data1 or form == DW_FORM_ref1 or form == DW_FORM_flag:
+            value = info[pos]
+            pos += 1
+        elif form == DW_FORM_data2 or form == DW_FORM_ref2:
+            value = self.formats[2].unpack_from(info, pos)[0]
+            pos += 2
+        elif form == DW_FORM_data4 or form == DW_FORM_ref4 or form == DW_FORM_ref_sup4:
+            value = self.formats[4].unpack_from(info, pos)[0]
+            pos += 4
+        elif form == DW_FORM_data8 or form == DW_FORM_ref8 or form == DW_FORM_ref_sig8 or form == DW_FORM_ref_sup8:
+            value = self.formats[8].unpack_from(info, pos)[0]
+            pos += 8
+        elif form == DW_FORM_udata or form == DW_FORM_ref_udata or form == DW_FORM_loclistx or form == DW_FORM_rnglistx:
+            value, pos = uleb(info, pos)
+        elif form == DW_FORM_sdata:
+            return sleb(info, pos)
+        elif form == DW_FORM_flag_present:
+            return True, pos
+        elif form == DW_FORM_implicit_const:
+            return const, pos
+        elif form == DW_FORM_exprloc or form == DW_FORM_block:
+            length, pos = uleb(info, pos)
+            return info[pos:pos + length], pos + length
+        elif form == DW_FORM_block1 or form == DW_FORM_block2 or form == DW_FORM_block4:
+            size = { DW_FORM_block1: 1, DW_FORM_block2: 2, DW_FORM_block4: 4 }[form]
+            length = self.formats[size].unpack_from(info, pos)[0]
+            pos += size
+            return info[pos:pos + length], pos + length
+        elif form == DW_FORM_addr:
+            return unit.address_format.unpack_from(info, pos)[0], pos + unit.address_size
+        elif form == DW_FORM_sec_offset or form == DW_FORM_strp_sup:
+            return unit.offset_format.unpack_from(info, pos)[0], pos + unit.offset_size
+        elif form == DW_FORM_ref_addr:
+            # The offset size of DWARF 2 references is the address size
+            size = unit.address_size if unit.version == 2 else unit.offset_size
+            return self.formats[size].unpack_from(info, pos)[0], pos + size
+        elif form == DW_FORM_string:
+            end = info.index(b'\0', pos)
+            return info[pos:end].decode('utf8'), end + 1
+        elif form == DW_FORM_data16:
+            return info[pos:pos + 16], pos + 16
+        elif form in (DW_FORM_strx, DW_FORM_strx1, DW_FORM_strx2, DW_FORM_strx3, DW_FORM_strx4,
+                      DW_FORM_addrx, DW_FORM_addrx1, DW_FORM_addrx2, DW_FORM_addrx3, DW_FORM_addrx4):
+            if form == DW_FORM_strx or form == DW_FORM_addrx:
+                index, pos = uleb(info, pos)
+            else:
+                size = (form - DW_FORM_strx1 if form <= DW_FORM_strx4 else form - DW_FORM_addrx1) + 1
+                index = int.from_bytes(info[pos:pos + size], 'big' if self.big_endian else 'little')
+                pos += size
+            kind = 'str' if form in (DW_FORM_strx, DW_FORM_strx1, DW_FORM_strx2, DW_FORM_strx3,
+                                     DW_FORM_strx4) else 'addr'
+            if unit.die == None:
+                return (kind, index), pos     # The base is not known until the compile unit DIE is read
+            return self.indexed(unit, kind, index), pos
+        elif form == DW_FORM_indirect:
+            form, pos = uleb(info, pos)
+            return self.value(unit, form, const, pos)
+        else:
+            raise Exception("Unknown DWARF form 0x%x at offset 0x%x of .debug_info in %s" % (form, pos, self.name))
+        # References within the unit are relative to the start of the unit
+        if form in (DW_FORM_ref1, DW_FORM_ref2, DW_FORM_ref4, DW_FORM_ref8, DW_FORM_ref_udata):
+            value += unit.offset
+        return value, pos
+
+
+    # Return the string (kind 'str') or address (kind 'addr') with the given index of a unit
+    def indexed(self, unit, kind, index):
+        if kind == 'str':
+            offset = unit.offset_format.unpack_from(self.str_offsets, unit.str_offsets_base + index * unit.offset_size)[0]
+            return self.string(self.str, offset)
+        return unit.address_format.unpack_from(self.addr, unit.addr_base + index * unit.address_size)[0]
+
+
+    # Return the string at the given offset of a string section
+    def string(self, section, offset):
+        key = (section is self.str, offset)
+        string = self.strings.get(key)
+        if string == None:
+            string = cstring(section, offset)
+            self.strings[key] = string
+        return string
+
+
+    # Return the value of an attribute of a DIE as a signed number. Constants of a fixed size (e.g. data4)
+    # are read as unsigned by value().
+    def signed(self, die, attr):
+        value = die.attrs.get(attr)
+        bits = DATA_BITS.get(die.forms.get(attr))
+        if bits != None and value >= 1 << (bits - 1):
+            value -= 1 << bits
+        return value
+
+
+    # Return the address of the location expression of a variable with a fixed address (e.g. a global or
+    # static variable) or None if it has none (e.g. a local variable).
+    def address(self, die):
+        expression = die.attrs.get(DW_AT_location)
+        if type(expression) is not bytes or len(expression) == 0:
+            return None
+        unit = die.unit
+        op = expression[0]
+        if op == DW_OP_addr and len(expression) == 1 + unit.address_size:
+            return unit.address_format.unpack_from(expression, 1)[0]
+        if op == DW_OP_addrx or op == DW_OP_GNU_addr_index:
+            index, pos = uleb(expression, 1)
+            if pos == len(expression):
+                return self.indexed(unit, 'addr', index)
+        return None
+
+
+    # Return the name of the file of the DW_AT_decl_file of a DIE, or the name of its unit if it has none.
+    # The names are read from the header of the line number program of the unit (in .debug_line).
+    def file_name(self, die):
+        unit = die.unit
+        if unit.files == None:
+            unit.files = []
+            offset = unit.die.attrs.get(DW_AT_stmt_list)
+            if offset != None and self.line != None:
+                unit.files = self.file_names(unit, offset)
+        index = die.attrs.get(DW_AT_decl_file)
+        if index == None or index >= len(unit.files) or unit.files[index] == None:
+            return unit.die.attrs.get(DW_AT_name)
+        return unit.files[index]
+
+
+    # Return the list of the file names of the line number program at the given offset of .debug_line, so
+    # that the file of index n (a DW_AT_decl_file) is item n. Files in the compilation directory are given as
+    # written e.g. 'main.c'. The others are joined to their directory e.g. '/usr/include/stdint.h'.
+    def file_names(self, unit, offset):
+        buf = self.line
+        u16 = self.formats[2]
+        pos = offset
+        length = self.formats[4].unpack_from(buf, pos)[0]
+        pos += 4
+        offset_size = 4
+        if length == 0xffffffff:
+            pos += 8
+            offset_size = 8
+        version = u16.unpack_from(buf, pos)[0]
+        pos += 2
+        if version >= 5:
+            pos += 2                   # address_size, segment_selector_size
+        pos += offset_size             # header_length
+        pos += 5 if version >= 4 else 4  # minimum_instruction_length, (maximum_operations_per_instruction,)
+                                         # default_is_stmt, line_base, line_range
+        opcode_base = buf[pos]
+        pos += opcode_base             # opcode_base and standard_opcode_lengths
+        if version < 5:
+            # Directory 0 is the compilation directory. The first file is file 1.
+            directories = [None]
+            while buf[pos] != 0:
+                directory = cstring(buf, pos)
+                pos += len(directory.encode('utf8')) + 1
+                directories.append(directory)
+            pos += 1
+            files = [None]
+            while buf[pos] != 0:
+                name = cstring(buf, pos)
+                pos += len(name.encode('utf8')) + 1
+                directory, pos = uleb(buf, pos)
+                modified, pos = uleb(buf, pos)
+                size, pos = uleb(buf, pos)
+                files.append(self.join(directories, directory, name))
+            return files
+        entries, pos = self.line_entries(unit, buf, pos, offset_size)
+        directories = [None] + [entry.get(DW_LNCT_path) for entry in entries[1:]]
+        entries, pos = self.line_entries(unit, buf, pos, offset_size)
+        return [self.join(directories, entry.get(DW_LNCT_directory_index, 0), entry.get(DW_LNCT_path))
+                for entry in entries]
+
+
+    # Return the path of a file in a directory of the line number program. See file_names()
+    @staticmethod
+    def join(directories, index, name):
+        if name == None:
+            return None
+        if index == 0 or index >= len(directories) or directories[index] == None or name.startswith('/'):
+            return name
+        return directories[index].rstrip('/') + '/' + name
+
+
+    # Return (entries, position after them) of the directory or file name entries of a DWARF 5 line number
+    # program header at pos. Each entry is a dict of the value of each content type (e.g. DW_LNCT_path).
+    def line_entries(self, unit, buf, pos, offset_size):
+        count = buf[pos]
+        pos += 1
+        formats = []
+        for n in range(count):
+            content, pos = uleb(buf, pos)
+            form, pos = uleb(buf, pos)
+            formats.append((content, form))
+        count, pos = uleb(buf, pos)
+        entries = []
+        for n in range(count):
+            entry = dict()
+            for content, form in formats:
+                if form == DW_FORM_string:
+                    value = cstring(buf, pos)
+                    pos += len(value.encode('utf8')) + 1
+                elif form == DW_FORM_line_strp or form == DW_FORM_strp:
+                    offset = self.formats[offset_size].unpack_from(buf, pos)[0]
+                    pos += offset_size
+                    value = self.string(self.line_str if form == DW_FORM_line_strp else self.str, offset)
+                elif form == DW_FORM_udata:
+                    value, pos = uleb(buf, pos)
+                elif form in DATA_BITS or form == DW_FORM_data16:
+                    size = DATA_BITS.get(form, 128) // 8
+                    value = int.from_bytes(buf[pos:pos + size], 'big' if self.big_endian else 'little')
+                    pos += size
+                elif form == DW_FORM_block:
+                    size, pos = uleb(buf, pos)
+                    value = buf[pos:pos + size]
+                    pos += size
+                else:
+                    raise Exception("Unsupported form 0x%x in the line number program of %s" % (form, self.name))
+                entry[content] = value
+            entries.append(entry)
+        return entries, pos
+
+
+# Adds the typedefs, variables and enums of the DIEs of a DebugInfo to a CScrape object, in the same format as
+# parsing the C source gives, with the offsets and sizes given by the compiler.
+#
+#   - A typedef of a struct or union lists its members, as handle_typedef() does. Structs and unions with a tag
+#     are also typedefs named e.g. 'struct node', so members and variables of these types can be looked up.
+#   - A typedef of a pointer, array or function has no 'types' or 'size', as for the C source. Members and
+#     variables of these types are given as the type they are a name for e.g. 'char *' for 'str_t'.
+#   - Static variables of functions are variables with 'function' set.
+#   - Global and static variables with an address are added to CScrape.map_var_data (with the function of a
+#     function's static variable as its 'func') and functions to CScrape.map_func_data, so the symbol table is
+#     not needed to find the addresses.
+#   - The source lines are not in the DWARF, so 'line' is None
+#
+# The 'filename' of a variable is the name of the compile unit (e.g. 'src/main.c'). The filename of a typedef
+# or enum is the file it was declared in (e.g. a header).
+class DwarfRecords():
+    def __init__(self, scrape, info):
+        self.scrape     = scrape
+        self.info       = info
+        self.aggregates = dict()   # (elements, size, alignment) of each struct and union by DIE offset, and by
+                                   # where it was declared. See aggregate()
+        self.enum_keys  = set()    # (name, filename, line number, function) of each enum added
+
+
+    # Add the records of every compile unit
+    def add(self):
+        for unit in self.info.units:
+            if unit.die == None or unit.die.tag != DW_TAG_compile_unit:
+                continue
+            self.unit_name = unit.die.attrs.get(DW_AT_name)
+            self.map_file = self.scrape.simple_filename(self.unit_name)
+            self.add_scope(unit.die.children, None)
+
+
+    # Add the records of the DIEs of a scope. function is the name of the function the scope is in (or None).
+    def add_scope(self, dies, function):
+        for die in dies:
+            tag = die.tag
+            if tag == DW_TAG_variable:
+                self.add_variable(die, function)
+            elif tag == DW_TAG_typedef:
+                name = die.attrs.get(DW_AT_name)
+                if name != None:
+                    self.add_typedef(name, die, self.strip(self.ref(die, DW_AT_type)), function)
+            elif tag in AGGREGATE_TAGS:
+                name = die.attrs.get(DW_AT_name)
+                if name != None and not die.attrs.get(DW_AT_declaration):
+                    self.add_typedef(self.aggregate_name(die), die, die, function)
+            elif tag == DW_TAG_enumeration_type:
+                self.add_enum(die, die.attrs.get(DW_AT_name), function)
+            elif tag == DW_TAG_subprogram:
+                self.add_function(die)
+            elif tag == DW_TAG_lexical_block or tag == DW_TAG_namespace:
+                self.add_scope(die.children, function)
+
+
+    # Return the DIE an attribute of a DIE refers to (e.g. DW_AT_type) or None if it has none
+    def ref(self, die, attr):
+        offset = die.attrs.get(attr)
+        if offset == None:
+            return None
+        target = self.info.dies.get(offset)
+        if target == None:
+            raise SyntaxError("Unknown DWARF reference 0x%x from offset 0x%x" % (offset, die.offset))
+        return target
+
+
+    # Return the value of an attribute of a DIE, or of the declaration it completes (e.g. an 'extern'
+    # declaration of a variable) or the abstract instance it is an instance of (e.g. of an inline function)
+    def attr(self, die, attr):
+        while die != None:
+            value = die.attrs.get(attr)
+            if value != None:
+                return value
+            origin = self.ref(die, DW_AT_specification)
+            die = origin if origin != None else self.ref(die, DW_AT_abstract_origin)
+        return None
+
+
+    # Return the DIE with the qualifiers (e.g. const and volatile) of a type removed. None is void.
+    def strip(self, die):
+        while die != None and die.tag in QUALIFIER_TAGS:
+            die = self.ref(die, DW_AT_type)
+        return die
+
+
+    # Return True if a typedef names a pointer, array or function type (e.g. 'typedef char *str_t;'). These
+    # typedefs have no 'types' (as for the C source), so the values of these types are given as the type
+    # the typedef is a name for.
+    def unknown_typedef(self, die):
+        target = self.strip(self.ref(die, DW_AT_type))
+        if target == None:
+            return True
+        if target.tag == DW_TAG_typedef:
+            return self.unknown_typedef(target)
+        return target.tag in POINTER_TAGS or target.tag == DW_TAG_array_type or target.tag == DW_TAG_subroutine_type
+
+
+    # Return the name of a struct or union type with a tag e.g. 'struct node'
+    def aggregate_name(self, die):
+        return ('union ' if die.tag == DW_TAG_union_type else 'struct ') + die.attrs[DW_AT_name]
+
+
+    # Return (filename, line number) of the declaration of a DIE
+    def location(self, die):
+        return self.info.file_name(die), die.attrs.get(DW_AT_decl_line, 0)
+
+
+    # Add a typedef (or tagged struct or union) to scrape.typedefs
+    #   name     - Name of the typedef e.g. 'my_struct_t' or 'struct node'
+    #   die      - DIE of the typedef (or struct or union)
+    #   target   - DIE of the type the typedef is a name for, with its qualifiers removed
+    #   function - Function the typedef is declared in (or None)
+    def add_typedef(self, name, die, target, function):
+        scrape = self.scrape
+        filename, line_number = self.location(die)
+        existing = scrape.typedefs.get(name)
+        if existing != None and existing['filename'] == filename and existing['line_number'] == line_number:
+            return     # Declared by a header also included by an earlier unit
+        typedef_data = TypedefRecord()
+        typedef_data['filename'] = filename
+        typedef_data['line_number'] = line_number
+        typedef_data['line'] = None
+        typedef_data['exception'] = None
+        try:
+            if target != None and target.tag in AGGREGATE_TAGS:
+                elements, size, alignment = self.aggregate(target)
+                typedef_data['size'] = size
+                typedef_data['alignment'] = alignment
+                typedef_data['types'] = list(elements)
+            elif target != None and target.tag == DW_TAG_enumeration_type:
+                # e.g. 'typedef enum Life_e {DEAD,ALIVE} Life_t;'. As for the C source, this is an enum called
+                # 'Life_t' which is the same as 'Life_e'.
+                self.add_enum(target, name, function)
+                typedef_data['size'] = 0
+                typedef_data['alignment'] = scrape.STRUCT_ALIGNMENT
+                typedef_data['types'] = []
+            elif not self.unknown_typedef(die):
+                type_name, ptr, array, size, alignment, types, enum_name = self.value(self.ref(die, DW_AT_type))
+                type_element = TypedefElementRecord()
+                type_element['typedef_type'] = 'simple'
+                type_element['line_number'] = line_number
+                type_element['line'] = None
+                type_element['type_name'] = type_name
+                type_element['var_name'] = None
+                type_element['offset'] = 0
+                type_element['array'] = []
+                type_element['ptr'] = ''
+                type_element['size'] = size
+                type_element['alignment'] = alignment
+                typedef_data['types'] = [type_element]
+                typedef_data['size'] = size
+                typedef_data['alignment'] = alignment
+        except Exception as e:
+            typedef_data['exception'] = e
+        typedef_data.fingerprint()
+        scrape.add_typedef(name, typedef_data)
+
+
+    # Return (elements, size, alignment) of a struct or union DIE. The elements are TypedefElementRecord
+    # objects, as given by CScrape.aggregate_elements(), with the offsets of the compiler.
+    def aggregate(self, die):
+        result = self.aggregates.get(die.offset)
+        if result != None:
+            return result
+        if die.attrs.get(DW_AT_declaration):
+            raise SyntaxError("Type '%s' is incomplete" % self.aggregate_name(die))
+        # A struct declared by a header is described again by every unit including the header. It is only
+        # worked out once.
+        declared = None
+        if DW_AT_decl_line in die.attrs:
+            declared = (self.info.file_name(die), die.attrs[DW_AT_decl_line], die.attrs.get(DW_AT_decl_column),
+                        die.tag, die.attrs.get(DW_AT_name), die.attrs.get(DW_AT_byte_size), len(die.children))
+            result = self.aggregates.get(declared)
+            if result != None:
+                self.aggregates[die.offset] = result
+                return result
+        elements = [self.element(member) for member in die.children if member.tag == DW_TAG_member]
+        size = die.attrs.get(DW_AT_byte_size, 0) * 8
+        # The alignment is that of its most aligned member, and at least STRUCT_ALIGNMENT as for the C source.
+        # A member at an offset which is not a multiple of the alignment of its type (e.g. in a packed struct,
+        # or a double in a struct for i386) is taken to have the alignment of its offset.
+        alignment = die.attrs.get(DW_AT_alignment, 0) * 8
+        if alignment == 0:
+            alignment = 8
+            reduced = False
+            for element in elements:
+                if not element.get('bit_field'):
+                    while element['alignment'] > 8 and element['offset'] % element['alignment'] != 0:
+                        element['alignment'] //= 2
+                        reduced = True
+                alignment = max(alignment, element['alignment'])
+            while size % alignment != 0:
+                alignment //= 2
+                reduced = True
+            if not reduced and size % self.scrape.STRUCT_ALIGNMENT == 0:
+                alignment = max(alignment, self.scrape.STRUCT_ALIGNMENT)
+        result = (elements, size, alignment)
+        self.aggregates[die.offset] = result
+        if declared != None:
+            self.aggregates[declared] = result
+        return result
+
+
+    # Return the TypedefElementRecord of a member DIE of a struct or union
+    def element(self, die):
+        attrs = die.attrs
+        type_name, ptr, array, size, alignment, types, enum_name = self.value(self.ref(die, DW_AT_type))
+        type_element = TypedefElementRecord()
+        type_element['type_name']   = type_name
+        type_element['var_name']    = attrs.get(DW_AT_name)
+        type_element['line_number'] = attrs.get(DW_AT_decl_line, 0)
+        type_element['line']        = None
+        type_element['size']        = size
+        type_element['array']       = array
+        type_element['ptr']         = ptr
+        type_element['exception']   = None
+        location = attrs.get(DW_AT_data_member_location, 0)
+        if type(location) is bytes:
+            # A DWARF 2 location expression e.g. DW_OP_plus_uconst 8
+            if len(location) == 0 or location[0] != DW_OP_plus_uconst:
+                raise SyntaxError("Unsupported location of member '%s'" % attrs.get(DW_AT_name))
+            location = uleb(location, 1)[0]
+        offset = location * 8
+        width = attrs.get(DW_AT_bit_size)
+        if width != None:
+            if DW_AT_data_bit_offset in attrs:
+                offset = attrs[DW_AT_data_bit_offset]
+            else:
+                # DWARF 2 to 4. DW_AT_bit_offset is the number of bits from the most significant bit of the
+                # storage unit at the member's location to the most significant bit of the field.
+                unit_size = attrs.get(DW_AT_byte_size, size // 8) * 8
+                bit_offset = self.info.signed(die, DW_AT_bit_offset) or 0
+                if self.info.big_endian:
+                    offset += bit_offset
+                else:
+                    offset += unit_size - bit_offset - width
+            type_element['size'] = width
+        type_element['offset']      = offset
+        type_element['alignment']   = alignment
+        if width != None:
+            type_element['bit_field'] = True
+        if types != None:
+            type_element['types'] = types
+        return type_element
+
+
+    # Return (type_name, ptr, array, size, alignment, types, enum_name) of a value of the type with the given
+    # DIE, as a declaration in the C source gives. e.g. for 'char *names[3];' the type_name is 'signed char',
+    # ptr is 1 and array is [3]. size and alignment are in bits. types is the elements of a struct or union
+    # without a tag, otherwise None. enum_name is the name of an enum type, otherwise None.
+    def value(self, die):
+        array = []
+        die = self.skip(die)
+        while die != None and die.tag == DW_TAG_array_type:
+            array.extend(self.dimensions(die))
+            die = self.skip(self.ref(die, DW_AT_type))
+        if die == None:
+            raise SyntaxError("Unexpected void type")
+        if die.tag in POINTER_TAGS:
+            size = die.attrs.get(DW_AT_byte_size, die.unit.address_size) * 8
+            alignment = self.scrape.POINTER_SIZE
+            types = None
+            enum_name = None
+            # The type name of a pointer is the name of the type it points to
+            ptr = 0
+            while die != None and (die.tag in POINTER_TAGS or die.tag == DW_TAG_array_type):
+                if die.tag != DW_TAG_array_type:
+                    ptr += 1
+                die = self.skip(self.ref(die, DW_AT_type))
+            type_name = self.type_name(die)
+        else:
+            ptr = 0
+            type_name, size, alignment, types, enum_name = self.item(die)
+        for count in array:
+            size *= count
+        return type_name, ptr, array, size, alignment, types, enum_name
+
+
+    # Return the DIE with the qualifiers of a type removed (see strip()), and the typedefs which are given as the
+    # type they are a name for (see unknown_typedef())
+    def skip(self, die):
+        die = self.strip(die)
+        while die != None and die.tag == DW_TAG_typedef and self.unknown_typedef(die):
+            die = self.strip(self.ref(die, DW_AT_type))
+        return die
+
+
+    # Return the name of the type a pointer points to. Pointers to functions are 'void *'.
+    def type_name(self, die):
+        if die == None or die.tag == DW_TAG_subroutine_type:
+            return 'void'
+        if die.tag == DW_TAG_base_type:
+            return self.base_type_name(die)
+        if die.tag == DW_TAG_typedef:
+            return die.attrs.get(DW_AT_name)
+        if die.tag in AGGREGATE_TAGS:
+            if die.attrs.get(DW_AT_name) != None:
+                return self.aggregate_name(die)
+            return 'union' if die.tag == DW_TAG_union_type else 'struct'
+        if die.tag == DW_TAG_enumeration_type:
+            return 'enum'
+        raise SyntaxError("Unsupported DWARF type (tag 0x%x) at offset 0x%x" % (die.tag, die.offset))
+
+
+    # Return (type_name, size, alignment, types, enum_name) of a value of a type which is not a pointer or
+    # array. See value()
+    def item(self, die):
+        scrape = self.scrape
+        tag = die.tag
+        if tag == DW_TAG_base_type:
+            type_name = self.base_type_name(die)
+            size = die.attrs.get(DW_AT_byte_size, 0) * 8
+            return type_name, size, self.alignment(type_name, size), None, None
+        if tag == DW_TAG_typedef:
+            type_name, size, alignment, types, enum_name = self.item(self.skip(self.ref(die, DW_AT_type)))
+            return die.attrs.get(DW_AT_name), size, alignment, None, None
+        if tag in AGGREGATE_TAGS:
+            elements, size, alignment = self.aggregate(die)
+            if die.attrs.get(DW_AT_name) != None:
+                return self.aggregate_name(die), size, alignment, None, None
+            return ('union' if tag == DW_TAG_union_type else 'struct'), size, alignment, elements, None
+        if tag == DW_TAG_enumeration_type:
+            size = die.attrs.get(DW_AT_byte_size, 0) * 8
+            if size != scrape.type_size('enum'):
+                # e.g. gcc -fshort-enums. The value is held as the integer type of the enum.
+                underlying = self.strip(self.ref(die, DW_AT_type))
+                if underlying != None:
+                    return self.item(underlying)
+            return 'enum', size, self.alignment('enum', size), None, die.attrs.get(DW_AT_name)
+        raise SyntaxError("Unsupported DWARF type (tag 0x%x) at offset 0x%x" % (tag, die.offset))
+
+
+    # Return the name of a base type DIE as given by CScrape.canonical_type(). The sign of a plain 'char' is
+    # the one used by the compiler.
+    def base_type_name(self, die):
+        name = die.attrs.get(DW_AT_name)
+        if name == 'char':
+            encoding = die.attrs.get(DW_AT_encoding)
+            if encoding == DW_ATE_signed_char:
+                name = 'signed char'
+            elif encoding == DW_ATE_unsigned_char:
+                name = 'unsigned char'
+        return self.scrape.canonical_type(name)
+
+
+    # Return the alignment in bits of a type of the given size. See CScrape.type_alignment()
+    def alignment(self, type_name, size):
+        try:
+            return self.scrape.type_alignment(type_name)
+        except SyntaxError:
+            return size
+
+
+    # Return the list of the number of items of each dimension of an array type DIE e.g. [2, 3]. A dimension of
+    # unknown size (e.g. a flexible array member) has 0 items.
+    def dimensions(self, die):
+        dimensions = []
+        for subrange in die.children:
+            if subrange.tag != DW_TAG_subrange_type:
+                continue
+            count = subrange.attrs.get(DW_AT_count)
+            if type(count) is not int:
+                upper = subrange.attrs.get(DW_AT_upper_bound)
+                count = 0
+                if type(upper) is int:
+                    lower = subrange.attrs.get(DW_AT_lower_bound, 0)
+                    count = max(self.info.signed(subrange, DW_AT_upper_bound) - lower + 1, 0)
+            dimensions.append(count)
+        if len(dimensions) == 0:
+            dimensions.append(0)
+        return dimensions
+
+
+    # Add an enum DIE to scrape.enums with the given name. An enum declared by a header is only added once,
+    # however many units include the header.
+    def add_enum(self, die, name, function):
+        if die.attrs.get(DW_AT_declaration):
+            return
+        filename, line_number = self.location(die)
+        key = (name, filename, line_number, function)
+        if key in self.enum_keys:
+            return
+        self.enum_keys.add(key)
+        enum = EnumRecord()
+        enum['filename'] = filename
+        enum['line_number'] = line_number
+        enum['function'] = function
+        enum['name'] = name
+        enum['exception'] = None
+        values = dict()
+        for enumerator in die.children:
+            if enumerator.tag != DW_TAG_enumerator:
+                continue
+            enum_item = EnumValueRecord()
+            enum_item['line_mumber'] = line_number
+            enum_item['line'] = None
+            enum_item['value'] = self.enum_value(die, enumerator)
+            values[enumerator.attrs.get(DW_AT_name)] = enum_item
+        enum['values'] = values
+        self.scrape.enums.append(enum)
+
+
+    # Return the value of an enumerator DIE of an enum. Fixed size constants are signed if the enum is.
+    def enum_value(self, die, enumerator):
+        encoding = die.attrs.get(DW_AT_encoding)
+        underlying = self.strip(self.ref(die, DW_AT_type))
+        if underlying != None and underlying.tag == DW_TAG_base_type:
+            encoding = underlying.attrs.get(DW_AT_encoding)
+        if encoding == DW_ATE_signed or encoding == DW_ATE_signed_char:
+            return self.info.signed(enumerator, DW_AT_const_value)
+        return enumerator.attrs.get(DW_AT_const_value)
+
+
+    # Add a variable DIE to scrape.variables. Variables of functions are only added if they have an address
+    # (i.e. they are static).
+    def add_variable(self, die, function):
+        scrape = self.scrape
+        if die.attrs.get(DW_AT_declaration):
+            return     # e.g. 'extern int x;'. It is added by the unit which defines it.
+        addr = self.info.address(die)
+        if function != None and addr == None:
+            return     # A local variable (or a static variable which was optimised away)
+        name = self.attr(die, DW_AT_name)
+        if name == None:
+            return
+        var_data = VariableRecord()
+        var_data['name']        = name
+        var_data['filename']    = self.unit_name
+        var_data['line_number'] = self.attr(die, DW_AT_decl_line) or 0
+        var_data['line']        = None
+        var_data['exception']   = None
+        size = None
+        try:
+            type_name, ptr, array, size, alignment, types, enum_name = self.value(self.ref_attr(die, DW_AT_type))
+            if types != None:
+                raise SyntaxError("Variable '%s' is an anonymous %s" % (name, type_name))
+            var_data['type'] = type_name
+            if enum_name != None:
+                var_data['enum_name'] = enum_name
+            var_data['ptr'] = ptr
+            var_data['function'] = function
+            var_data['array'] = array
+            var_data['size'] = size
+        except Exception as e:
+            var_data['exception'] = e
+        scrape.variables.append(var_data)
+        if addr != None:
+            external = self.attr(die, DW_AT_external)
+            scrape.map_var_data.append({ 'name': name, 'addr': addr, 'size': None if size == None else size // 8,
+                                         'file': None if external else self.map_file, 'func': function })
+
+
+    # Return the DIE an attribute refers to, of a DIE or of the declaration it completes. See attr()
+    def ref_attr(self, die, attr):
+        offset = self.attr(die, attr)
+        if offset == None:
+            return None
+        return self.info.dies[offset]
+
+
+    # Add a function DIE (with an address) to scrape.map_func_data and add the records of its scope
+    def add_function(self, die):
+        name = self.attr(die, DW_AT_name)
+        low = die.attrs.get(DW_AT_low_pc)
+        if low != None and name != None:
+            high = die.attrs.get(DW_AT_high_pc, low)
+            if die.forms.get(DW_AT_high_pc) not in ADDRESS_FORMS:
+                high += low     # DWARF 4 and later give the size
+            external = self.attr(die, DW_AT_external)
+            self.scrape.map_func_data.append({ 'name': name, 'addr': low, 'size': high - low,
+                                               'file': None if external else self.map_file, 'func': None })
+        self.add_scope(die.children, name)
+
+
+# Read the DWARF debug information of an ELF file and add its typedefs, variables and enums to a CScrape
+# object. See DwarfRecords.
+#   source - Filename of the ELF file, which is mapped with mmap, or a buffer (e.g. bytes) holding the file
+#   name   - Name of the file used in exceptions. Defaults to the filename.
+def read(scrape, source, name=None):
+    if isinstance(source, str):
+        with elf.map_file(source) as buf:
+            return read(scrape, buf, name or source)
+    if name == None:
+        name = 'ELF file'
+    prefix, sections = debug_sections(source, name)
+    DwarfRecords(scrape, DebugInfo(prefix, sections, name)).add()
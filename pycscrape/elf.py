@@ -0,0 +1,167 @@
+#-----------------------------------------------------------------
+#    pycscrape: Python library for gathering information from C source files.
+#    Copyright (C) 2017  Mike Morgan  (mikemorgan@blueyonder.co.uk)
+#
+#    This library is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this library.  If not, see <http://www.gnu.org/licenses/>.
+#-----------------------------------------------------------------
+#
+#  Reading the symbol table of an ELF file (e.g. results.elf) without readelf. See CScrape.parse_elf()
+#-----------------------------------------------------------------
+
+import mmap
+import struct
+
+ELF_MAGIC = b'\x7fELF'
+
+# e_ident[EI_CLASS]
+ELFCLASS32 = 1
+ELFCLASS64 = 2
+
+# e_ident[EI_DATA]
+ELFDATA2LSB = 1
+ELFDATA2MSB = 2
+
+SHT_SYMTAB = 2
+
+SHN_XINDEX = 0xFFFF
+
+STB_LOCAL   = 0
+STT_OBJECT  = 1
+STT_FUNC    = 2
+STT_FILE    = 4
+
+# struct formats (without the endian) of each ELF class
+#   header  - The ELF header after e_ident: e_type, e_machine, e_version, e_entry, e_phoff, e_shoff, e_flags,
+#             e_ehsize, e_phentsize, e_phnum, e_shentsize, e_shnum, e_shstrndx
+#   section - A section header: sh_name, sh_type, sh_flags, sh_addr, sh_offset, sh_size, sh_link, sh_info,
+#             sh_addralign, sh_entsize
+#   symbol  - A symbol. The order of the members differs between the classes. See symbol_members()
+FORMATS = { ELFCLASS32: { 'header': 'HHIIIIIHHHHHH', 'section': 'IIIIIIIIII', 'symbol': 'IIIBBH' },
+            ELFCLASS64: { 'header': 'HHIQQQIHHHHHH', 'section': 'IIQQQQIIQQ', 'symbol': 'IBBHQQ' } }
+
+
+# Return the indexes of (st_name, st_value, st_size, st_info) in a symbol unpacked with FORMATS[elf_class]
+def symbol_members(elf_class):
+    if elf_class == ELFCLASS32:
+        return 0, 1, 2, 3
+    return 0, 4, 5, 1
+
+
+# Return a read only mmap of a file. An exception is raised if the file is empty.
+def map_file(filename):
+    with open(filename, 'rb') as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise Exception("%s is not an ELF file" % filename)     # An empty file
+
+
+# Check the identification of the ELF file in buf and return (prefix, formats, header). prefix is the struct
+# endian ('<' or '>'), formats is FORMATS[elf class] and header is the ELF header unpacked (see FORMATS).
+def elf_header(buf, name):
+    if bytes(buf[0:4]) != ELF_MAGIC:
+        raise Exception("%s is not an ELF file" % name)
+    elf_class = buf[4]
+    if elf_class not in FORMATS:
+        raise Exception("Unknown ELF class %d in %s" % (elf_class, name))
+    if buf[5] not in (ELFDATA2LSB, ELFDATA2MSB):
+        raise Exception("Unknown ELF data encoding %d in %s" % (buf[5], name))
+    prefix = '<' if buf[5] == ELFDATA2LSB else '>'
+    formats = FORMATS[elf_class]
+    return prefix, formats, struct.unpack_from(prefix + formats['header'], buf, 16)
+
+
+# Return the list of section headers (as tuples, see FORMATS) of an ELF file in buf
+def section_headers(buf, prefix, formats, name):
+    header = struct.unpack_from(prefix + formats['header'], buf, 16)
+    shoff, shentsize, shnum = header[5], header[10], header[11]
+    if shoff == 0:
+        return []
+    section = struct.Struct(prefix + formats['section'])
+    if shentsize != section.size:
+        raise Exception("Unexpected section header size %d in %s" % (shentsize, name))
+    if shnum == 0:
+        # More sections than fit in e_shnum. The number is the sh_size of section 0.
+        shnum = section.unpack_from(buf, shoff)[5]
+    if shoff + shnum * section.size > len(buf):
+        raise Exception("Section headers are beyond the end of %s" % name)
+    return [section.unpack_from(buf, shoff + n * section.size) for n in range(shnum)]
+
+
+# Return a dict of the section headers of an ELF file by section name e.g. { '.debug_info': (...), ... }
+#   header   - ELF header returned by elf_header()
+#   sections - Section headers returned by section_headers()
+def named_sections(buf, header, sections):
+    if len(sections) == 0:
+        return dict()
+    index = header[12]
+    if index == SHN_XINDEX:
+        index = sections[0][6]    # The index of the section name string table is the sh_link of section 0
+    names = sections[index]
+    strings = buf[names[4]:names[4] + names[5]]
+    named = dict()
+    for section in sections:
+        start = section[0]
+        named[strings[start:strings.index(b'\0', start)].decode('utf8')] = section
+    return named
+
+
+# Yield ('var', data) or ('func', data) for each OBJECT or FUNC symbol of the '.symtab' symbol table of an ELF
+# file, in the same format (and order) as readelf.iter_symbols() gives for the output of readelf. ELF32 and
+# ELF64 files of either endian are read. LOCAL symbols belong to the file of the FILE symbol before them.
+#   source - Filename of the ELF file, which is mapped with mmap, or a buffer (e.g. bytes) holding the file
+#   name   - Name of the file used in exceptions. Defaults to the filename.
+def iter_symbols(source, name=None):
+    if isinstance(source, str):
+        with map_file(source) as buf:
+            yield from iter_symbols(buf, name or source)
+        return
+    if name == None:
+        name = 'ELF file'
+    prefix, formats, header = elf_header(source, name)
+    sections = section_headers(source, prefix, formats, name)
+    symbol_format = struct.Struct(prefix + formats['symbol'])
+    st_name, st_value, st_size, st_info = symbol_members(source[4])
+    found = False
+    for section in sections:
+        sh_type, sh_offset, sh_size, sh_link = section[1], section[4], section[5], section[6]
+        if sh_type != SHT_SYMTAB:
+            continue
+        found = True
+        # The names of the symbols are in the string table section given by sh_link
+        strtab = sections[sh_link]
+        strings = source[strtab[4]:strtab[4] + strtab[5]]
+        end = strings.index
+        count = sh_size // symbol_format.size
+        file = None
+        symbols = source[sh_offset:sh_offset + count * symbol_format.size]
+        for symbol in struct.iter_unpack(symbol_format.format, symbols):
+            info = symbol[st_info]
+            kind = info & 0xF
+            if kind != STT_OBJECT and kind != STT_FUNC and kind != STT_FILE:
+                continue
+            start = symbol[st_name]
+            symbol_name = strings[start:end(b'\0', start)].decode('utf8')
+            if kind == STT_FILE:
+                file = symbol_name or None
+                continue
+            if kind == STT_OBJECT and symbol_name.find('.') != -1:
+                # If the name is NAME.1234, remove the .1234
+                symbol_name = symbol_name[:symbol_name.find('.')]
+            # 'func' - We can not work out the function from this data
+            data = { 'name': symbol_name, 'addr': symbol[st_value], 'size': symbol[st_size],
+                     'file': file if info >> 4 == STB_LOCAL else None, 'func': None }
+            yield ('func' if kind == STT_FUNC else 'var'), data
+    if not found:
+        raise Exception("No symbol table found in %s" % name)
@@ -0,0 +1,165 @@
+#-----------------------------------------------------------------
+#    pycscrape: Python library for gathering information from C source files.
+#    Copyright (C) 2017  Mike Morgan  (mikemorgan@blueyonder.co.uk)
+#
+#    This library is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this library.  If not, see <http://www.gnu.org/licenses/>.
+#-----------------------------------------------------------------
+#
+#  Writing and reading the JSON of a CScrape model one record at a time. See CScrape.json_dump_to()
+#-----------------------------------------------------------------
+
+import codecs
+import collections.abc
+import json
+import re
+
+from .records import portable_default
+
+_DECODER    = json.JSONDecoder()
+_ENCODER    = json.JSONEncoder(default=portable_default)
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+# Write a JSON object to the file fp, one section and one record at a time. The text is the same as
+# json.dumps(dict(sections), default=portable_default).
+# sections - list of (key, value) tuples. Lists and dicts (e.g. of records) are written an item at a time.
+#            Other values are written in one go.
+def write_sections(fp, sections):
+    fp.write('{')
+    for n in range(len(sections)):
+        key, value = sections[n]
+        if n != 0:
+            fp.write(', ')
+        fp.write(json.dumps(key) + ': ')
+        if isinstance(value, collections.abc.Mapping):
+            fp.write('{')
+            separator = ''
+            for name in value:
+                fp.write(separator + json.dumps(name) + ': ' + _ENCODER.encode(value[name]))
+                separator = ', '
+            fp.write('}')
+        elif isinstance(value, collections.abc.Sequence) and not isinstance(value, str):
+            fp.write('[')
+            separator = ''
+            for item in value:
+                fp.write(separator + _ENCODER.encode(item))
+                separator = ', '
+            fp.write(']')
+        else:
+            fp.write(_ENCODER.encode(value))
+    fp.write('}')
+
+
+# Reads JSON from a file a piece at a time. The file may be opened in text or binary (UTF-8) mode and may be a
+# pipe. Only the text not yet used is kept, so memory use does not depend on the size of the file.
+# Usage:
+#   reader = JsonStreamReader(f)
+#   for key in reader.members():       # The file holds an object
+#       if key == 'list':
+#           for item in reader.elements():
+#               ...
+#       else:
+#           value = reader.value()     # The value of each member must be read (or skipped with value())
+class JsonStreamReader():
+    def __init__(self, fp, chunk_size=64*1024):
+        self.fp         = fp
+        self.chunk_size = chunk_size
+        self.buffer     = ''
+        self.pos        = 0
+        self.eof        = False
+        self.decoder    = codecs.getincrementaldecoder('utf8')()
+
+
+    # Read the next chunk of the file into the buffer. Returns False at the end of the file.
+    def fill(self):
+        while not self.eof:
+            chunk = self.fp.read(self.chunk_size)
+            self.eof = len(chunk) == 0
+            if isinstance(chunk, bytes):
+                # A chunk may end part way through a UTF-8 character. The decoder keeps the start of it.
+                chunk = self.decoder.decode(chunk, self.eof)
+            if len(chunk) != 0:
+                self.buffer = self.buffer[self.pos:] + chunk
+                self.pos = 0
+                return True
+        return False
+
+
+    # Return the next character other than white space (without using it) or '' at the end of the file
+    def peek(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+
+    # Use the next character, which must be c
+    def expect(self, c):
+        found = self.peek()
+        if found != c:
+            raise ValueError("Expected '%s' but found '%s' in JSON" % (c, found))
+        self.pos += 1
+
+
+    # Read and return the next JSON value
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # The value continues in the next chunk
+                if not self.fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and isinstance(value, (int, float)) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+    # Read the start of an object and yield the key of each member. The caller must read the value of each
+    # member before asking for the next key.
+    def members(self):
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.peek() == ',':
+                self.pos += 1
+            else:
+                self.expect('}')
+                return
+
+
+    # Read an array, yielding each item.
+    def elements(self):
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ',':
+                self.pos += 1
+            else:
+                self.expect(']')
+                return
@@ -0,0 +1,291 @@
+#-----------------------------------------------------------------
+#    pycscrape: Python library for gathering information from C source files.
+#    Copyright (C) 2017  Mike Morgan  (mikemorgan@blueyonder.co.uk)
+#
+#    This library is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this library.  If not, see <http://www.gnu.org/licenses/>.
+#-----------------------------------------------------------------
+#
+#  Layout of structs and unions: the offset of each member and a flat table of all the fields of a type
+#-----------------------------------------------------------------
+
+
+# Round value up to a multiple of alignment
+def round_up(value, alignment):
+    return ((value + alignment - 1) // alignment) * alignment
+
+
+# A field of a Layout. All offsets and sizes are in bits.
+#   path        - Name of the member e.g. 'a.b.c'. The members of a struct (or union) held in an array are listed
+#                 once, for the first item of the array. '' for a type which is not a struct (e.g. 'int').
+#   offset      - Bit offset of the field from the start of the type
+#   size        - Bit size of the field (all of the items if the field is an array)
+#   type_name   - Name of the type e.g. 'unsigned short' or 'my_struct_t'
+#   array       - Array of sizes. e.g. 'int x[5][6];' would be (5, 6)
+#   ptr         - Number of ptr specifiers. E.g. 'int**' would be 2.
+#   bit_field   - True if the field is a bit field e.g. 'unsigned x:3;'
+#   unit_offset - Bit offset of the storage unit holding the field (the item of the array for arrays)
+#   unit_size   - Bit size of the storage unit. For a bit field this is the size of its type.
+#   shift       - Value is (unit & mask) >> shift, where unit is the storage unit read as an unsigned integer
+#   mask        - See shift. None for a struct or union, as it does not have a single value.
+#   signed      - True for a bit field of a signed type, whose value extract() sign extends
+class LayoutField():
+    __slots__ = ('path', 'offset', 'size', 'type_name', 'array', 'ptr', 'bit_field', 'unit_offset', 'unit_size',
+                 'shift', 'mask', 'signed')
+
+    def __init__(self, path, offset, size, type_name, array=(), ptr=0, bit_field=False, unit_offset=None,
+                 unit_size=None, shift=0, mask=None, signed=False):
+        self.path        = path
+        self.offset      = offset
+        self.size        = size
+        self.type_name   = type_name
+        self.array       = tuple(array)
+        self.ptr         = ptr
+        self.bit_field   = bit_field
+        self.unit_offset = offset if unit_offset == None else unit_offset
+        self.unit_size   = self.item_size() if unit_size == None else unit_size
+        self.shift       = shift
+        self.mask        = mask
+        self.signed      = signed
+
+    # Return the number of items of an array (1 if the field is not an array)
+    def count(self):
+        count = 1
+        for i in self.array:
+            count *= i
+        return count
+
+    # Return the bit size of one item of an array (the size of the field if it is not an array)
+    def item_size(self):
+        count = self.count()
+        if count == 0:
+            return 0
+        return self.size // count
+
+    # Return the value of the field from its storage unit, read as an unsigned integer. unit may be a NumPy array
+    # of units, in which case an array of values is returned.
+    def extract(self, unit):
+        value = (unit & self.mask) >> self.shift
+        if not self.signed:
+            return value
+        if hasattr(value, 'astype'):
+            value = value.astype('int64')     # An array of unsigned units
+        sign = 1 << (self.size - 1)
+        return (value ^ sign) - sign
+
+    # Return a copy of the field for a type which holds it as the member prefix at the bit offset given
+    def moved(self, prefix, offset):
+        field = LayoutField.__new__(LayoutField)
+        for slot in LayoutField.__slots__:
+            setattr(field, slot, getattr(self, slot))
+        field.path = prefix + self.path
+        field.offset += offset
+        field.unit_offset += offset
+        return field
+
+    def __repr__(self):
+        return ('LayoutField(%r, offset=%d, size=%d, type_name=%r, array=%r, ptr=%d, bit_field=%r, shift=%d, '
+                'mask=%r, signed=%r)') % (self.path, self.offset, self.size, self.type_name, self.array, self.ptr,
+                                          self.bit_field, self.shift, self.mask, self.signed)
+
+
+# The layout of a type. fields lists every field (members of members included) in the order they are declared.
+# members is a dict of the same fields, whose key is the path.
+class Layout():
+    __slots__ = ('type_name', 'size', 'alignment', 'fields', 'members')
+
+    def __init__(self, type_name, size, alignment):
+        self.type_name = type_name
+        self.size      = size
+        self.alignment = alignment
+        self.fields    = []
+        self.members   = dict()
+
+    def add(self, field):
+        self.fields.append(field)
+        if not field.path in self.members:
+            self.members[field.path] = field
+
+    # Return the LayoutField of the member with the given path e.g. 'a.b.c'
+    def member(self, path):
+        try:
+            return self.members[path]
+        except KeyError:
+            raise Exception("Unknown member '%s' of type '%s'" % (path, self.type_name))
+
+    def __repr__(self):
+        return 'Layout(%r, size=%d, alignment=%d, fields=%d)' % (self.type_name, self.size, self.alignment,
+                                                                 len(self.fields))
+
+
+# Works out the offset of the members of structs and unions (see place()) and builds the Layout of a type (see
+# layout()). The sizes and alignments come from the CScrape object, so they follow its configuration
+# (e.g. config_arm32()).
+#
+# Layouts are kept once built, so the layout of a type is only worked out once however many times (e.g. for
+# each item of a large array of structs) it is asked for. The layouts are dropped when the configuration
+# changes (see reset()) or CScrape.typedefs is replaced.
+class LayoutEngine():
+    def __init__(self, scrape):
+        self.scrape  = scrape
+        self.layouts = dict()   # Key is the type name
+        self.abi     = None     # The settings the layouts were built with. See settings()
+        self.builds  = 0        # Number of layouts built
+
+
+    # Drop all layouts
+    def reset(self):
+        self.layouts.clear()
+        self.abi = None
+
+
+    # Return the settings of the CScrape object which affect layouts
+    def settings(self):
+        scrape = self.scrape
+        return (scrape.POINTER_SIZE, scrape.STRUCT_ALIGNMENT, scrape.DEFAULT_ALIGNMENT, scrape.DEFAULT_CHAR_SIGN,
+                scrape.ENUM_TYPE, scrape.endian, id(scrape.types), id(scrape.typedefs))
+
+
+    # Set the offset of each element of a struct (or union) and return (size, alignment) of the struct.
+    # elements - list of typedef elements (see CScrape.handle_typedef()) with 'size' and 'alignment' set.
+    #            Bit fields have 'bit_field' set to True and 'size' is the width of the field.
+    #
+    # Members are placed at the next offset which is a multiple of their alignment. A bit field is placed
+    # straight after the previous member unless it would cross a boundary of its type (e.g. 32 bits for an
+    # 'unsigned int'), in which case it starts at the next boundary. A bit field of width zero moves the next
+    # member to the next boundary. Unnamed bit fields do not change the alignment of the struct.
+    # All members of a union are at offset 0.
+    # The alignment of a struct is at least STRUCT_ALIGNMENT and its size is a multiple of its alignment.
+    def place(self, elements, union=False):
+        scrape = self.scrape
+        offset = 0
+        size = 0
+        alignment = 1
+        for element in elements:
+            if element.get('bit_field'):
+                unit = scrape.type_size(element['type_name'])
+                width = element['size']
+                if width == 0 or offset // unit != (offset + width - 1) // unit:
+                    offset = round_up(offset, unit)
+                if element['var_name'] != None and element['alignment'] > alignment:
+                    alignment = element['alignment']
+            else:
+                offset = round_up(offset, element['alignment'])
+                if element['alignment'] > alignment:
+                    alignment = element['alignment']
+            if union:
+                element['offset'] = 0
+                size = max(size, element['size'])
+                offset = 0
+            else:
+                element['offset'] = offset
+                offset += element['size']
+                size = offset
+        if alignment < scrape.STRUCT_ALIGNMENT:
+            alignment = scrape.STRUCT_ALIGNMENT
+        return round_up(size, alignment), alignment
+
+
+    # Return the Layout of the type with the given name (e.g. 'my_struct_t' or 'unsigned int')
+    def layout(self, type_name):
+        abi = self.settings()
+        if abi != self.abi:
+            self.layouts.clear()
+            self.abi = abi
+        layout = self.layouts.get(type_name)
+        if layout == None:
+            layout = self.build(type_name)
+            self.layouts[type_name] = layout
+        return layout
+
+
+    # Build the Layout of a type
+    def build(self, type_name):
+        scrape = self.scrape
+        self.builds += 1
+        layout = Layout(type_name, scrape.type_size(type_name), scrape.type_alignment(type_name))
+        typedef = scrape.typedefs.get(type_name)
+        elements = None
+        if typedef != None:
+            elements = typedef.get('types')
+        if elements and elements[0].get('typedef_type') == 'simple':
+            # e.g. 'typedef my_struct_t other_t;'. The layout is the same as the type it is a name for.
+            for field in self.layout(elements[0]['type_name']).fields:
+                layout.add(field)
+        elif elements != None and typedef.get('size') != None and (len(elements) != 0 or typedef['size'] != 0):
+            self.add_elements(layout, elements, '', 0)
+        else:
+            layout.add(self.field('', 0, layout.size, type_name, (), 0, False))
+        return layout
+
+
+    # Add the fields of the elements of a struct (or union) at bit offset base to layout
+    def add_elements(self, layout, elements, prefix, base):
+        for element in elements:
+            name = element['var_name']
+            members = element.get('types')
+            if name == None and members == None:
+                continue     # An unnamed bit field
+            offset = base + element['offset']
+            ptr = element['ptr'] or 0
+            if name == None:
+                # An anonymous struct or union. Its members are members of this struct.
+                self.add_elements(layout, members, prefix, offset)
+                continue
+            path = prefix + name
+            if element.get('bit_field'):
+                layout.add(self.bit_field(path, offset, element))
+                continue
+            if ptr == 0 and members != None:
+                layout.add(LayoutField(path, offset, element['size'], element['type_name'], element['array'], ptr))
+                self.add_elements(layout, members, path + '.', offset)
+            elif ptr == 0 and element['type_name'] in self.scrape.typedefs:
+                member_layout = self.layout(element['type_name'])
+                if len(member_layout.fields) == 1 and member_layout.fields[0].path == '':
+                    # e.g. 'typedef unsigned int uint;'
+                    layout.add(self.field(path, offset, element['size'], element['type_name'], element['array'],
+                                          ptr, True))
+                else:
+                    layout.add(LayoutField(path, offset, element['size'], element['type_name'], element['array'],
+                                           ptr))
+                    for field in member_layout.fields:
+                        layout.add(field.moved(path + '.', offset))
+            else:
+                layout.add(self.field(path, offset, element['size'], element['type_name'], element['array'], ptr,
+                                      True))
+
+
+    # Return a LayoutField for a value which is not a bit field
+    def field(self, path, offset, size, type_name, array, ptr, scalar):
+        field = LayoutField(path, offset, size, type_name, array, ptr)
+        if scalar:
+            field.mask = (1 << field.unit_size) - 1
+        return field
+
+
+    # Return a LayoutField for a bit field element at bit offset 'offset'. The storage unit is the naturally
+    # aligned unit of the field's type holding it. The bits are numbered from the least significant bit of
+    # the unit for little endian and from the most significant bit for big endian. As for decode(), fields of
+    # signed types are sign extended by extract().
+    def bit_field(self, path, offset, element):
+        unit_size = self.scrape.type_size(element['type_name'])
+        position = element['offset'] % unit_size
+        width = element['size']
+        if self.scrape.endian == 'big':
+            shift = unit_size - position - width
+        else:
+            shift = position
+        type_name = self.scrape.evaluator.value_type(element['type_name'])
+        signed = self.scrape.types[type_name]['signed'] and type_name not in ('bool', '_Bool') and width != 0
+        return LayoutField(path, offset, width, element['type_name'], (), 0, True, offset - position, unit_size,
+                           shift, ((1 << width) - 1) << shift, signed)
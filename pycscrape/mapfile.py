@@ -0,0 +1,284 @@
+#-----------------------------------------------------------------
+#    pycscrape: Python library for gathering information from C source files.
+#    Copyright (C) 2017  Mike Morgan  (mikemorgan@blueyonder.co.uk)
+#
+#    This library is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this library.  If not, see <http://www.gnu.org/licenses/>.
+#-----------------------------------------------------------------
+#
+#  Finding the format of a map file (or equivalent) and reading the symbols of GNU ld and Keil armlink map
+#  files a line at a time. See CScrape.parse_output()
+#-----------------------------------------------------------------
+
+import io
+import itertools
+import re
+
+from . import elf
+
+SNIFF_SIZE = 4096      # Number of bytes read from the start of a file to find its format
+
+# The first line of each part of a GNU ld map file. A map file starts with one of these.
+GNU_LD_HEADINGS = (b'Archive member included', b'Allocating common symbols', b'Discarded input sections',
+                   b'Memory Configuration', b'Linker script and memory map')
+
+_READELF = re.compile(rb"^(ELF Header:|File: |Symbol table '.*' contains [0-9]* entries:)", re.MULTILINE)
+_ARMLINK = re.compile(rb"Tool: armlink|^\s*Image Symbol Table\s*$|^\s*Memory Map of the image\s*$", re.MULTILINE)
+
+# Input sections of GNU ld which hold functions or variables. An input section of one function or variable
+# (gcc -ffunction-sections -fdata-sections) is called e.g. '.text.main' or '.bss.my_static_function_var.4270'.
+_CODE_SECTION = re.compile(r'^\.text($|\.)')
+_DATA_SECTION = re.compile(r'^(\.(data|bss|rodata|sdata|sbss|sdata2|sbss2|tdata|tbss)($|\.)|COMMON$)')
+_ONE_SYMBOL   = re.compile(r'^\.[a-z0-9]+\.([A-Za-z_][A-Za-z0-9_]*)(\.[0-9]+)?$')
+# Sections made by gcc for string literals, constants and relocated data rather than a variable
+_POOLS        = re.compile(r'^(str[0-9]+|cst[0-9]+|rel)$')
+
+
+# Return the format of a map file (or equivalent) from its first bytes (see SNIFF_SIZE), or None if the format
+# is not known. The formats are
+#   'elf'     - An ELF file (e.g. results.elf). See elf.iter_symbols()
+#   'readelf' - The output of readelf (e.g. 'readelf --all' or 'readelf -s'). See readelf.iter_symbols()
+#   'gnu_ld'  - A GNU ld map file (e.g. from 'ld -Map=results.map'). See gnu_ld_symbols()
+#   'armlink' - A Keil armlink map file (e.g. from 'armlink --map --symbols'). See armlink_symbols()
+def sniff(head):
+    if head[0:4] == elf.ELF_MAGIC:
+        return 'elf'
+    if _READELF.search(head):
+        return 'readelf'
+    if _ARMLINK.search(head):
+        return 'armlink'
+    if head.lstrip().startswith(GNU_LD_HEADINGS) or head.find(b'\nLinker script and memory map') != -1:
+        return 'gnu_ld'
+    return None
+
+
+# Return (format, source) of a map file (or equivalent), where format is found by sniff(). filename may be a
+# file object opened in text or binary mode, such as a pipe. Its first bytes have then been read, so source
+# is an iterable of all of its lines (or the bytes of an ELF file) to give to the parser instead.
+def identify(filename):
+    if isinstance(filename, str):
+        with open(filename, 'rb') as f:
+            return sniff(f.read(SNIFF_SIZE)), filename
+    head = filename.read(SNIFF_SIZE)
+    binary = isinstance(head, bytes)
+    kind = sniff(head if binary else head.encode('utf8'))
+    if kind == 'elf':
+        return kind, head + filename.read()
+    # Finish the last line of the head, so the lines after it are read straight from the file
+    head += filename.readline()
+    return kind, itertools.chain(io.BytesIO(head) if binary else io.StringIO(head), filename)
+
+
+# Return the lines of a map file as str. source is a filename, a file object opened in text or binary (UTF-8)
+# mode, or any iterable of lines. Lines are read when needed, so memory use does not depend on the size of the
+# file.
+def text_lines(source):
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            for line in f:
+                yield line.decode('utf8')
+        return
+    for line in source:
+        yield line.decode('utf8') if isinstance(line, bytes) else line
+
+
+# Return the C source file of an object file named in a map file e.g. 'build/main.o' or 'lib/libx.a(main.o)'
+# gives 'main.c'. The map file only names the object files, so the source is assumed to be a C file of the
+# same name.
+def source_name(object_file):
+    if object_file.endswith(')') and object_file.find('(') != -1:
+        object_file = object_file[object_file.rindex('(') + 1:-1]     # A member of an archive
+    name = re.split(r'[\\/]', object_file)[-1]
+    for extension in ('.o', '.obj'):
+        if name.endswith(extension):
+            return name[:-len(extension)] + '.c'
+    return name
+
+
+# Yield ('var', data) or ('func', data) for the symbols of the memory map of a GNU ld map file, in the format
+# of CScrape.map_var_data or CScrape.map_func_data. The file is read a line at a time.
+#
+# The memory map lists each input section (the part of an output section from one object file) with its
+# address, size and object file, followed by the GLOBAL symbols in it. E.g.
+#   .text           0x0000000000401000       0x62
+#    .text.main     0x0000000000401000       0x34 build/main.o
+#                   0x0000000000401000                main
+#    .data.calls.1  0x0000000000403008        0x4 build/main.o
+#    COMMON         0x0000000000403040      0x10a build/main.o
+#                   0x0000000000403040                recs
+# Symbols in '.text' sections are functions and those in data sections (.data, .bss, .rodata, COMMON ...) are
+# variables. The map has no sizes for symbols, so the size is only known for a symbol with an input section of
+# its own (gcc -ffunction-sections -fdata-sections), or a COMMON symbol (listed under 'Allocating common
+# symbols'). Otherwise it is None.
+#
+# STATIC functions and variables are not listed as symbols, but those with an input section of their own
+# (e.g. '.data.calls.1') are found from the section name, with the file of the object file (see source_name()).
+# The function of a static variable of a function is not known. An exception is raised if the file has no
+# memory map.
+#   source - Filename, file object (text or binary) or iterable of lines. See text_lines()
+#   name   - Name of the file used in the exception. Defaults to the filename.
+def gnu_ld_symbols(source, name=None):
+    if name == None:
+        name = source if isinstance(source, str) else getattr(source, 'name', 'GNU ld map file')
+    lines = text_lines(source)
+    common = dict()       # Size of each COMMON symbol
+    found = False
+    for line in lines:
+        if line.startswith('Allocating common symbols'):
+            read_common_sizes(lines, common)
+        elif line.startswith('Linker script and memory map'):
+            found = True
+            break
+    if not found:
+        raise Exception("No memory map found in %s" % name)
+    section = None        # [input section name, address, size, object file, symbols] of the current section
+    for line in lines:
+        if line.startswith('Cross Reference Table'):
+            break
+        parts = line.split()
+        if len(parts) == 0:
+            continue
+        if line[0] != ' ' or (line[1] != ' ' and line[1] != '*'):
+            # An output section, or another top level line (e.g. 'LOAD main.o'), or an input section
+            if section != None:
+                yield from section_symbols(section, common)
+                section = None
+            if line[0] == ' ':
+                section = [parts[0], None, None, None, []]
+                if len(parts) >= 3:
+                    section[1:4] = int(parts[1], 16), int(parts[2], 16), ' '.join(parts[3:])
+        elif line[1] == '*':
+            continue      # A pattern of the linker script (e.g. ' *(.text)') or ' *fill*'
+        elif section != None and parts[0].startswith('0x'):
+            if section[1] == None and len(parts) >= 2 and parts[1].startswith('0x'):
+                # The address of an input section with a long name, which is on a line of its own
+                section[1:4] = int(parts[0], 16), int(parts[1], 16), ' '.join(parts[2:])
+            elif len(parts) == 2 and not parts[1].startswith(('0x', '(')):
+                section[4].append((parts[1], int(parts[0], 16)))
+    if section != None:
+        yield from section_symbols(section, common)
+
+
+# Read the table of sizes of COMMON symbols under the heading 'Allocating common symbols' of a GNU ld map file
+# into common. E.g.
+#   Common symbol       size              file
+#
+#   recs                0x90              build/main.o
+#   a_very_long_common_symbol_name
+#                       0x4               build/main.o
+def read_common_sizes(lines, common):
+    symbol = None
+    started = False
+    for line in lines:
+        parts = line.split()
+        if len(parts) == 0:
+            if started:
+                return
+            continue
+        if parts[0] == 'Common' and not started:
+            continue      # The headings
+        started = True
+        if len(parts) == 1:
+            symbol = parts[0]
+        elif parts[0].startswith('0x') and symbol != None:
+            common[symbol] = int(parts[0], 16)
+            symbol = None
+        elif parts[1].startswith('0x'):
+            common[parts[0]] = int(parts[1], 16)
+
+
+# Yield the ('var', data) or ('func', data) of the symbols of an input section of a GNU ld map file. See
+# gnu_ld_symbols()
+def section_symbols(section, common):
+    section_name, addr, size, object_file, symbols = section
+    if addr == None:
+        return
+    if _CODE_SECTION.match(section_name):
+        kind = 'func'
+    elif _DATA_SECTION.match(section_name):
+        kind = 'var'
+    else:
+        return
+    match = _ONE_SYMBOL.match(section_name)
+    if len(symbols) == 0:
+        if match != None and size != 0 and not _POOLS.match(match.group(1)):
+            # A STATIC function or variable with an input section of its own
+            yield kind, { 'name': match.group(1), 'addr': addr, 'size': size, 'file': source_name(object_file),
+                          'func': None }
+        return
+    for symbol, symbol_addr in symbols:
+        if section_name == 'COMMON':
+            symbol_size = common.get(symbol)
+        elif match != None and match.group(1) == symbol and len(symbols) == 1:
+            symbol_size = size
+        else:
+            symbol_size = None
+        yield kind, { 'name': symbol, 'addr': symbol_addr, 'size': symbol_size, 'file': None, 'func': None }
+
+
+# Yield ('var', data) or ('func', data) for the symbols of the image symbol table of a Keil armlink map file
+# (armlink --map --symbols), in the format of CScrape.map_var_data or CScrape.map_func_data. The file is read
+# a line at a time. E.g.
+#   Image Symbol Table
+#
+#       Local Symbols
+#
+#       Symbol Name                              Value     Ov Type        Size  Object(Section)
+#
+#       calls                                    0x20000000   Data           4  main.o(.data)
+#
+#       Global Symbols
+#
+#       Symbol Name                              Value     Ov Type        Size  Object(Section)
+#
+#       main                                     0x08000111   Thumb Code    40  main.o(i.main)
+#       counter                                  0x20000004   Data           4  main.o(.data)
+# Symbols of type 'ARM Code' or 'Thumb Code' are functions and those of type 'Data' are variables. The others
+# (e.g. 'Section' and 'Number') are skipped. As for an ELF file, the address of a Thumb function has bit 0 set.
+# Local symbols have the file of their object file (see source_name()). An exception is raised if the file has
+# no image symbol table.
+#   source - Filename, file object (text or binary) or iterable of lines. See text_lines()
+#   name   - Name of the file used in the exception. Defaults to the filename.
+def armlink_symbols(source, name=None):
+    if name == None:
+        name = source if isinstance(source, str) else getattr(source, 'name', 'armlink map file')
+    lines = text_lines(source)
+    found = False
+    for line in lines:
+        if line.strip() == 'Image Symbol Table':
+            found = True
+            break
+    if not found:
+        raise Exception("No image symbol table found in %s (armlink --symbols is needed)" % name)
+    local = True
+    for line in lines:
+        parts = line.split()
+        if len(parts) == 0:
+            continue
+        if parts[0].startswith('====='):
+            break         # The end of the table
+        if len(parts) == 2 and parts[1] == 'Symbols':
+            local = parts[0] == 'Local'
+            continue
+        # 'main  0x08000111   Thumb Code    40  main.o(i.main)'. The type may be more than one word.
+        if len(parts) < 5 or not parts[1].startswith('0x') or not parts[-2].isdigit():
+            continue
+        kind = parts[-3]
+        if kind != 'Code' and kind != 'Data':
+            continue
+        object_file = parts[-1]
+        if object_file.find('(') != -1:
+            object_file = object_file[:object_file.index('(')]
+        data = { 'name': parts[0], 'addr': int(parts[1], 16), 'size': int(parts[-2]),
+                 'file': source_name(object_file) if local else None, 'func': None }
+        yield ('func' if kind == 'Code' else 'var'), data
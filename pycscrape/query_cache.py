@@ -0,0 +1,107 @@
+#-----------------------------------------------------------------
+#    pycscrape: Python library for gathering information from C source files.
+#    Copyright (C) 2017  Mike Morgan  (mikemorgan@blueyonder.co.uk)
+#
+#    This library is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this library.  If not, see <http://www.gnu.org/licenses/>.
+#-----------------------------------------------------------------
+#
+#  Cache of the results of CScrape.var(), enum() and enum_type() queries
+#-----------------------------------------------------------------
+
+import collections
+
+from .records import copy_value
+
+
+# Holds the results of up to max_entries queries. The least recently used result is dropped when the cache is
+# full. Results are copied in and out of the cache, so the caller can not change a cached result (or the record
+# it came from).
+#
+# The cache is emptied and the generation advanced by invalidate(), which is called whenever the data being
+# queried changes. check() does the same if the given signature of the data differs from the last one seen,
+# so changes made directly to the data (e.g. appending to CScrape.map_var_data) are also noticed.
+class QueryCache():
+    def __init__(self, max_entries=4096):
+        self.max_entries   = max_entries
+        self.entries       = collections.OrderedDict()  # Key is the query string. Oldest first.
+        self.generation    = 0      # Advanced each time the cache is invalidated
+        self.signature     = None   # Signature of the data when the entries were cached. See check()
+        self.hits          = 0
+        self.misses        = 0
+        self.evictions     = 0
+        self.invalidations = 0
+
+
+    # Drop all cached results because the data has changed
+    def invalidate(self):
+        self.entries.clear()
+        self.generation += 1
+        self.invalidations += 1
+
+
+    # Invalidate the cache if signature is not the same as the one given in the previous call
+    def check(self, signature):
+        if signature != self.signature:
+            if self.signature != None:
+                self.invalidate()
+            self.signature = signature
+
+
+    # Return a copy of the result cached for query or None if there is none
+    def get(self, query):
+        try:
+            value = self.entries[query]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(query)
+        self.hits += 1
+        return copy_value(value)
+
+
+    # Cache a copy of the result of query, dropping the least recently used result if the cache is full
+    def put(self, query, value):
+        if self.max_entries <= 0:
+            return
+        self.entries[query] = copy_value(value)
+        self.entries.move_to_end(query)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+
+    # Change the maximum number of cached results
+    def resize(self, max_entries):
+        self.max_entries = max_entries
+        while len(self.entries) > max(max_entries, 0):
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+
+    # Return a dict of the cache counters
+    def stats(self):
+        return { 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                 'invalidations': self.invalidations, 'generation': self.generation,
+                 'entries': len(self.entries), 'max_entries': self.max_entries }
+
+
+    # Return a one line summary of the cache counters
+    def report(self):
+        lookups = self.hits + self.misses
+        hit_rate = 0.0
+        if lookups != 0:
+            hit_rate = 100.0 * self.hits / lookups
+        return 'Query cache: %d hits, %d misses (%.1f%% hit rate), %d evictions, %d invalidations, %d/%d entries' % (
+                self.hits, self.misses, hit_rate, self.evictions, self.invalidations, len(self.entries),
+                self.max_entries)
@@ -0,0 +1,99 @@
+#-----------------------------------------------------------------
+#    pycscrape: Python library for gathering information from C source files.
+#    Copyright (C) 2017  Mike Morgan  (mikemorgan@blueyonder.co.uk)
+#
+#    This library is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this library.  If not, see <http://www.gnu.org/licenses/>.
+#-----------------------------------------------------------------
+#
+#  Reading the symbol tables of the output of readelf a line at a time. See CScrape.parse_readelf_output()
+#-----------------------------------------------------------------
+
+import itertools
+import re
+
+_SYMBOL_TABLE = re.compile(r"^Symbol table '.*' contains [0-9]* entries:$")
+
+
+# Yield ('var', data) or ('func', data) for each OBJECT or FUNC symbol of the symbol tables in the output of
+# readelf (e.g. 'readelf --all' or 'readelf -s'). data is a dict in the format of CScrape.map_var_data or
+# CScrape.map_func_data. Lines outside the symbol tables are skipped without being decoded or kept, so memory
+# use does not depend on the size of the output.
+#
+# A symbol table starts with the line "Symbol table '<name>' contains <number> entries:" followed by a line
+# of headings, and ends at a blank line. LOCAL symbols belong to the file of the FILE symbol before them.
+# An exception is raised once the output has been read if it has no symbol table.
+#   source - Filename, or file object opened in text or binary (UTF-8) mode. The file may be a pipe e.g. the
+#            stdout of 'readelf -s'. Any iterable of lines may be given.
+#   name   - Name of the output used in the exception. Defaults to the filename.
+def iter_symbols(source, name=None):
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            for symbol in iter_symbols(f, name or source):
+                yield symbol
+        return
+    if name == None:
+        name = getattr(source, 'name', 'readelf output')
+    lines = iter(source)
+    first = next(lines, '')
+    binary = isinstance(first, bytes)
+    prefix = b'Symbol table ' if binary else 'Symbol table '
+    found = False
+    file = None
+    for line in itertools.chain((first,), lines):
+        if not line.startswith(prefix):
+            continue
+        if binary:
+            line = line.decode('utf8')
+        if not _SYMBOL_TABLE.match(line.rstrip('\r\n')):
+            continue
+        found = True
+        # Skip the headings. Typically 'Num:    Value  Size Type    Bind   Vis      Ndx Name'
+        next(lines, None)
+        for line in lines:
+            if binary:
+                line = line.decode('utf8')
+            # '    33: 00010010    52 FUNC    GLOBAL DEFAULT    2 c_put'
+            #   [0] Symbol ID - ignore
+            #   [1] Symbol address (hex)
+            #   [2] Symbol size (decimal, or hex starting with '0x' for large sizes)
+            #   [3] Symbol type (string)  'FILE', 'FUNC', 'OBJECT'
+            #   [4] Symbol scope 'LOCAL', 'GLOBAL'
+            #   [5] 'Vis' ? - Ignore
+            #   [6] 'Ndx' ? - Ignore
+            #   [7] Symbol name. Note: Static function variables may have .<number> appended.
+            parts = line.split()
+            if len(parts) == 0:
+                break      # The blank line after the table
+            if len(parts) < 8:
+                if len(parts) > 3 and parts[3] == 'FILE':
+                    file = None    # A FILE symbol with no name ends the symbols of the previous file
+                continue
+            kind = parts[3]
+            if kind == 'FILE':
+                file = parts[7]
+            elif kind == 'FUNC' or kind == 'OBJECT':
+                symbol = parts[7]
+                if kind == 'OBJECT' and symbol.find('.') != -1:
+                    # If the name is NAME.1234, remove the .1234
+                    symbol = symbol[:symbol.find('.')]
+                data = dict()
+                data['name'] = symbol
+                data['addr'] = int(parts[1], base=16)
+                size = parts[2]
+                data['size'] = int(size, base=16) if size.startswith('0x') else int(size, base=10)
+                data['file'] = file if parts[4] == 'LOCAL' else None
+                data['func'] = None  # We can not work out the function from this data
+                yield ('func' if kind == 'FUNC' else 'var'), data
+    if not found:
+        raise Exception("No symbol table found in %s" % name)
@@ -0,0 +1,88 @@
+#-----------------------------------------------------------------
+#    pycscrape: Python library for gathering information from C source files.
+#    Copyright (C) 2017  Mike Morgan  (mikemorgan@blueyonder.co.uk)
+#
+#    This library is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this library.  If not, see <http://www.gnu.org/licenses/>.
+#-----------------------------------------------------------------
+#
+#  Hash indexes over a list of records (e.g. CScrape.variables)
+#-----------------------------------------------------------------
+
+
+# Indexes a list of records (dicts) by one or more fields.
+#
+# fields - dict whose key is the index name and value is a function taking a record and returning a tuple
+#          of the keys the record is found under. e.g. an enum is indexed under the name of each of its values.
+#
+# The index is brought up to date when it is searched. Records appended to the list since the last search are
+# added. If the list has been replaced or made shorter, the index is rebuilt. Records changed in place are
+# not noticed - call reset().
+class RecordIndex():
+    def __init__(self, fields):
+        self.fields = fields
+        self.reset()
+
+
+    # Forget all indexed records. The index is rebuilt on the next search.
+    def reset(self):
+        self.records = None
+        self.count   = 0
+        self.indexes = dict()  # Key is the index name. Value is a dict of key -> list of record positions
+        self.keys    = dict()  # Key is the index name. Value is a list of the keys of each record
+        for name in self.fields:
+            self.indexes[name] = dict()
+            self.keys[name]    = []
+
+
+    # Add any records that are not yet indexed
+    def sync(self, records):
+        if records is not self.records or len(records) < self.count:
+            self.reset()
+            self.records = records
+        for position in range(self.count, len(records)):
+            record = records[position]
+            for name in self.fields:
+                keys = self.fields[name](record)
+                self.keys[name].append(keys)
+                index = self.indexes[name]
+                for key in keys:
+                    if key in index:
+                        index[key].append(position)
+                    else:
+                        index[key] = [position]
+        self.count = len(records)
+
+
+    # Return a list of the positions (in order) of the records matching all of the criteria.
+    # criteria - dict whose key is an index name and value is the key to match.
+    # If there are no criteria, all records match.
+    def find(self, records, criteria):
+        self.sync(records)
+        if len(criteria) == 0:
+            return list(range(self.count))
+        # Start with the shortest list of positions and keep those which match the other criteria
+        shortest = None
+        for name in criteria:
+            positions = self.indexes[name].get(criteria[name])
+            if positions == None:
+                return []
+            if shortest == None or len(positions) < len(self.indexes[shortest][criteria[shortest]]):
+                shortest = name
+        positions = self.indexes[shortest][criteria[shortest]]
+        for name in criteria:
+            if name != shortest:
+                key = criteria[name]
+                keys = self.keys[name]
+                positions = [position for position in positions if key in keys[position]]
+        return list(positions)
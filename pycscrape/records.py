@@ -0,0 +1,359 @@
+#-----------------------------------------------------------------
+#    pycscrape: Python library for gathering information from C source files.
+#    Copyright (C) 2017  Mike Morgan  (mikemorgan@blueyonder.co.uk)
+#
+#    This library is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this library.  If not, see <http://www.gnu.org/licenses/>.
+#-----------------------------------------------------------------
+#
+#  Compact records for the functions, variables, enums and typedefs found by CScrape
+#-----------------------------------------------------------------
+
+import builtins
+import collections.abc
+import hashlib
+import sys
+
+
+# Return a copy of a query result or record. Dicts, lists and records are copied, other values (strings,
+# numbers, tuples, exceptions) are shared. This is much faster than copy.deepcopy() for the small records
+# returned by queries.
+def copy_value(value):
+    if type(value) is dict:
+        return { key: copy_value(item) for key, item in value.items() }
+    if type(value) is list:
+        return [copy_value(item) for item in value]
+    if isinstance(value, Record):
+        return value.copy()
+    return value
+
+
+# Return a dict in place of a record for json.dumps(). Use as json.dumps(data, default=json_default)
+# Other read only dicts and lists (e.g. the records of a snapshot) are also converted.
+def json_default(value):
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, collections.abc.Mapping):
+        return dict(value)
+    if isinstance(value, collections.abc.Sequence) and not isinstance(value, (str, bytes)):
+        return list(value)
+    raise TypeError('Object of type %s is not JSON serializable' % value.__class__.__name__)
+
+
+# Return a dict describing an exception, which can be written as JSON. See restore_exception()
+def portable_exception(exception):
+    return { 'error': exception.__class__.__name__, 'message': str(exception) }
+
+
+# Return an exception from a dict returned by portable_exception(). Built in exception classes are restored,
+# other classes (e.g. pycparser's ParseError) become Exception.
+def restore_exception(data):
+    exception_class = getattr(builtins, data['error'], None)
+    if isinstance(exception_class, type) and issubclass(exception_class, Exception):
+        try:
+            return exception_class(data['message'])
+        except Exception:
+            pass
+    return Exception(data['message'])
+
+
+# As json_default() but exceptions are written as portable_exception() dicts
+def portable_default(value):
+    if isinstance(value, BaseException):
+        return portable_exception(value)
+    return json_default(value)
+
+
+# Return a record of the given class (e.g. VariableRecord) from a dict read from JSON. Exceptions written by
+# portable_default() are restored. record_class may be dict for the map data.
+def load_record(record_class, data):
+    if record_class == dict:
+        return data
+    record = record_class.from_dict(data)
+    if isinstance(record.get('exception'), dict):
+        record['exception'] = restore_exception(record['exception'])
+    for element in record.get('types') or ():
+        if isinstance(element.get('exception'), dict):
+            element['exception'] = restore_exception(element['exception'])
+    return record
+
+
+# A record is used like a dict, but only takes the memory of a list of its values. The keys a record usually
+# has are listed in FIELDS and each is stored in a slot. Any other key is stored in a dict (created when needed).
+# Keys are listed in the order of FIELDS, so records print in the same order as the dicts they replace.
+#
+# To save memory, strings for the keys in INTERNED (e.g. filenames and type names) are interned, so all records
+# share one copy. Other values (e.g. 'array' lists) are stored as they are given, as a dict would store them.
+class Record(collections.abc.MutableMapping):
+    __slots__ = ('_extras',)
+    FIELDS   = ()
+    INTERNED = frozenset(('filename', 'function', 'name', 'type', 'type_name', 'var_name', 'enum_name',
+                          'typedef_type'))
+
+    # Build the map of key to slot name of each record class
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.SLOTS = { field: '_' + field for field in cls.FIELDS }
+        cls.SLOT_NAMES = tuple(cls.SLOTS.values())
+
+    def __init__(self, data=None):
+        self._extras = None
+        if data != None:
+            for key in data:
+                self[key] = data[key]
+
+    # Return a record of this class holding the given dict. Records or dicts inside it are converted too.
+    # Used to turn the dicts read by CScrape.json_load() back into records.
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data)
+
+    def __getitem__(self, key):
+        slot = self.SLOTS.get(key)
+        if slot != None:
+            try:
+                return getattr(self, slot)
+            except AttributeError:
+                raise KeyError(key)
+        if self._extras != None:
+            return self._extras[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        slot = self.SLOTS.get(key)
+        if slot != None:
+            if type(value) is str and key in Record.INTERNED:
+                value = sys.intern(value)
+            setattr(self, slot, value)
+        else:
+            if self._extras == None:
+                self._extras = dict()
+            self._extras[key] = value
+
+    def __delitem__(self, key):
+        slot = self.SLOTS.get(key)
+        if slot != None:
+            try:
+                delattr(self, slot)
+            except AttributeError:
+                raise KeyError(key)
+        elif self._extras != None:
+            del self._extras[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        slot = self.SLOTS.get(key)
+        if slot != None:
+            return hasattr(self, slot)
+        return self._extras != None and key in self._extras
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __iter__(self):
+        for field in self.FIELDS:
+            if hasattr(self, self.SLOTS[field]):
+                yield field
+        if self._extras != None:
+            for key in self._extras:
+                yield key
+
+    def __len__(self):
+        count = 0
+        for field in self.FIELDS:
+            if hasattr(self, self.SLOTS[field]):
+                count += 1
+        if self._extras != None:
+            count += len(self._extras)
+        return count
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    # Return a dict of the keys and values of the record (the values are not copied)
+    def to_dict(self):
+        data = dict()
+        for field, slot in self.SLOTS.items():
+            try:
+                data[field] = getattr(self, slot)
+            except AttributeError:
+                pass
+        if self._extras != None:
+            data.update(self._extras)
+        return data
+
+    # Return a copy of the record. Dicts, lists and records held by the record are copied too.
+    def copy(self):
+        record = self.__class__.__new__(self.__class__)
+        record._extras = None
+        for slot in self.SLOT_NAMES:
+            try:
+                value = getattr(self, slot)
+            except AttributeError:
+                continue
+            if type(value) in (dict, list) or isinstance(value, Record):
+                value = copy_value(value)
+            setattr(record, slot, value)
+        if self._extras != None:
+            record._extras = copy_value(self._extras)
+        return record
+
+    # Records are pickled (e.g. by the scrape cache) as a list of (key, value) pairs. Setting them again when
+    # the record is loaded interns the strings again.
+    def __getstate__(self):
+        return list(self.items())
+
+    def __setstate__(self, state):
+        self._extras = None
+        for key, value in state:
+            self[key] = value
+
+
+# An item of CScrape.variables. See CScrape.__init__() for the keys.
+class VariableRecord(Record):
+    FIELDS = ('name', 'filename', 'line_number', 'line', 'exception', 'type', 'enum_name', 'ptr', 'function',
+              'array', 'size', 'addr')
+    __slots__ = tuple('_' + field for field in FIELDS)
+
+
+# An item of CScrape.functions. 'params' is a list of dicts.
+class FunctionRecord(Record):
+    FIELDS = ('name', 'filename', 'line_number', 'exception', 'line', 'type', 'ptr', 'params')
+    __slots__ = tuple('_' + field for field in FIELDS)
+
+
+# A value of an enum. See EnumRecord. Note: 'line_mumber' is the spelling used by CScrape.handle_enum().
+class EnumValueRecord(Record):
+    FIELDS = ('line_mumber', 'line', 'value')
+    __slots__ = tuple('_' + field for field in FIELDS)
+
+
+# An item of CScrape.enums. 'values' is a dict of EnumValueRecord objects.
+class EnumRecord(Record):
+    FIELDS = ('filename', 'line_number', 'function', 'name', 'exception', 'values')
+    __slots__ = tuple('_' + field for field in FIELDS)
+
+    @classmethod
+    def from_dict(cls, data):
+        record = cls(data)
+        if 'values' in record:
+            record['values'] = { name: EnumValueRecord.from_dict(value) for name, value in record['values'].items() }
+        return record
+
+
+# An element of a typedef. See TypedefRecord.
+class TypedefElementRecord(Record):
+    FIELDS = ('typedef_type', 'type_name', 'var_name', 'line_number', 'line', 'size', 'array', 'ptr', 'exception',
+              'offset', 'alignment')
+    __slots__ = tuple('_' + field for field in FIELDS)
+
+    # The members of a struct (or union) defined within a struct are held in 'types'
+    @classmethod
+    def from_dict(cls, data):
+        record = cls(data)
+        if record.get('types') != None:
+            record['types'] = [TypedefElementRecord.from_dict(element) for element in record['types']]
+        return record
+
+
+# The keys of a typedef and of each of its elements which describe the structure of the type. Two typedefs
+# with the same values for these keys are the same type, wherever they were declared.
+TYPEDEF_STRUCTURE         = ('size', 'alignment')
+TYPEDEF_ELEMENT_STRUCTURE = ('type_name', 'var_name', 'offset', 'size', 'array', 'ptr', 'bit_field', 'types')
+
+
+# Return the values of the structure keys of a typedef (a TypedefRecord or dict) as a tuple
+def typedef_structure(typedef):
+    elements = []
+    for element in typedef.get('types') or ():
+        values = []
+        for key in TYPEDEF_ELEMENT_STRUCTURE:
+            value = element.get(key)
+            if key == 'types' and value != None:
+                value = typedef_structure({ 'types': value })[-1]   # A struct defined within the struct
+            elif type(value) is list:
+                value = tuple(value)
+            values.append(value)
+        elements.append(tuple(values))
+    return tuple([typedef.get(key) for key in TYPEDEF_STRUCTURE]) + (tuple(elements),)
+
+
+# Return a hash of the structure of a typedef (a TypedefRecord or dict). See TYPEDEF_STRUCTURE
+def typedef_fingerprint(typedef):
+    if isinstance(typedef, TypedefRecord):
+        return typedef.fingerprint()
+    return hashlib.sha1(repr(typedef_structure(typedef)).encode('utf8')).hexdigest()
+
+
+# Return a list of strings describing how the structure of two typedefs differ
+# e.g. ["size 32 != 64", "types[1].type_name 'char' != 'signed int'"]. The values are given as the typedefs
+# hold them e.g. "types[0].array [3] != [2]"
+def typedef_differences(a, b):
+    differences = []
+    for key in TYPEDEF_STRUCTURE:
+        if a.get(key) != b.get(key):
+            differences.append('%s %r != %r' % (key, a.get(key), b.get(key)))
+    return differences + element_differences(a.get('types'), b.get('types'), '')
+
+
+# Return a list of strings describing how two lists of typedef elements differ. See typedef_differences()
+# prefix - Path of the elements e.g. 'types[2].' for the elements of a struct defined within a struct
+def element_differences(a_types, b_types, prefix):
+    if (a_types == None) != (b_types == None):
+        return ['%stypes %r != %r' % (prefix, a_types, b_types)]
+    a_types = a_types or ()
+    b_types = b_types or ()
+    differences = []
+    if len(a_types) != len(b_types):
+        differences.append('%snumber of elements %d != %d' % (prefix, len(a_types), len(b_types)))
+    for n in range(min(len(a_types), len(b_types))):
+        for key in TYPEDEF_ELEMENT_STRUCTURE:
+            a_value = a_types[n].get(key)
+            b_value = b_types[n].get(key)
+            if key == 'types':
+                differences.extend(element_differences(a_value, b_value, '%stypes[%d].' % (prefix, n)))
+            elif (tuple(a_value) if type(a_value) is list else a_value) != \
+                 (tuple(b_value) if type(b_value) is list else b_value):
+                differences.append('%stypes[%d].%s %r != %r' % (prefix, n, key, a_value, b_value))
+    return differences
+
+
+# A value of CScrape.typedefs. 'types' is a list of TypedefElementRecord objects.
+# The fingerprint of the typedef's structure is kept once it has been calculated. See fingerprint()
+class TypedefRecord(Record):
+    FIELDS = ('filename', 'line_number', 'line', 'exception', 'types', 'size', 'alignment')
+    __slots__ = tuple('_' + field for field in FIELDS) + ('_fingerprint',)
+
+    def __setitem__(self, key, value):
+        Record.__setitem__(self, key, value)
+        self._fingerprint = None
+
+    # Return the hash of the structure of the typedef. See typedef_fingerprint(). It is calculated when first
+    # needed and again if a key of the typedef is set. Changes made to the elements are not noticed.
+    def fingerprint(self):
+        fingerprint = getattr(self, '_fingerprint', None)
+        if fingerprint == None:
+            fingerprint = hashlib.sha1(repr(typedef_structure(self)).encode('utf8')).hexdigest()
+            self._fingerprint = fingerprint
+        return fingerprint
+
+    @classmethod
+    def from_dict(cls, data):
+        record = cls(data)
+        if 'types' in record:
+            record['types'] = [TypedefElementRecord.from_dict(element) for element in record['types']]
+        return record
@@ -0,0 +1,151 @@
+#-----------------------------------------------------------------
+#    pycscrape: Python library for gathering information from C source files.
+#    Copyright (C) 2017  Mike Morgan  (mikemorgan@blueyonder.co.uk)
+#
+#    This library is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this library.  If not, see <http://www.gnu.org/licenses/>.
+#-----------------------------------------------------------------
+#
+#  On disk cache of the records found by parsing a C file. See CScrape.set_scrape_cache()
+#-----------------------------------------------------------------
+
+import os
+import pickle
+import tempfile
+
+
+# Each cached parse is stored in its own file '<key>.pickle' in the cache folder. The file modification
+# time is updated on every hit, so the least recently used files are the first to be deleted when the
+# folder grows beyond max_size.
+class ScrapeCache():
+    EXTENSION = '.pickle'
+    FORMAT    = 3         # Changed when the format of the cached data changes
+
+    def __init__(self, folder, max_size=256*1024*1024):
+        self.folder    = os.path.abspath(folder)
+        self.max_size  = max_size   # Maximum number of bytes used by the cache files
+        self.hits      = 0
+        self.misses    = 0
+        self.stores    = 0
+        self.evictions = 0
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+        self.size = self.folder_size()
+
+
+    # Return the total size of the cache files
+    def folder_size(self):
+        size = 0
+        for filename, stat in self.entries():
+            size += stat.st_size
+        return size
+
+
+    # Return a list of (filename, os.stat() result) tuples for each cache file
+    def entries(self):
+        entries = []
+        for name in os.listdir(self.folder):
+            if name.endswith(ScrapeCache.EXTENSION):
+                filename = os.path.join(self.folder, name)
+                try:
+                    entries.append((filename, os.stat(filename)))
+                except OSError:
+                    pass  # Deleted by another process
+        return entries
+
+
+    # Return the data stored with the given key or None if there is none.
+    def get(self, key):
+        filename = os.path.join(self.folder, key + ScrapeCache.EXTENSION)
+        try:
+            with open(filename, 'rb') as f:
+                data = pickle.load(f)
+            os.utime(filename, None)
+        except Exception:
+            # Missing, or damaged by an interrupted write from an older version. Treat as a miss.
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+
+    # Store data with the given key, then delete the least recently used files if the cache is too big.
+    def put(self, key, data):
+        filename = os.path.join(self.folder, key + ScrapeCache.EXTENSION)
+        # Write to a temporary file and rename it, so other processes never see a partial file.
+        handle, temp_filename = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_filename, filename)
+        except Exception:
+            os.remove(temp_filename)
+            raise
+        self.stores += 1
+        self.size += os.path.getsize(filename)
+        if self.size > self.max_size:
+            self.evict()
+
+
+    # Delete the least recently used files until the cache is no bigger than max_size.
+    # The folder is scanned because other processes may be using the same cache.
+    def evict(self):
+        entries = self.entries()
+        entries.sort(key=lambda entry: entry[1].st_mtime)
+        self.size = 0
+        for filename, stat in entries:
+            self.size += stat.st_size
+        for filename, stat in entries:
+            if self.size <= self.max_size:
+                break
+            try:
+                os.remove(filename)
+                self.evictions += 1
+            except OSError:
+                pass  # Deleted by another process
+            self.size -= stat.st_size
+
+
+    # Delete all cache files
+    def clear(self):
+        for filename, stat in self.entries():
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+        self.size = 0
+
+
+    # Add the counts from another ScrapeCache object's stats(). Used to collect the counts from
+    # parse_files() worker processes.
+    def add_stats(self, stats):
+        self.hits      += stats['hits']
+        self.misses    += stats['misses']
+        self.stores    += stats['stores']
+        self.evictions += stats['evictions']
+
+
+    # Return a dict of the cache counters
+    def stats(self):
+        return { 'hits': self.hits, 'misses': self.misses, 'stores': self.stores, 'evictions': self.evictions,
+                 'size': self.size, 'max_size': self.max_size }
+
+
+    # Return a one line summary of the cache counters
+    def report(self):
+        lookups = self.hits + self.misses
+        hit_rate = 0.0
+        if lookups != 0:
+            hit_rate = 100.0 * self.hits / lookups
+        return 'Scrape cache: %d hits, %d misses (%.1f%% hit rate), %d evictions, %d/%d bytes' % (
+                self.hits, self.misses, hit_rate, self.evictions, self.size, self.max_size)
@@ -0,0 +1,425 @@
+#-----------------------------------------------------------------
+#    pycscrape: Python library for gathering information from C source files.
+#    Copyright (C) 2017  Mike Morgan  (mikemorgan@blueyonder.co.uk)
+#
+#    This library is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this library.  If not, see <http://www.gnu.org/licenses/>.
+#-----------------------------------------------------------------
+#
+#  Binary snapshot of a CScrape model, read lazily through mmap. See CScrape.snapshot_dump()
+#-----------------------------------------------------------------
+#
+# File layout (all numbers little endian)
+#   Header          '<8sII'   magic, version, number of sections
+#   Section table   '<32sQQ'  name, file offset, length - for each section
+#   Sections (each starts on an 8 byte boundary)
+#     'strings'               uint32 count, uint32 offsets[count+1], UTF-8 text. Sorted, so a string's id is
+#                             found by a binary search.
+#     'types'                 JSON of CScrape.types
+#     '<table>.records'       uint64 count, uint64 offsets[count+1], then the JSON of each record
+#     '<table>.<column>'      uint32 string id of the column of each record (NONE if None)
+#     '<table>.index.<name>'  uint32 string ids[n] then uint32 record positions[n], sorted by string id
+# The tables are 'functions', 'variables', 'enums', 'typedefs', 'map_var_data' and 'map_func_data'.
+# Exceptions in records are stored as {'error': <class name>, 'message': <text>}.
+
+import array
+import bisect
+import collections.abc
+import json
+import mmap
+import os
+import struct
+import sys
+
+from .records import portable_default, load_record, VariableRecord, FunctionRecord, EnumRecord, TypedefRecord
+
+MAGIC   = b'PYCSNAP\x00'
+VERSION = 1
+NONE    = 0xFFFFFFFF  # String id of None
+
+_HEADER  = struct.Struct('<8sII')
+_SECTION = struct.Struct('<32sQQ')
+
+
+# Return the basename of a filename (None stays None). Filenames are indexed by basename. See CScrape.var()
+def _basename(filename):
+    if filename == None:
+        return None
+    return os.path.basename(filename)
+
+
+# Return the names of the values of an enum record
+def _value_names(record):
+    return tuple(record.get('values') or ())
+
+
+# Description of each table: the class of its records, the columns (key -> function giving the column value
+# of a record) and the indexes (name -> function giving the tuple of keys a record is found under).
+TABLES = (
+    ('functions',     FunctionRecord, { 'name': lambda r: r['name'], 'filename': lambda r: _basename(r['filename']) },
+                                      { 'name': lambda r: (r['name'],) }),
+    ('variables',     VariableRecord, { 'name': lambda r: r['name'], 'filename': lambda r: _basename(r['filename']),
+                                        'function': lambda r: r.get('function'), 'type': lambda r: r.get('type') },
+                                      { 'name': lambda r: (r['name'],) }),
+    ('enums',         EnumRecord,     { 'name': lambda r: r['name'], 'filename': lambda r: _basename(r['filename']),
+                                        'function': lambda r: r.get('function') },
+                                      { 'value': _value_names }),
+    ('typedefs',      TypedefRecord,  { 'name': None },
+                                      { 'name': None }),
+    ('map_var_data',  dict,           { 'name': lambda r: r['name'], 'file': lambda r: _basename(r['file']) },
+                                      { 'name': lambda r: (r['name'],) }),
+    ('map_func_data', dict,           { 'name': lambda r: r['name'], 'file': lambda r: _basename(r['file']) },
+                                      { 'name': lambda r: (r['name'],) }),
+)
+
+
+# Return a uint32 array (or memoryview) of the little endian data
+def _uint32s(data):
+    if sys.byteorder == 'little' and array.array('I').itemsize == 4:
+        return data.cast('I')
+    values = array.array('I')
+    if values.itemsize != 4:
+        values = array.array('L')
+    values.frombytes(data)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+# As _uint32s() but for uint64 data
+def _uint64s(data):
+    if sys.byteorder == 'little':
+        return data.cast('Q')
+    values = array.array('Q')
+    values.frombytes(data)
+    values.byteswap()
+    return values
+
+
+# Return the bytes of an array of numbers, little endian
+def _array_bytes(typecode, values):
+    data = array.array(typecode, values)
+    if sys.byteorder != 'little':
+        data.byteswap()
+    return data.tobytes()
+
+
+# Write a snapshot file of the given tables.
+# tables - dict whose key is a table name (see TABLES) and value is the list of records. For 'typedefs' the
+#          value is the dict of typedefs.
+# types  - CScrape.types
+def write(filename, tables, types):
+    # Collect the strings of all the columns
+    strings = set()
+    columns = dict()    # Key is table name. Value is a dict of column name -> list of column values
+    for table, record_class, column_functions, index_functions in TABLES:
+        records = tables[table]
+        if table == 'typedefs':
+            columns[table] = { 'name': list(records) }
+        else:
+            columns[table] = dict()
+            for column in column_functions:
+                columns[table][column] = [column_functions[column](record) for record in records]
+        for values in columns[table].values():
+            strings.update(values)
+        if table == 'enums':
+            for record in records:
+                strings.update(_value_names(record))
+    strings.discard(None)
+    strings = sorted(strings)
+    string_ids = { string: n for n, string in enumerate(strings) }
+    string_ids[None] = NONE
+
+    sections = []
+    # String table
+    encoded = [string.encode('utf8') for string in strings]
+    offsets = [0]
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    sections.append(('strings', _array_bytes('I', [len(strings)] + offsets) + b''.join(encoded)))
+    sections.append(('types', json.dumps(types).encode('utf8')))
+
+    for table, record_class, column_functions, index_functions in TABLES:
+        records = tables[table]
+        if table == 'typedefs':
+            records = list(records.values())
+        # Records
+        blobs = [json.dumps(record, default=portable_default).encode('utf8') for record in records]
+        offsets = [0]
+        for data in blobs:
+            offsets.append(offsets[-1] + len(data))
+        sections.append((table + '.records', _array_bytes('Q', [len(records)] + offsets) + b''.join(blobs)))
+        # Columns
+        for column in columns[table]:
+            sections.append(('%s.%s' % (table, column),
+                             _array_bytes('I', [string_ids[value] for value in columns[table][column]])))
+        # Indexes
+        for name in index_functions:
+            pairs = []
+            for position in range(len(records)):
+                if index_functions[name] == None:
+                    keys = (columns[table][name][position],)
+                else:
+                    keys = index_functions[name](records[position])
+                for key in keys:
+                    pairs.append((string_ids[key], position))
+            pairs.sort()
+            sections.append(('%s.index.%s' % (table, name),
+                             _array_bytes('I', [pair[0] for pair in pairs] + [pair[1] for pair in pairs])))
+
+    # Work out where each section goes
+    offset = _HEADER.size + _SECTION.size * len(sections)
+    table = []
+    for name, data in sections:
+        offset = (offset + 7) & ~7
+        table.append((name, offset, len(data)))
+        offset += len(data)
+
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(sections)))
+        for name, offset, length in table:
+            f.write(_SECTION.pack(name.encode('ascii'), offset, length))
+        for (name, data), (name, offset, length) in zip(sections, table):
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(data)
+    os.replace(temp_filename, filename)
+
+
+# An open snapshot file. Only the header is read when it is opened. Records are decoded when they are used.
+class Snapshot():
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)
+        magic, version, count = _HEADER.unpack_from(self.view, 0)
+        if magic != MAGIC:
+            self.close()
+            raise Exception("%s is not a pycscrape snapshot" % filename)
+        if version != VERSION:
+            self.close()
+            raise Exception("%s is a version %d snapshot. Version %d is supported." % (filename, version, VERSION))
+        self.sections = dict()
+        strings_offset = 0
+        for n in range(count):
+            name, offset, length = _SECTION.unpack_from(self.view, _HEADER.size + n * _SECTION.size)
+            name = name.rstrip(b'\0').decode('ascii')
+            self.sections[name] = self.view[offset:offset + length]
+            if name == 'strings':
+                strings_offset = offset
+        strings = self.sections['strings']
+        self.string_count = _uint32s(strings[:4])[0]
+        self.string_offsets = _uint32s(strings[4:8 + 4 * self.string_count])
+        # Strings are sliced from the mmap (as bytes) so they can be compared
+        self.string_base = strings_offset + 8 + 4 * self.string_count
+        self.tables = dict()
+
+
+    # Release the file. Records already decoded can still be used.
+    def close(self):
+        self.tables = dict()
+        self.sections = dict()
+        self.string_offsets = None
+        try:
+            self.view.release()
+            self.mmap.close()
+        except BufferError:
+            pass  # Records still use the file. It is closed when they are deleted.
+
+
+    # Return the string with the given id
+    def string(self, string_id):
+        if string_id == NONE:
+            return None
+        base = self.string_base
+        return self.mmap[base + self.string_offsets[string_id]:base + self.string_offsets[string_id + 1]].decode('utf8')
+
+
+    # Return the id of the given string, NONE for None, or -1 if the string is not in the snapshot
+    def string_id(self, string):
+        if string == None:
+            return NONE
+        key = string.encode('utf8')
+        base, offsets, data = self.string_base, self.string_offsets, self.mmap
+        low, high = 0, self.string_count
+        while low < high:
+            middle = (low + high) // 2
+            value = data[base + offsets[middle]:base + offsets[middle + 1]]
+            if value < key:
+                low = middle + 1
+            elif value > key:
+                high = middle
+            else:
+                return middle
+        return -1
+
+
+    # Return the SnapshotTable of the given name
+    def table(self, name):
+        if not name in self.tables:
+            for table, record_class, column_functions, index_functions in TABLES:
+                if table == name:
+                    self.tables[name] = SnapshotTable(self, name, record_class, column_functions, index_functions)
+        return self.tables[name]
+
+
+    # Return CScrape.types
+    def types(self):
+        return json.loads(bytes(self.sections['types']).decode('utf8'))
+
+
+# The records of one table of a snapshot
+class SnapshotTable():
+    def __init__(self, snapshot, name, record_class, column_functions, index_functions):
+        self.snapshot     = snapshot
+        self.name         = name
+        self.record_class = record_class
+        records           = snapshot.sections[name + '.records']
+        self.count        = _uint64s(records[:8])[0]
+        self.offsets      = _uint64s(records[8:16 + 8 * self.count])
+        self.data         = records[16 + 8 * self.count:]
+        self.columns      = dict()
+        for column in column_functions:
+            self.columns[column] = _uint32s(snapshot.sections['%s.%s' % (name, column)])
+        self.indexes      = dict()  # Key is index name. Value is (string ids, positions)
+        for index in index_functions:
+            pairs = _uint32s(snapshot.sections['%s.index.%s' % (name, index)])
+            half = len(pairs) // 2
+            self.indexes[index] = (pairs[:half], pairs[half:])
+
+
+    # Decode the record at the given position
+    def record(self, position):
+        data = json.loads(bytes(self.data[self.offsets[position]:self.offsets[position + 1]]).decode('utf8'))
+        return load_record(self.record_class, data)
+
+
+    # Return the string in a column of a record
+    def column(self, column, position):
+        return self.snapshot.string(self.columns[column][position])
+
+
+    # Return the list of positions (in order) of the records found under key in the given index
+    def lookup(self, index, key):
+        string_id = self.snapshot.string_id(key)
+        if string_id == -1:
+            return []
+        keys, positions = self.indexes[index]
+        start = bisect.bisect_left(keys, string_id)
+        end = bisect.bisect_right(keys, string_id, start)
+        return [positions[n] for n in range(start, end)]
+
+
+    # Return the list of positions of the records matching all of the criteria. See RecordIndex.find()
+    def find(self, criteria):
+        positions = None
+        for name in criteria:
+            if name in self.indexes:
+                positions = self.lookup(name, criteria[name])
+                break
+        if positions == None:
+            positions = range(self.count)
+        for name in criteria:
+            if name in self.columns:
+                string_id = self.snapshot.string_id(criteria[name])
+                column = self.columns[name]
+                positions = [position for position in positions if column[position] == string_id]
+        return list(positions)
+
+
+# The records of a snapshot table as a read only list. Records are decoded the first time they are used.
+class SnapshotRecords(collections.abc.Sequence):
+    def __init__(self, table):
+        self.table   = table
+        self.records = dict()  # Key is position. Value is the decoded record
+
+    def __len__(self):
+        return self.table.count
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[n] for n in range(*position.indices(self.table.count))]
+        if position < 0:
+            position += self.table.count
+        if position < 0 or position >= self.table.count:
+            raise IndexError('list index out of range')
+        try:
+            return self.records[position]
+        except KeyError:
+            record = self.table.record(position)
+            self.records[position] = record
+            return record
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+# The typedefs of a snapshot as a read only dict. Typedefs are decoded the first time they are used.
+class SnapshotTypedefs(collections.abc.Mapping):
+    def __init__(self, table):
+        self.table   = table
+        self.records = SnapshotRecords(table)
+
+    def __len__(self):
+        return self.table.count
+
+    def __getitem__(self, name):
+        if type(name) is not str:
+            raise KeyError(name)
+        positions = self.table.lookup('name', name)
+        if len(positions) == 0:
+            raise KeyError(name)
+        return self.records[positions[0]]
+
+    def __iter__(self):
+        for position in range(self.table.count):
+            yield self.table.column('name', position)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+# Used in place of a RecordIndex (see CScrape.var(), enum() and enum_type()) for the records of a snapshot
+class SnapshotIndex():
+    def __init__(self, table):
+        self.table = table
+
+    def sync(self, records):
+        pass
+
+    def reset(self):
+        pass
+
+    def find(self, records, criteria):
+        return self.table.find(criteria)
+
+
+# Used in place of CScrape.map_var_index for the map data of a snapshot. indexes['name_file'].get() returns
+# the positions of the map data with the given (name, file).
+class SnapshotMapIndex(SnapshotIndex):
+    def __init__(self, table):
+        SnapshotIndex.__init__(self, table)
+        self.indexes = { 'name_file': self }
+
+    def get(self, key, default=None):
+        positions = self.table.find({ 'name': key[0], 'file': key[1] })
+        if len(positions) == 0:
+            return default
+        return positions
@@ -0,0 +1,91 @@
+#-----------------------------------------------------------------
+#    pycscrape: Python library for gathering information from C source files.
+#    Copyright (C) 2017  Mike Morgan  (mikemorgan@blueyonder.co.uk)
+#
+#    This library is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this library.  If not, see <http://www.gnu.org/licenses/>.
+#-----------------------------------------------------------------
+#
+#  Canonical names of the C types e.g. 'short unsigned int' --> 'unsigned short'. See CScrape.collate_types()
+#-----------------------------------------------------------------
+
+
+# Return a dict whose key is a sorted tuple of the words of a type name and whose value is the canonical name.
+# e.g. ('int', 'short', 'unsigned') --> 'unsigned short'
+# default_char_sign - 'signed' or 'unsigned'. The sign of a plain 'char'.
+def build_table(default_char_sign):
+    table = dict()
+    for sign in (None, 'signed', 'unsigned'):
+        for size in ('char', 'short', 'int', 'long', 'long long'):
+            name_sign = sign
+            if name_sign == None:
+                name_sign = default_char_sign if size == 'char' else 'signed'
+            canonical = name_sign + ' ' + size
+            words = tuple(size.split(' '))
+            if sign != None:
+                words += (sign,)
+            table[tuple(sorted(words))] = canonical
+            # 'int' may be added to all but char e.g. 'short int'
+            if size != 'char' and size != 'int':
+                table[tuple(sorted(words + ('int',)))] = canonical
+    # 'signed' and 'unsigned' on their own are ints
+    table[('signed',)]   = 'signed int'
+    table[('unsigned',)] = 'unsigned int'
+    table[('double', 'long')] = 'double long'
+    return table
+
+
+# Turns the words of a type name into its canonical name. A type name is only worked out once, after that it is
+# found in a dict. The names which are not in the table (e.g. 'float' or typedef names) are the words in
+# alphabetical order, except for the names of tagged structs and unions (e.g. 'struct node'), which are kept.
+class TypeNames():
+    def __init__(self, default_char_sign='signed'):
+        self.rebuild(default_char_sign)
+
+
+    # Build the table again for the given sign of a plain 'char'
+    def rebuild(self, default_char_sign):
+        self.default_char_sign = default_char_sign
+        self.table  = build_table(default_char_sign)
+        self.words  = dict()    # Key is the tuple of words as written e.g. ('short', 'int')
+        self.names  = dict()    # Key is a type name string e.g. 'short int'
+
+
+    # Return the canonical name of a list of words e.g. ['short', 'int'] --> 'signed short'
+    def collate(self, words):
+        key = tuple(words)
+        try:
+            return self.words[key]
+        except KeyError:
+            pass
+        words = [word for word in key if word != '']
+        if len(words) == 2 and words[0] in ('struct', 'union'):
+            name = ' '.join(words)
+        else:
+            words = tuple(sorted(words))
+            name = self.table.get(words)
+            if name == None:
+                name = ' '.join(words)
+        self.words[key] = name
+        return name
+
+
+    # Return the canonical name of a type name string e.g. 'short int' --> 'signed short'
+    def canonical(self, type_name):
+        try:
+            return self.names[type_name]
+        except KeyError:
+            pass
+        name = self.collate(type_name.split(' '))
+        self.names[type_name] = name
+        return name
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+#
+# This script measures how fast addresses (e.g. from a bus trace) are turned into the symbol holding them,
+# with a linear search of the map data, with CScrape.address_index.find() (one search for all the addresses)
+# and with CScrape.addr_lookup_bulk() (the member and array item too).
+#
+#  Usage:
+#    address_index_benchmark.py
+#         10000 symbols and 1000000 addresses
+#    address_index_benchmark.py  symbols=100000 addresses=5000000
+#         100000 symbols and 5000000 addresses
+#
+
+import os
+import random
+import sys
+import time
+
+# Add the library to the library path
+project_folder = os.path.abspath(os.path.dirname(__file__) + '/../..')
+sys.path[0:0] = [project_folder]
+
+import pycscrape
+
+SOURCE = '''
+typedef struct
+{
+    unsigned int   timestamp;
+    signed short   channel[4];
+    unsigned char  flags;
+    float          level;
+} sample_t;
+'''
+LINEAR = 2000      # Number of addresses looked up by the (slow) linear search
+
+
+def timed(function, *args):
+    start = time.time()
+    result = function(*args)
+    return time.time() - start, result
+
+
+def main():
+    symbols = 10000
+    count = 1000000
+    for arg in sys.argv[1:]:
+        if arg[:8] == 'symbols=':
+            symbols = int(arg[8:])
+        elif arg[:10] == 'addresses=':
+            count = int(arg[10:])
+        else:
+            print("ERROR: Unknown option %s" % arg)
+            sys.exit(1)
+
+    # Variables of 4 samples, with gaps between them
+    obj = pycscrape.CScrape()
+    obj.parse_string(SOURCE + ''.join(['sample_t samples%d[4];\n' % n for n in range(symbols)]), filename='bench.c')
+    size = obj.variables[0]['size'] // 8
+    for n in range(symbols):
+        obj.map_var_data.append({ 'name': 'samples%d' % n, 'addr': 0x20000000 + n * (size + 8), 'size': size,
+                                  'file': None, 'func': None })
+    random.seed(1)
+    addresses = [random.randrange(0x20000000, 0x20000000 + symbols * (size + 8)) for n in range(count)]
+
+    def linear(addresses):
+        found = []
+        for address in addresses:
+            position = -1
+            for n, data in enumerate(obj.map_var_data):
+                if data['addr'] <= address < data['addr'] + data['size']:
+                    position = n
+                    break
+            found.append(position)
+        return found
+
+    build_time, _ = timed(obj.address_index.find, addresses[:1])
+    linear_time, expected = timed(linear, addresses[:LINEAR])
+    find_time, found = timed(obj.address_index.find, addresses)
+    bulk_time, matches = timed(obj.addr_lookup_bulk, addresses)
+    linear_rate = LINEAR / linear_time
+    print("Symbols     : %d" % symbols)
+    print("Addresses   : %d" % count)
+    print("Build index : %8.3f s" % build_time)
+    print("Linear      : %9.0f addresses/s" % linear_rate)
+    print("find()      : %9.0f addresses/s  (%.1fx)" % (count / find_time, count / find_time / linear_rate))
+    print("bulk lookup : %9.0f addresses/s  (%.1fx)" % (count / bulk_time, count / bulk_time / linear_rate))
+    print("Example     : 0x%x is %s" % (addresses[0], matches[0].location() if matches[0] else None))
+    symbol = lambda n: None if n < 0 else obj.address_index.symbols[n][1]['name']
+    if [symbol(int(n)) for n in found[:LINEAR]] != [None if n < 0 else obj.map_var_data[n]['name']
+                                                       for n in expected] or \
+       [symbol(int(n)) for n in found] != [match and match.name for match in matches]:
+        print("ERROR: Results differ")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+#
+# This script measures how fast CScrape.decode() decodes structs from a memory image, compared with decoding
+# each field of the struct's layout in turn.
+#
+#  Usage:
+#    codec_benchmark.py
+#         Decode 20000 structs
+#    codec_benchmark.py  records=200000
+#         Decode 200000 structs
+#
+
+import os
+import random
+import sys
+import time
+
+# Add the library to the library path
+project_folder = os.path.abspath(os.path.dirname(__file__) + '/../..')
+sys.path[0:0] = [project_folder]
+
+import pycscrape
+
+
+SOURCE = '''
+typedef struct
+{
+    unsigned int   timestamp;
+    signed short   channel[4];
+    unsigned char  flags;
+    unsigned int   valid:1;
+    unsigned int   count:7;
+    float          level;
+    signed int     error;
+} sample_t;
+'''
+
+
+# Decode a struct one field at a time, using the layout of the type
+def decode_fields(obj, layout, buf, offset):
+    value = dict()
+    for field in layout.fields:
+        signed = obj.types[field.type_name]['signed']
+        if field.bit_field:
+            start = offset + field.unit_offset // 8
+            unit = int.from_bytes(buf[start:start + field.unit_size // 8], obj.endian)
+            value[field.path] = field.extract(unit)
+        elif field.type_name == 'float':
+            start = offset + field.offset // 8
+            value[field.path] = pycscrape.codec.struct.unpack_from('<f', buf, start)[0]
+        else:
+            items = []
+            size = field.item_size() // 8
+            for n in range(field.count()):
+                start = offset + field.offset // 8 + n * size
+                items.append(int.from_bytes(buf[start:start + size], obj.endian, signed=signed))
+            value[field.path] = items if len(field.array) != 0 else items[0]
+    return value
+
+
+def main():
+    records = 20000
+    for arg in sys.argv[1:]:
+        if arg[:8] == 'records=':
+            records = int(arg[8:])
+        else:
+            print("ERROR: Unknown option %s" % arg)
+            sys.exit(1)
+
+    obj = pycscrape.CScrape()
+    obj.parse_string(SOURCE)
+    layout = obj.layout('sample_t')
+    size = layout.size // 8
+    random.seed(1)
+    image = memoryview(bytes([random.randrange(256) for n in range(size * records)]))
+    # Keep the floats finite, so the results can be compared
+    image = bytearray(image)
+    for n in range(records):
+        image[n * size + 19] = 0x3F
+    image = memoryview(image)
+
+    start = time.time()
+    old = [decode_fields(obj, layout, image, n * size) for n in range(records)]
+    old_time = time.time() - start
+
+    start = time.time()
+    codec = obj.codec('sample_t')
+    codec_time = time.time() - start
+    start = time.time()
+    new = [codec.decode(image, n * size) for n in range(records)]
+    new_time = time.time() - start
+
+    print("Records     : %d of %d bytes" % (records, size))
+    print("Per field   : %8.3f s  (%9.0f records/s)" % (old_time, records / old_time))
+    print("Codec       : %8.3f s  (%9.0f records/s)  + %.3f s to make the codec" % (new_time, records / new_time,
+                                                                                      codec_time))
+    print("Speed up    : %8.1fx" % (old_time / new_time))
+    if old != new:
+        print("ERROR: Results differ")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
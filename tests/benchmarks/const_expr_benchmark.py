@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+#
+# This script measures how fast CScrape evaluates constant expressions (e.g. enum values and array sizes),
+# compared with the original GetValue(), which used eval() for each constant.
+#
+#  Usage:
+#    const_expr_benchmark.py
+#         Evaluate the values of 2000 enums, each with 8 values
+#    const_expr_benchmark.py  enums=20000
+#         Evaluate the values of 20000 enums
+#
+
+import os
+import sys
+import time
+
+# Add the library to the library path
+project_folder = os.path.abspath(os.path.dirname(__file__) + '/../..')
+sys.path[0:0] = [project_folder]
+
+import pycscrape
+
+
+# One enum of a generated header. '%d' is replaced by the enum number.
+SOURCE = '''
+enum regs%d_e {
+    REG%d_A = 0x%XUL,
+    REG%d_B = (0x1FU << 8) | 0x3U,
+    REG%d_C = 0%o + 10u,
+    REG%d_D = (%dUL * 4U) / 3U,
+    REG%d_E = ~0x0U & 0xFFFFU,
+    REG%d_F = sizeof(int) * 0x20U,
+    REG%d_G = (0x12345678UL >> 4) ^ 0xAAAAU,
+    REG%d_H = 'A' + 0x10
+};
+'''
+
+
+# The original GetValue(), for comparison
+class EvalScrape(pycscrape.CScrape):
+    def GetValue(self, node):
+        if node.__class__.__name__ == 'Constant':
+            value = node.value
+            original_value = value
+            try:
+                while value[-1] == 'U' or \
+                      value[-1] == 'u' or \
+                      value[-1] == 'L' or \
+                      value[-1] == 'l':
+                    value = value[:-1]
+                if value[0] == "'":
+                    return ord(value[1])
+                if len(value) > 1 and value[0] == '0' and value[1] in '01234567':
+                    value = '0o' + value[1:]   # Python 3 spelling of an octal constant
+                value = eval(value)
+                if (type(value) is float) or (type(value) is int):
+                    return value
+                raise
+            except:
+                raise SyntaxError("Could not parse constant '" + original_value + "'")
+
+        if node.__class__.__name__ == 'BinaryOp':
+            left  = self.GetValue(node.left)
+            right = self.GetValue(node.right)
+            if node.op == '+':
+                return left + right
+            if node.op == '-':
+                return left - right
+            if node.op == '*':
+                return left * right
+            if node.op == '/':
+                if (type(left)  is int) and \
+                   (type(right) is int):
+                    return left // right
+                else:
+                    return left / right
+            if node.op == '<<':
+                    return left << right
+            if node.op == '>>':
+                    return left >> right
+            if node.op == '&':
+                    return left & right
+            if node.op == '|':
+                    return left | right
+            if node.op == '^':
+                    return left ^ right
+            raise SyntaxError("Unknown BinaryOp '" + node.op + "'")
+
+        if node.__class__.__name__ == 'UnaryOp':
+            right = self.GetValue(node.expr)
+            if node.op == '+':
+                return right
+            if node.op == '-':
+                return -right
+            if node.op == '~':
+                return ~right
+            if node.op == 'sizeof':
+                return (self.type_size(right) + 7) // 8  # Divide by 8 because sizeof() returns bytes
+            raise SyntaxError("Unknown UnaryOp '" + node.op + "'")
+
+        if node.__class__.__name__ == 'Typename':
+            return self.collate_types(node.type.type.names)
+
+        raise SyntaxError("Unknown expression type '" + node.__class__.__name__ + "'")
+
+
+# Return a list of the value expression of each enumerator
+def value_nodes(ast):
+    nodes = []
+    for name, decl in ast.children():
+        for enumerator in decl.type.values.enumerators:
+            nodes.append(enumerator.value)
+    return nodes
+
+
+# Return (time taken, values) to evaluate all the nodes
+def evaluate(obj, nodes):
+    start = time.time()
+    values = [obj.GetValue(node) for node in nodes]
+    return time.time() - start, values
+
+
+def main():
+    enums = 2000
+    for arg in sys.argv[1:]:
+        if arg[:6] == 'enums=':
+            enums = int(arg[6:])
+        else:
+            print("ERROR: Unknown option %s" % arg)
+            sys.exit(1)
+
+    parts = []
+    for n in range(enums):
+        parts.append(SOURCE % (n, n, n * 16, n, n, n + 8, n, n, n, n, n, n))
+    ast = pycscrape.CScrape.get_parser().parse(''.join(parts))
+    nodes = value_nodes(ast)
+    print("Expressions : %d" % len(nodes))
+
+    old = EvalScrape()
+    old_time, old_values = evaluate(old, nodes)
+    new = pycscrape.CScrape()
+    new_time, new_values = evaluate(new, nodes)
+    # Evaluating the same nodes again uses the remembered results
+    warm_time, warm_values = evaluate(new, nodes)
+
+    print("eval()      : %8.3f s  (%9.0f expressions/s)" % (old_time, len(nodes) / old_time))
+    print("Evaluator   : %8.3f s  (%9.0f expressions/s)" % (new_time, len(nodes) / new_time))
+    print("  again     : %8.3f s  (%9.0f expressions/s)" % (warm_time, len(nodes) / max(warm_time, 1e-9)))
+    print("Speed up    : %8.1fx" % (old_time / new_time))
+    if old_values != new_values or warm_values != new_values:
+        print("ERROR: Results differ")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
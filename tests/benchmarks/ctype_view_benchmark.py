@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+#
+# This script measures how fast one field of each struct of a large array in an mmap'd memory image is read
+# with a view from CScrape.view(), compared with CScrape.decode() of each struct.
+#
+#  Usage:
+#    ctype_view_benchmark.py
+#         Read 100000 structs
+#    ctype_view_benchmark.py  records=1000000
+#         Read 1000000 structs
+#
+
+import mmap
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add the library to the library path
+project_folder = os.path.abspath(os.path.dirname(__file__) + '/../..')
+sys.path[0:0] = [project_folder]
+
+import pycscrape
+
+
+SOURCE = '''
+typedef struct
+{
+    unsigned int   timestamp;
+    signed short   channel[4];
+    unsigned char  flags;
+    unsigned int   valid:1;
+    unsigned int   count:7;
+    float          level;
+    signed int     error;
+} sample_t;
+sample_t samples[%d];
+'''
+
+
+def main():
+    records = 100000
+    for arg in sys.argv[1:]:
+        if arg[:8] == 'records=':
+            records = int(arg[8:])
+        else:
+            print("ERROR: Unknown option %s" % arg)
+            sys.exit(1)
+
+    obj = pycscrape.CScrape()
+    obj.parse_string(SOURCE % records)
+    size = obj.layout('sample_t').size // 8
+    random.seed(1)
+    with tempfile.TemporaryFile() as f:
+        f.write(random.randbytes(size * records))
+        f.flush()
+        image = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+        start = time.time()
+        old = [obj.decode('sample_t', image, n * size)['timestamp'] for n in range(records)]
+        old_time = time.time() - start
+
+        start = time.time()
+        samples = obj.view('samples', image)
+        new = [sample.timestamp for sample in samples]
+        new_time = time.time() - start
+        del samples
+        image.close()
+
+    print("Records     : %d of %d bytes" % (records, size))
+    print("decode()    : %8.3f s  (%10.0f records/s)" % (old_time, records / old_time))
+    print("view()      : %8.3f s  (%10.0f records/s)" % (new_time, records / new_time))
+    print("Speed up    : %8.1fx" % (old_time / new_time))
+    if old != new:
+        print("ERROR: Results differ")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
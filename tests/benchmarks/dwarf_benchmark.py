@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+#
+# This script measures how fast CScrape.parse_dwarf() reads the types, variables and addresses of a program
+# from its DWARF debug information, compared with parsing the C source with parse_file() and reading the
+# addresses with parse_elf(). The program is made up and built with gcc (for the machine running the script),
+# so gcc must be installed. The typedefs and variables found both ways must be the same.
+#
+#  Usage:
+#    dwarf_benchmark.py
+#         A program of 50 C files
+#    dwarf_benchmark.py  files=200
+#         A program of 200 C files
+#
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Add the library to the library path
+project_folder = os.path.abspath(os.path.dirname(__file__) + '/../..')
+sys.path[0:0] = [project_folder]
+
+import pycscrape
+
+TYPES = 20     # Number of typedefs in the header included by every file
+
+
+# Return the text of the header declaring the typedefs
+def make_header():
+    lines = ['typedef struct { short x; unsigned char y[3]; } point0_t;']
+    for n in range(1, TYPES):
+        lines.append('typedef struct {\n'
+                     '  char c;\n'
+                     '  unsigned int a:3;\n'
+                     '  int b:%d;\n'
+                     '  point%d_t pts[%d];\n'
+                     '  struct { int q; float f; } inner;\n'
+                     '  union { int i; unsigned char ch[4]; };\n'
+                     '  double d;\n'
+                     '  char *p;\n'
+                     '} point%d_t;' % (n % 16 + 1, n // 2, n % 3 + 1, n))
+    return '\n'.join(lines) + '\n'
+
+
+# Return the text of C file number n
+def make_source(n):
+    lines = ['#include "types.h"']
+    for m in range(20):
+        lines.append('point%d_t var%d_%d[%d];' % ((n + m) % TYPES, n, m, m % 4 + 1))
+    lines.append('static int count%d;' % n)
+    lines.append('int func%d(void) { static int calls%d; return calls%d + count%d; }' % (n, n, n, n))
+    return '\n'.join(lines) + '\n'
+
+
+# Return (best time taken, obj) of 3 runs of parse(obj) with a new CScrape object configured for x86-64
+def best_time(parse):
+    best = None
+    for n in range(3):
+        obj = pycscrape.CScrape()
+        obj.POINTER_SIZE = 64
+        obj.STRUCT_ALIGNMENT = 8
+        start = time.time()
+        parse(obj)
+        taken = time.time() - start
+        if best == None or taken < best:
+            best = taken
+    return best, obj
+
+
+# Return the (name, simple filename, function, type, ptr, array, size, addr) of each variable
+def variables(obj):
+    return sorted([(var['name'], obj.simple_filename(var['filename']), var['function'], var['type'], var['ptr'],
+                    tuple(var['array']), var['size'], obj.var(var['name'])['addr']) for var in obj.variables])
+
+
+def main():
+    count = 50
+    for arg in sys.argv[1:]:
+        if arg[:6] == 'files=':
+            count = int(arg[6:])
+        else:
+            print("ERROR: Unknown option %s" % arg)
+            sys.exit(1)
+    if shutil.which('gcc') == None:
+        print("ERROR: gcc is not installed")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as folder:
+        with open(os.path.join(folder, 'types.h'), 'w') as f:
+            f.write(make_header())
+        sources = []
+        for n in range(count):
+            sources.append('module%d.c' % n)
+            with open(os.path.join(folder, sources[-1]), 'w') as f:
+                f.write(make_source(n))
+        with open(os.path.join(folder, 'start.c'), 'w') as f:
+            f.write('void _start(void) { }\n')
+        subprocess.run(['gcc', '-g', '-O0', '-nostdlib', '-static', '-o', 'results.elf', 'start.c'] + sources,
+                       cwd=folder, check=True)
+        elf_file = os.path.join(folder, 'results.elf')
+
+        def parse_source(obj):
+            for source in sources:
+                obj.parse_file(os.path.join(folder, source), follow_includes=True)
+            obj.parse_elf(elf_file)
+        old_time, old = best_time(parse_source)
+        new_time, new = best_time(lambda obj: obj.parse_dwarf(elf_file))
+
+    print("Files       : %d" % count)
+    print("C source    : %8.3f s" % old_time)
+    print("DWARF       : %8.3f s" % new_time)
+    print("Speed up    : %8.1fx" % (old_time / new_time))
+    fingerprints = lambda obj: dict([(name, typedef.fingerprint()) for name, typedef in obj.typedefs.items()])
+    if fingerprints(old) != fingerprints(new) or variables(old) != variables(new):
+        print("ERROR: Results differ")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
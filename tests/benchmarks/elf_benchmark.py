@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+#
+# This script measures how fast CScrape.parse_elf() reads the symbol table of an ELF file, compared with
+# CScrape.parse_readelf_output() reading the output of readelf for the same file. The ELF file is made up, so
+# no compiler is needed. If readelf is installed, the time to run it and parse its output is measured too.
+#
+#  Usage:
+#    elf_benchmark.py
+#         Read an ELF file with 100000 symbols
+#    elf_benchmark.py  symbols=1000000
+#         Read an ELF file with 1000000 symbols
+#
+
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+# Add the library to the library path
+project_folder = os.path.abspath(os.path.dirname(__file__) + '/../..')
+sys.path[0:0] = [project_folder]
+
+import pycscrape
+
+
+# Return the symbols (name, value, size, type, bind) of a made up program. The types are 1 OBJECT, 2 FUNC and
+# 4 FILE. The binds are 0 LOCAL and 1 GLOBAL.
+def make_symbols(count):
+    symbols = []
+    for n in range(count):
+        if n % 100 == 0:
+            symbols.append(('module%d.c' % (n // 100), 0, 0, 4, 0))
+        elif n % 3 == 0:
+            symbols.append(('function%d' % n, 0x10000 + n * 64, 64, 2, n % 2))
+        else:
+            symbols.append(('variable%d.%d' % (n, n), 0x20000000 + n * 4, 4, 1, 0))
+    return symbols
+
+
+# Return the bytes of an ELF32 little endian file with a '.symtab' section holding the symbols
+def make_elf(symbols):
+    strings = bytearray(b'\0')
+    entries = [struct.pack('<IIIBBH', 0, 0, 0, 0, 0, 0)]
+    for name, value, size, kind, bind in symbols:
+        entries.append(struct.pack('<IIIBBH', len(strings), value, size, (bind << 4) | kind, 0, 1))
+        strings += name.encode('utf8') + b'\0'
+    symtab = b''.join(entries)
+    section_names = b'\0.strtab\0.symtab\0.shstrtab\0'
+    symtab_offset = 52 + len(strings)
+    names_offset = symtab_offset + len(symtab)
+    sections_offset = names_offset + len(section_names)
+    data = b'\x7fELF\x01\x01\x01' + b'\0' * 9
+    data += struct.pack('<HHIIIIIHHHHHH', 2, 40, 1, 0x8000, 0, sections_offset, 0, 52, 0, 0, 40, 4, 3)
+    data += bytes(strings) + symtab + section_names
+    data += struct.pack('<IIIIIIIIII', 0, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+    data += struct.pack('<IIIIIIIIII', 1, 3, 0, 0, 52, len(strings), 0, 0, 1, 0)
+    data += struct.pack('<IIIIIIIIII', 9, 2, 0, 0, symtab_offset, len(symtab), 1, len(entries), 4, 16)
+    data += struct.pack('<IIIIIIIIII', 17, 3, 0, 0, names_offset, len(section_names), 0, 0, 1, 0)
+    return data
+
+
+# Write the output 'readelf -s -W' gives for the symbols to f
+def write_readelf_output(f, symbols):
+    f.write("Symbol table '.symtab' contains %d entries:\n" % (len(symbols) + 1))
+    f.write("   Num:    Value  Size Type    Bind   Vis      Ndx Name\n")
+    f.write("     0: 00000000     0 NOTYPE  LOCAL  DEFAULT  UND \n")
+    for n, (name, value, size, kind, bind) in enumerate(symbols):
+        f.write("%6d: %08x %5d %-7s %-6s DEFAULT    1 %s\n" % (n + 1, value, size,
+                { 1: 'OBJECT', 2: 'FUNC', 4: 'FILE' }[kind], ['LOCAL', 'GLOBAL'][bind], name))
+    f.write("\n")
+
+
+# Return (best time taken, obj) of 3 runs of parse(obj) with a new CScrape object
+def best_time(parse):
+    best = None
+    for n in range(3):
+        obj = pycscrape.CScrape()
+        start = time.time()
+        parse(obj)
+        taken = time.time() - start
+        if best == None or taken < best:
+            best = taken
+    return best, obj
+
+
+def main():
+    count = 100000
+    for arg in sys.argv[1:]:
+        if arg[:8] == 'symbols=':
+            count = int(arg[8:])
+        else:
+            print("ERROR: Unknown option %s" % arg)
+            sys.exit(1)
+
+    symbols = make_symbols(count)
+    with tempfile.TemporaryDirectory() as folder:
+        elf_file = os.path.join(folder, 'results.elf')
+        text_file = os.path.join(folder, 'results.data')
+        with open(elf_file, 'wb') as f:
+            f.write(make_elf(symbols))
+        with open(text_file, 'w') as f:
+            write_readelf_output(f, symbols)
+
+        old_time, old = best_time(lambda obj: obj.parse_readelf_output(text_file))
+        new_time, new = best_time(lambda obj: obj.parse_elf(elf_file))
+        # The time to make the text with readelf, as well as parse it
+        readelf_time = None
+        if shutil.which('readelf') != None:
+            def readelf(obj):
+                with open(text_file, 'w') as f:
+                    subprocess.run(['readelf', '-s', '-W', elf_file], stdout=f, check=True)
+                obj.parse_readelf_output(text_file)
+            readelf_time, readelf_obj = best_time(readelf)
+            if readelf_obj.map_var_data != new.map_var_data or readelf_obj.map_func_data != new.map_func_data:
+                print("ERROR: Results differ")
+                sys.exit(1)
+
+    print("Symbols     : %d" % len(symbols))
+    if readelf_time != None:
+        print("readelf+text: %8.3f s" % readelf_time)
+    print("Text        : %8.3f s" % old_time)
+    print("ELF         : %8.3f s" % new_time)
+    print("Speed up    : %8.1fx" % ((readelf_time or old_time) / new_time))
+    if old.map_var_data != new.map_var_data or old.map_func_data != new.map_func_data:
+        print("ERROR: Results differ")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
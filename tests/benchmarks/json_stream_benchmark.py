@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+#
+# This script measures the peak memory (using tracemalloc) used to save and load a model with
+# json_dump()/json_load() and with json_dump_to()/json_load_from(). The model is made up (not parsed) so
+# that it can be large.
+#
+#  Usage:
+#    json_stream_benchmark.py
+#         Use a model with 50000 variables
+#    json_stream_benchmark.py  symbols=500000
+#         Use a model with 500000 variables
+#
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Add the library to the library path
+project_folder = os.path.abspath(os.path.dirname(__file__) + '/../..')
+sys.path[0:0] = [project_folder]
+
+import pycscrape
+from pycscrape.records import VariableRecord
+
+
+def make_model(symbols):
+    obj = pycscrape.CScrape()
+    for n in range(symbols):
+        line = 'static unsigned int variable%d[4];  /* Variable number %d */' % (n, n)
+        exception = None
+        if n % 1000 == 0:
+            exception = SyntaxError('Unknown type unknown%d_t' % n)
+        obj.variables.append(VariableRecord({ 'name': 'variable%d' % n, 'filename': 'src/module%d.c' % (n // 100),
+                                              'line_number': n % 100 + 1, 'line': line, 'exception': exception,
+                                              'type': 'unsigned int', 'ptr': 0, 'function': None, 'array': [4],
+                                              'size': 128 }))
+    return obj
+
+
+# Return the time taken and the peak number of bytes allocated by function()
+def measure(function):
+    tracemalloc.start()
+    start = time.time()
+    function()
+    duration = time.time() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return duration, peak
+
+
+def main():
+    symbols = 50000
+    for arg in sys.argv[1:]:
+        if arg[:8] == 'symbols=':
+            symbols = int(arg[8:])
+        else:
+            print("ERROR: Unknown option %s" % arg)
+            sys.exit(1)
+
+    obj = make_model(symbols)
+    filename = os.path.join(tempfile.mkdtemp(), 'model.json')
+    results = dict()
+
+    def dump():
+        with open(filename, 'w') as f:
+            f.write(obj.json_dump())
+    def dump_to():
+        with open(filename, 'w') as f:
+            obj.json_dump_to(f)
+    def load():
+        with open(filename) as f:
+            results['load'] = pycscrape.CScrape()
+            results['load'].json_load(f.read())
+    def load_from():
+        with open(filename, 'rb') as f:
+            results['load_from'] = pycscrape.CScrape()
+            results['load_from'].json_load_from(f)
+
+    print("Symbols          : %d" % symbols)
+    print("Note: the times include the tracemalloc overhead")
+    for name, function in (('json_dump()', dump), ('json_dump_to()', dump_to)):
+        duration, peak = measure(function)
+        print("%-17s: %6.2f s  peak %10d bytes" % (name, duration, peak))
+    print("File size        : %d bytes" % os.path.getsize(filename))
+    for name, function in (('json_load()', load), ('json_load_from()', load_from)):
+        duration, peak = measure(function)
+        print("%-17s: %6.2f s  peak %10d bytes" % (name, duration, peak))
+    os.remove(filename)
+    os.rmdir(os.path.dirname(filename))
+    if repr(results['load'].variables) != repr(results['load_from'].variables):
+        print("ERROR: Results differ")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
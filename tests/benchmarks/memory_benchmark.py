@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+#
+# This script measures the memory (using tracemalloc) taken by the functions, variables, enums and typedefs
+# found by CScrape, compared with holding the same data in plain dicts.
+# Both models are read from the same json_dump() string, so neither shares strings with the parsed source.
+#
+#  Usage:
+#    memory_benchmark.py
+#         Measure a model of a source with 500 modules
+#    memory_benchmark.py  modules=5000
+#         Measure a model of a source with 5000 modules
+#
+
+import json
+import os
+import sys
+import tracemalloc
+
+# Add the library to the library path
+project_folder = os.path.abspath(os.path.dirname(__file__) + '/../..')
+sys.path[0:0] = [project_folder]
+
+import pycscrape
+
+
+# The data of one module. '%d' is replaced by the module number.
+SOURCE = '''
+typedef struct
+{
+    unsigned char  state;
+    unsigned short count;
+    int            values[4];
+} record%d_t;
+
+typedef unsigned int handle%d_t;
+enum mode%d { MODE%d_OFF, MODE%d_IDLE, MODE%d_RUN, MODE%d_ERROR };
+
+record%d_t     records%d[8];
+handle%d_t     handle%d;
+unsigned char  buffer%d[64];
+static int     errors%d;
+const char    *names%d[2];
+
+int module%d_step(int x, char *data)
+{
+    static unsigned int calls;
+    calls++;
+    return x;
+}
+'''
+
+
+# Return the number of bytes allocated by function()
+def measure(function):
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    result = function()
+    size = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    return size, result
+
+
+def main():
+    modules = 500
+    for arg in sys.argv[1:]:
+        if arg[:8] == 'modules=':
+            modules = int(arg[8:])
+        else:
+            print("ERROR: Unknown option %s" % arg)
+            sys.exit(1)
+
+    obj = pycscrape.CScrape()
+    obj.parse_string(''.join([SOURCE.replace('%d', '%d' % n) for n in range(modules)]), filename='modules.c')
+    data = obj.json_dump()
+    records = len(obj.functions) + len(obj.variables) + len(obj.enums) + len(obj.typedefs)
+
+    dict_size, dicts = measure(lambda: json.loads(data))
+    def load_records():
+        new = pycscrape.CScrape()
+        new.json_load(data)
+        return new
+    record_size, new = measure(load_records)
+
+    print("Records     : %d" % records)
+    print("dicts       : %10d bytes  (%6.1f bytes/record)" % (dict_size, float(dict_size) / records))
+    print("Records     : %10d bytes  (%6.1f bytes/record)" % (record_size, float(record_size) / records))
+    print("Reduction   : %8.1f%%" % (100.0 - 100.0 * record_size / dict_size))
+    if json.loads(new.json_dump()) != dicts:
+        print("ERROR: Results differ")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+#
+# This script measures how fast an array of structs is decoded from a memory image with
+# numpy.frombuffer() and CScrape.numpy_dtype(), compared with CScrape.decode() of each struct.
+# It needs NumPy.
+#
+#  Usage:
+#    numpy_dtype_benchmark.py
+#         Decode 100000 structs
+#    numpy_dtype_benchmark.py  records=1000000
+#         Decode 1000000 structs
+#
+
+import os
+import sys
+import time
+
+import numpy
+
+# Add the library to the library path
+project_folder = os.path.abspath(os.path.dirname(__file__) + '/../..')
+sys.path[0:0] = [project_folder]
+
+import pycscrape
+
+
+SOURCE = '''
+typedef struct
+{
+    unsigned int   timestamp;
+    signed short   channel[4];
+    unsigned char  flags;
+    unsigned int   valid:1;
+    unsigned int   count:7;
+    float          level;
+    signed int     error;
+} sample_t;
+'''
+
+
+def main():
+    records = 100000
+    for arg in sys.argv[1:]:
+        if arg[:8] == 'records=':
+            records = int(arg[8:])
+        else:
+            print("ERROR: Unknown option %s" % arg)
+            sys.exit(1)
+
+    obj = pycscrape.CScrape()
+    obj.parse_string(SOURCE)
+    size = obj.layout('sample_t').size // 8
+    image = bytearray(numpy.random.default_rng(1).integers(0, 256, size * records, dtype=numpy.uint8).tobytes())
+    # Keep the floats finite, so the results can be compared
+    for n in range(records):
+        image[n * size + 19] = 0x3F
+    image = memoryview(image)
+
+    start = time.time()
+    old = [obj.decode('sample_t', image, n * size) for n in range(records)]
+    old_time = time.time() - start
+
+    start = time.time()
+    samples = numpy.frombuffer(image, obj.numpy_dtype('sample_t'), records)
+    count = obj.member('sample_t', 'count').extract(samples['count'])
+    new_time = time.time() - start
+
+    print("Records     : %d of %d bytes" % (records, size))
+    print("decode()    : %8.3f s  (%11.0f records/s)" % (old_time, records / old_time))
+    print("frombuffer(): %8.3f s  (%11.0f records/s)" % (new_time, records / new_time))
+    print("Speed up    : %8.1fx" % (old_time / new_time))
+    if [value['timestamp'] for value in old] != samples['timestamp'].tolist() or \
+       [value['channel'] for value in old] != samples['channel'].tolist() or \
+       [value['level'] for value in old] != samples['level'].tolist() or \
+       [value['count'] for value in old] != count.tolist():
+        print("ERROR: Results differ")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
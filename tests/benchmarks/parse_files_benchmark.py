@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+#
+# This script compares parsing many C files one at a time with parse_file() against
+# CScrape.parse_files() using a pool of worker processes.
+#
+#  Usage:
+#    parse_files_benchmark.py
+#         Parse 200 generated files with 1, 2, 4 ... up to one worker per CPU
+#    parse_files_benchmark.py  files=600
+#         Parse 600 generated files
+#
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+# Add the library to the library path
+project_folder = os.path.abspath(os.path.dirname(__file__) + '/../..')
+sys.path[0:0] = [project_folder]
+
+import pycscrape
+
+
+# Contents of one generated file. '%d' is replaced by the file number.
+SOURCE = '''
+typedef struct
+{
+    unsigned char id;
+    int values[8];
+    short flags;
+} module%d_t;
+
+enum module%d_state_e { MODULE%d_IDLE, MODULE%d_BUSY = 4, MODULE%d_DONE };
+
+module%d_t module%d_data[16];
+static int module%d_count;
+
+int module%d_step(int x)
+{
+    static int calls;
+    int i;
+    for (i = 0; i < 8; i++)
+    {
+        module%d_data[0].values[i] += x * i;
+    }
+    calls++;
+    return calls + module%d_count;
+}
+'''
+
+
+def main():
+    files = 200
+    for arg in sys.argv[1:]:
+        if arg[:6] == 'files=':
+            files = int(arg[6:])
+        else:
+            print("ERROR: Unknown option %s" % arg)
+            sys.exit(1)
+
+    folder = tempfile.mkdtemp()
+    try:
+        filenames = []
+        for n in range(files):
+            filename = os.path.join(folder, 'module%d.c' % n)
+            with open(filename, 'w') as f:
+                f.write(SOURCE.replace('%d', '%d' % n) * 20)
+            filenames.append(filename)
+
+        serial_time = None
+        workers = 1
+        while workers <= os.cpu_count():
+            obj = pycscrape.CScrape()
+            start = time.time()
+            obj.parse_files(filenames, workers=workers)
+            elapsed = time.time() - start
+            if serial_time == None:
+                serial_time = elapsed
+            print("Workers %3d : %8.3f s  (%5.2fx)" % (workers, elapsed, serial_time / elapsed))
+            workers *= 2
+    finally:
+        shutil.rmtree(folder)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+#
+# This script measures the fixed cost of setting up the pycparser parser.
+#
+#   Cold start - A new process builds the parser with an empty parser table folder.
+#   Warm start - A new process builds the parser with the folder written by the cold start.
+#   Per file   - Parsing many small sources with a new CParser for each one (the old behaviour)
+#                compared to the parser shared by CScrape.
+#
+#  Usage:
+#    parser_startup_benchmark.py
+#         Run the benchmark with 200 sources for the per file test
+#    parser_startup_benchmark.py  files=1000
+#         Run the benchmark with 1000 sources for the per file test
+#
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+# Add the library to the library path
+project_folder = os.path.abspath(os.path.dirname(__file__) + '/../..')
+sys.path[0:0] = [project_folder]
+
+import pycscrape
+
+
+# Run in a new process to time building the parser
+STARTUP_SCRIPT = '''
+import sys, time
+sys.path[0:0] = [%r]
+start = time.time()
+import pycscrape
+pycscrape.CScrape.set_parser_table_dir(%r)
+pycscrape.CScrape().parse_string('int x;\\n')
+print(time.time() - start)
+'''
+
+SOURCE = '''
+typedef struct
+{
+    int a;
+    char b[4];
+} my_type_t;
+my_type_t my_var;
+int my_func(int x) { static int count; return x + count; }
+'''
+
+
+def startup_time(table_dir):
+    script = STARTUP_SCRIPT % (project_folder, table_dir)
+    output = subprocess.check_output([sys.executable, '-c', script])
+    return float(output.decode('utf8').split()[-1])
+
+
+def main():
+    files = 200
+    for arg in sys.argv[1:]:
+        if arg[:6] == 'files=':
+            files = int(arg[6:])
+        else:
+            print("ERROR: Unknown option %s" % arg)
+            sys.exit(1)
+
+    import pycparser
+    print("pycparser   : %s" % pycparser.__version__)
+
+    table_dir = tempfile.mkdtemp()
+    try:
+        cold = startup_time(table_dir)
+        warm = startup_time(table_dir)
+    finally:
+        shutil.rmtree(table_dir)
+    print("Cold start  : %8.3f s" % cold)
+    print("Warm start  : %8.3f s" % warm)
+
+    # Throw the shared parser away before each file to get the old behaviour
+    start = time.time()
+    for i in range(files):
+        pycscrape.CScrape.shared_parser = None
+        obj = pycscrape.CScrape()
+        obj.parse_string(SOURCE)
+    new_parser_time = time.time() - start
+
+    start = time.time()
+    for i in range(files):
+        obj = pycscrape.CScrape()
+        obj.parse_string(SOURCE)
+    shared_parser_time = time.time() - start
+
+    print("%d sources, new parser each time : %8.3f s" % (files, new_parser_time))
+    print("%d sources, shared parser        : %8.3f s" % (files, shared_parser_time))
+
+if __name__ == "__main__":
+    main()
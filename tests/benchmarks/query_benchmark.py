@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+#
+# This script measures how fast variables and enums are looked up (queries per second) with
+# var()/enum() one at a time and with vars_bulk()/enums_bulk().
+#
+#  Usage:
+#    query_benchmark.py
+#         Look up each of 2000 variables and 2000 enum values
+#    query_benchmark.py  count=20000
+#         Look up each of 20000 variables and 20000 enum values
+#
+
+import os
+import sys
+import time
+
+# Add the library to the library path
+project_folder = os.path.abspath(os.path.dirname(__file__) + '/../..')
+sys.path[0:0] = [project_folder]
+
+import pycscrape
+
+
+def make_source(count):
+    lines = []
+    for n in range(count):
+        lines.append('int var%d[%d];' % (n, n % 7 + 1))
+    for n in range(0, count, 10):
+        lines.append('enum e%d { ' % n + ', '.join(['VALUE%d' % m for m in range(n, min(n + 10, count))]) + ' };')
+    return '\n'.join(lines) + '\n'
+
+
+def timed(function, *args):
+    start = time.time()
+    result = function(*args)
+    return time.time() - start, result
+
+
+def main():
+    count = 2000
+    for arg in sys.argv[1:]:
+        if arg[:6] == 'count=':
+            count = int(arg[6:])
+        else:
+            print("ERROR: Unknown option %s" % arg)
+            sys.exit(1)
+
+    obj = pycscrape.CScrape()
+    obj.parse_string(make_source(count), filename='bench.c')
+    var_queries  = [('var%d' % n, 'bench.c') for n in range(count)]
+    enum_queries = ['VALUE%d' % n for n in range(count)]
+
+    def one_at_a_time():
+        obj.model_changed()  # Start with an empty query cache
+        return [obj.var(*query) for query in var_queries] + [obj.enum(query) for query in enum_queries]
+
+    def bulk():
+        obj.model_changed()
+        return obj.vars_bulk(var_queries) + obj.enums_bulk(enum_queries)
+
+    single_time, single = timed(one_at_a_time)
+    bulk_time, results = timed(bulk)
+    queries = 2 * count
+    print("Queries     : %d" % queries)
+    print("var()/enum(): %8.3f s  (%9.0f queries/s)" % (single_time, queries / single_time))
+    print("*_bulk()    : %8.3f s  (%9.0f queries/s)" % (bulk_time, queries / bulk_time))
+    print("Speed up    : %8.1fx" % (single_time / bulk_time))
+    if repr(single) != repr(results):
+        print("ERROR: Results differ")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
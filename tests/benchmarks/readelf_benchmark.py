@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+#
+# This script measures the throughput and peak memory (using tracemalloc) of CScrape.parse_readelf_output(),
+# which reads the output of readelf a line at a time, compared with the original version, which read the
+# whole output into one string. The output is made up like 'readelf --all', with large relocation and DWARF
+# sections around the symbol table. It is also read from a pipe.
+#
+#  Usage:
+#    readelf_benchmark.py
+#         Parse an output with 100000 symbols and 1000000 other lines
+#    readelf_benchmark.py  symbols=500000 lines=5000000
+#         Parse an output with 500000 symbols and 5000000 other lines
+#
+
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Add the library to the library path
+project_folder = os.path.abspath(os.path.dirname(__file__) + '/../..')
+sys.path[0:0] = [project_folder]
+
+import pycscrape
+
+
+# The original parse_readelf_output(), for comparison
+class StringScrape(pycscrape.CScrape):
+    def parse_readelf_output(self, filename):
+        self.materialize_snapshot()
+        data_lines = []
+        with open(filename, 'rb') as f:
+            map_data_str = f.read().decode('utf8')
+        sym_search = re.compile("^Symbol table '.*' contains [0-9]* entries:$", re.MULTILINE)
+        match = sym_search.search(map_data_str)
+        if match == None:
+            raise Exception("No symbol table found in %s" % filename)
+        while match != None:
+            start = match.end()+1
+            while map_data_str[start] != '\n':
+                start += 1
+            start += 1
+            end = map_data_str.find('\n\n', start)
+            if end == -1:
+                end = len(map_data_str)
+            data_lines.extend(map_data_str[start:end].split('\n'))
+            match = sym_search.search(map_data_str, end)
+        file = None
+        for line in data_lines:
+            parts = line.split()
+            data = dict()
+            data['name'] = None
+            data['addr'] = None
+            data['size'] = None
+            data['file'] = None
+            if parts[3] == 'FILE':
+                file = parts[7]
+            if parts[3] == 'FUNC':
+                data['name'] = parts[7]
+                data['addr'] = int(parts[1], base=16)
+                data['size'] = int(parts[2], base=10)
+                data['func'] = None
+                if parts[4] == 'LOCAL':
+                    data['file'] = file
+                self.map_func_data.append(data)
+            if parts[3] == 'OBJECT':
+                if parts[7].find('.') != -1:
+                    parts[7] = parts[7][:parts[7].find('.')]
+                data['name'] = parts[7]
+                data['addr'] = int(parts[1], base=16)
+                data['size'] = int(parts[2], base=10)
+                data['func'] = None
+                if parts[4] == 'LOCAL':
+                    data['file'] = file
+                self.map_var_data.append(data)
+        self.map_var_index.sync(self.map_var_data)
+        self.model_changed()
+
+
+# Write a made up 'readelf --all' output to f
+def write_output(f, symbols, lines):
+    f.write("Relocation section '.rela.text' at offset 0x1000 contains %d entries:\n" % (lines // 2))
+    f.write("  Offset          Info           Type           Sym. Value    Sym. Name + Addend\n")
+    for n in range(lines // 2):
+        f.write("%012x  %012x R_X86_64_PC32     %016x var%d - 4\n" % (n * 4, n, n * 8, n % 1000))
+    f.write("\nSymbol table '.symtab' contains %d entries:\n" % symbols)
+    f.write("   Num:    Value          Size Type    Bind   Vis      Ndx Name\n")
+    for n in range(symbols):
+        if n % 100 == 0:
+            f.write("%6d: 0000000000000000     0 FILE    LOCAL  DEFAULT  ABS module%d.c\n" % (n, n // 100))
+        elif n % 3 == 0:
+            f.write("%6d: %016x    64 FUNC    GLOBAL DEFAULT    2 function%d\n" % (n, 0x10000 + n * 64, n))
+        else:
+            f.write("%6d: %016x     4 OBJECT  LOCAL  DEFAULT    6 variable%d.%d\n" % (n, 0x20000000 + n * 4, n, n))
+    f.write("\nContents of the .debug_info section:\n\n")
+    for n in range(lines - lines // 2):
+        f.write(" <1><%x>: Abbrev Number: 5 (DW_TAG_variable)\n" % n)
+
+
+# Return (time taken, peak memory, obj) to parse the output with the given class. source() returns the
+# filename or file to parse. The peak memory is measured by a second parse, so the time does not include the
+# tracemalloc overhead.
+def measure(scrape_class, source):
+    obj = scrape_class()
+    start = time.time()
+    obj.parse_readelf_output(source())
+    taken = time.time() - start
+    tracemalloc.start()
+    scrape_class().parse_readelf_output(source())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return taken, peak, obj
+
+
+# Start a process writing the file to a pipe and return the pipe, like reading the stdout of readelf
+class Pipe():
+    def __init__(self, filename):
+        self.filename = filename
+
+    def __call__(self):
+        self.process = subprocess.Popen(['cat', self.filename], stdout=subprocess.PIPE)
+        return self.process.stdout
+
+
+def main():
+    symbols = 100000
+    lines = 1000000
+    for arg in sys.argv[1:]:
+        if arg[:8] == 'symbols=':
+            symbols = int(arg[8:])
+        elif arg[:6] == 'lines=':
+            lines = int(arg[6:])
+        else:
+            print("ERROR: Unknown option %s" % arg)
+            sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as folder:
+        filename = os.path.join(folder, 'results.data')
+        with open(filename, 'w') as f:
+            write_output(f, symbols, lines)
+        size = os.path.getsize(filename)
+        old_time, old_peak, old = measure(StringScrape, lambda: filename)
+        new_time, new_peak, new = measure(pycscrape.CScrape, lambda: filename)
+        pipe_time, pipe_peak, pipe = measure(pycscrape.CScrape, Pipe(filename))
+
+    records = len(new.map_var_data) + len(new.map_func_data)
+    print("Output      : %.1f MB, %d symbols" % (size / 1e6, records))
+    print("One string  : %8.3f s  (%6.1f MB/s)  peak %7.1f MB" % (old_time, size / 1e6 / old_time, old_peak / 1e6))
+    print("Streamed    : %8.3f s  (%6.1f MB/s)  peak %7.1f MB" % (new_time, size / 1e6 / new_time, new_peak / 1e6))
+    print("  from pipe : %8.3f s  (%6.1f MB/s)  peak %7.1f MB" % (pipe_time, size / 1e6 / pipe_time, pipe_peak / 1e6))
+    print("Note: the peaks include the symbol records")
+    if old.map_var_data != new.map_var_data or old.map_func_data != new.map_func_data or \
+       pipe.map_var_data != new.map_var_data or pipe.map_func_data != new.map_func_data:
+        print("ERROR: Results differ")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
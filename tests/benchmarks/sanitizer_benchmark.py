@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+#
+# This script compares the speed of CScrape.sanitize() against the three pass
+# remove_comments() / remove_preprocessor() / remove_attributes() path on a synthetic
+# register header.
+#
+#  Usage:
+#    sanitizer_benchmark.py
+#         Run the benchmark on a 4MB source
+#    sanitizer_benchmark.py  size=16
+#         Run the benchmark on a 16MB source
+#
+
+import os
+import sys
+import time
+
+# Add the library to the library path
+project_folder = os.path.abspath(os.path.dirname(__file__) + '/../..')
+sys.path[0:0] = [project_folder]
+
+import pycscrape
+
+
+# One register block of a generated header. '%d' is replaced by the block number.
+BLOCK = '''
+/*
+ * Peripheral %d registers
+ */
+#define PERIPH%d_BASE   (0x40000000UL + (%d * 0x400))   // Base address
+#define PERIPH%d_CTRL   (*(volatile uint32_t *)(PERIPH%d_BASE + 0x00))
+
+typedef struct
+{
+    volatile uint32_t CTRL;     // Control register
+    volatile uint32_t STATUS;   /* Status register */
+    volatile uint16_t DATA[8];  // Data FIFO
+    const char *name;
+} __attribute__((packed, aligned(4))) periph%d_t;
+
+static const char periph%d_name[] __attribute__((used)) = "periph // %d";
+'''
+
+
+def make_source(megabytes):
+    blocks = []
+    size = 0
+    n = 0
+    while size < megabytes * 1024 * 1024:
+        block = BLOCK.replace('%d', '%d' % n)
+        blocks.append(block)
+        size += len(block)
+        n += 1
+    return ''.join(blocks)
+
+
+def three_pass(str):
+    str = pycscrape.CScrape.remove_comments(str)
+    str = pycscrape.CScrape.remove_preprocessor(str)
+    return pycscrape.CScrape.remove_attributes(str)
+
+
+def timed(function, source):
+    start = time.time()
+    result = function(source)
+    return time.time() - start, result
+
+
+def main():
+    megabytes = 4
+    for arg in sys.argv[1:]:
+        if arg[:5] == 'size=':
+            megabytes = int(arg[5:])
+        else:
+            print("ERROR: Unknown option %s" % arg)
+            sys.exit(1)
+
+    source = make_source(megabytes)
+    print("Source size : %d bytes, %d lines" % (len(source), source.count('\n')))
+
+    old_time, old_result = timed(three_pass, source)
+    new_time, new_result = timed(pycscrape.CScrape.sanitize, source)
+
+    print("Three pass  : %8.3f s  (%6.2f MB/s)" % (old_time, megabytes / old_time))
+    print("sanitize()  : %8.3f s  (%6.2f MB/s)" % (new_time, megabytes / new_time))
+    print("Speed up    : %8.1fx" % (old_time / new_time))
+    # remove_comments() moves the text after the end of a multi-line comment one column to the right, so
+    # compare the words on each line rather than the exact strings.
+    if [line.split() for line in old_result.split('\n')] != [line.split() for line in new_result.split('\n')]:
+        print("ERROR: Results differ")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
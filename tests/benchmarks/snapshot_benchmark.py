@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+#
+# This script measures the time from loading a saved model to the answer of the first var() query, using
+# json_load() and snapshot_load(). The model is made up (not parsed) so that it can be large.
+#
+#  Usage:
+#    snapshot_benchmark.py
+#         Use a model with 100000 variables (and map data for each)
+#    snapshot_benchmark.py  symbols=1000000
+#         Use a model with 1000000 variables
+#
+
+import os
+import sys
+import tempfile
+import time
+
+# Add the library to the library path
+project_folder = os.path.abspath(os.path.dirname(__file__) + '/../..')
+sys.path[0:0] = [project_folder]
+
+import pycscrape
+from pycscrape.records import VariableRecord, EnumRecord, EnumValueRecord
+
+
+def make_model(symbols):
+    obj = pycscrape.CScrape()
+    for n in range(symbols):
+        filename = 'src/module%d.c' % (n // 100)
+        line = 'static unsigned int variable%d[4];  /* Variable number %d */' % (n, n)
+        obj.variables.append(VariableRecord({ 'name': 'variable%d' % n, 'filename': filename,
+                                              'line_number': n % 100 + 1, 'line': line, 'exception': None,
+                                              'type': 'unsigned int', 'ptr': 0, 'function': None, 'array': [4],
+                                              'size': 128 }))
+        obj.map_var_data.append({ 'name': 'variable%d' % n, 'addr': 0x20000000 + 16 * n, 'size': 16,
+                                  'file': 'module%d.c' % (n // 100), 'func': None })
+    for n in range(symbols // 100):
+        values = dict()
+        for m in range(10):
+            values['MODULE%d_VALUE%d' % (n, m)] = EnumValueRecord({ 'line_mumber': m + 1, 'line': '', 'value': m })
+        obj.enums.append(EnumRecord({ 'filename': 'src/module%d.h' % n, 'line_number': 1, 'function': None,
+                                      'name': 'module%d_e' % n, 'exception': None, 'values': values }))
+    return obj
+
+
+def main():
+    symbols = 100000
+    for arg in sys.argv[1:]:
+        if arg[:8] == 'symbols=':
+            symbols = int(arg[8:])
+        else:
+            print("ERROR: Unknown option %s" % arg)
+            sys.exit(1)
+
+    obj = make_model(symbols)
+    folder = tempfile.mkdtemp()
+    json_filename = os.path.join(folder, 'model.json')
+    snapshot_filename = os.path.join(folder, 'model.snapshot')
+    start = time.time()
+    with open(json_filename, 'w') as f:
+        f.write(obj.json_dump())
+    json_write_time = time.time() - start
+    start = time.time()
+    obj.snapshot_dump(snapshot_filename)
+    snapshot_write_time = time.time() - start
+    name = 'variable%d' % (symbols // 2)
+
+    start = time.time()
+    json_obj = pycscrape.CScrape()
+    with open(json_filename) as f:
+        json_obj.json_load(f.read())
+    json_value = json_obj.var(name)
+    json_time = time.time() - start
+
+    start = time.time()
+    snapshot_obj = pycscrape.CScrape()
+    snapshot_obj.snapshot_load(snapshot_filename)
+    snapshot_value = snapshot_obj.var(name)
+    snapshot_time = time.time() - start
+
+    print("Symbols          : %d" % symbols)
+    print("File size        : json %d bytes, snapshot %d bytes" % (os.path.getsize(json_filename),
+                                                                   os.path.getsize(snapshot_filename)))
+    print("Write            : json %.3f s, snapshot %.3f s" % (json_write_time, snapshot_write_time))
+    print("json_load()     + var(): %8.1f ms" % (1000 * json_time))
+    print("snapshot_load() + var(): %8.1f ms" % (1000 * snapshot_time))
+    print("Speed up         : %8.1fx" % (json_time / snapshot_time))
+    snapshot_obj.close_snapshot()
+    os.remove(json_filename)
+    os.remove(snapshot_filename)
+    os.rmdir(folder)
+    if repr(json_value) != repr(snapshot_value) or snapshot_value['addr'] != 0x20000000 + 16 * (symbols // 2):
+        print("ERROR: Results differ")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
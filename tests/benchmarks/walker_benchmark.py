@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+#
+# This script measures how fast CScrape walks the pycparser tree (nodes per second), compared
+# with the original recursive parse_node()/handle_node().
+#
+#  Usage:
+#    walker_benchmark.py
+#         Walk the tree of a source with 500 functions
+#    walker_benchmark.py  functions=5000
+#         Walk the tree of a source with 5000 functions
+#
+
+import os
+import sys
+import time
+
+# Add the library to the library path
+project_folder = os.path.abspath(os.path.dirname(__file__) + '/../..')
+sys.path[0:0] = [project_folder]
+
+import pycscrape
+
+
+# One function and its data. '%d' is replaced by the function number. Only every 10th function
+# has a static variable.
+SOURCE = '''
+typedef struct
+{
+    int a;
+    char b[4];
+} type%d_t;
+
+type%d_t data%d[8];
+
+int function%d(int x)
+{
+    int i;
+    int total = 0;
+    %s
+    for (i = 0; i < 8; i++)
+    {
+        total += data%d[i].a * x + (data%d[i].b[0] << 2) - (i % 3);
+        if (total > 1000) { total = total / 2; } else { total = total * 3 + 1; }
+    }
+    return total;
+}
+'''
+
+
+# The original recursive walker, for comparison
+class RecursiveScrape(pycscrape.CScrape):
+    def handle_node(self, node, handlers=None):
+        if 'line' in dir(node.coord) and node.coord.line < self.ignore_until_line_no:
+            pass
+        else:
+            if node.__class__.__name__ == 'FuncDef':
+                self.handle_funcdef(node)
+            if node.__class__.__name__ == 'Decl':
+                self.handle_decl(node)
+            if node.__class__.__name__ == 'Typedef':
+                self.handle_typedef(node)
+            if node.__class__.__name__ == 'Enum':
+                self.handle_enum(node)
+
+    def parse_node(self, node):
+        self.handle_node(node)
+        self.level += 1
+        if 'children' in dir(node):
+            for child_name, child_node in node.children():
+                self.parse_node(child_node)
+            if self.level == 2:
+                self.within_function = None
+        self.level -= 1
+
+
+def count_nodes(node):
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend([child for name, child in node.children()])
+    return count
+
+
+def walk(obj, source, ast):
+    obj.source_lines = [''] + source.split('\n')
+    obj.level = 0
+    start = time.time()
+    obj.parse_node(ast)
+    return time.time() - start
+
+
+def main():
+    functions = 500
+    for arg in sys.argv[1:]:
+        if arg[:10] == 'functions=':
+            functions = int(arg[10:])
+        else:
+            print("ERROR: Unknown option %s" % arg)
+            sys.exit(1)
+
+    parts = []
+    for n in range(functions):
+        static = ''
+        if n % 10 == 0:
+            static = 'static int calls; calls++;'
+        parts.append(SOURCE.replace('%d', '%d' % n).replace('%s', static))
+    source = ''.join(parts)
+    ast = pycscrape.CScrape.get_parser().parse(source)
+    nodes = count_nodes(ast)
+    print("Nodes       : %d" % nodes)
+
+    old = RecursiveScrape()
+    old_time = walk(old, source, ast)
+    new = pycscrape.CScrape()
+    new_time = walk(new, source, ast)
+
+    print("Recursive   : %8.3f s  (%9.0f nodes/s)" % (old_time, nodes / old_time))
+    print("parse_node(): %8.3f s  (%9.0f nodes/s)" % (new_time, nodes / new_time))
+    print("Speed up    : %8.1fx" % (old_time / new_time))
+    if repr(old.variables) != repr(new.variables) or repr(old.functions) != repr(new.functions):
+        print("ERROR: Results differ")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+/*
+ * Source of fixture.elf and fixture32.elf, read by test_dwarf_records_match_the_c_source(). Built with
+ *   gcc -g -O0 -nostdlib -static -Wl,-e,main -Wl,-N -Wl,--build-id=none -fdebug-prefix-map=$PWD=. \
+ *       -o fixture.elf fixture.c fixture2.c
+ *   gcc -m32 -gdwarf-4 -O0 -nostdlib -static -Wl,-e,main -Wl,-N -Wl,--build-id=none -fdebug-prefix-map=$PWD=. \
+ *       -o fixture32.elf fixture.c fixture2.c
+ */
+#include "fixture.h"
+
+enum colour { RED, GREEN = -2, BLUE };
+typedef struct __attribute__((packed)) { char c; int i; } packed_t;
+struct node { struct node *next; long value; void (*visit)(struct node *); };
+typedef rec_t rec_alias_t;
+typedef char *str_t;
+
+rec_t recs[2];
+packed_t packed;
+struct node head;
+enum colour colour = BLUE;
+static str_t names[3];
+const volatile unsigned short status;
+rec_alias_t alias;
+
+int main(void)
+{
+    static int calls = 1;
+    calls++;
+    return calls + other() + (names[0] != 0);
+}
+
+int other(void)
+{
+    static int calls = 2;
+    return calls;
+}
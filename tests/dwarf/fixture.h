@@ -0,0 +1,22 @@
+/*
+ * Types shared by fixture.c and fixture2.c, so that both compile units describe them
+ */
+typedef enum Life_e { DEAD, ALIVE = 5, ZOMBIE } Life_t;
+
+typedef struct { short x; unsigned char y[3]; } point_t;
+
+typedef struct {
+  char c;
+  unsigned int a:3;
+  int b:5;
+  unsigned int z:24;
+  point_t pts[2];
+  struct { int q; float f; } inner;
+  union { int i; unsigned char ch[4]; };
+  double d;
+  int m[2][3];
+  char *p;
+} rec_t;
+
+extern rec_t recs[2];
+int other(void);
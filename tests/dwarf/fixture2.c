@@ -0,0 +1,12 @@
+/*
+ * Second compile unit of fixture.elf. See fixture.c
+ */
+#include "fixture.h"
+
+static int calls = 7;
+Life_t life = ALIVE;
+
+int helper(void)
+{
+    return calls + recs[0].c + life;
+}
@@ -0,0 +1,1148 @@
+#
+# Unit tests for the pycscrape library which do not need a compiler or simulator.
+#
+#  Usage:
+#    python -m pytest tests/test_pycscrape.py
+#
+
+import os
+import sys
+import glob
+import inspect
+import io
+import json
+import mmap
+import pickle
+import struct
+
+# Add the library to the library path
+project_folder = os.path.abspath(os.path.dirname(__file__) + '/..')
+sys.path[0:0] = [project_folder]
+
+import pycscrape
+
+SRC_FILES_DIR = os.path.join(project_folder, 'tests', 'simulator_source_test_files')
+
+
+def three_pass(str):
+    str = pycscrape.CScrape.remove_comments(str)
+    str = pycscrape.CScrape.remove_preprocessor(str)
+    return pycscrape.CScrape.remove_attributes(str)
+
+
+#
+# CScrape.sanitize()
+#
+
+def test_sanitize_matches_three_pass_on_test_sources():
+    for filename in glob.glob(SRC_FILES_DIR + '/*/*.[ch]'):
+        with open(filename) as f:
+            source = f.read()
+        assert pycscrape.CScrape.sanitize(source) == three_pass(source), filename
+
+
+def test_sanitize_preserves_lines_and_columns():
+    source = ('int a; // comment\n'
+              '#define X(a) \\\n'
+              '    (a + 1)\n'
+              '/* multi\n'
+              '   line */ int b __attribute__((aligned(4),\n'
+              '                               section(")"))) = 2;\n'
+              'char *s = "// not a comment";\n')
+    result = pycscrape.CScrape.sanitize(source)
+    assert len(result) == len(source)
+    assert [len(line) for line in result.split('\n')] == [len(line) for line in source.split('\n')]
+    assert result.split('\n')[0].rstrip() == 'int a;'
+    assert result.split('\n')[1].strip() == ''
+    assert result.split('\n')[2].strip() == ''
+    assert result.split('\n')[4].strip() == 'int b'
+    assert result.split('\n')[5].strip() == '= 2;'
+    assert result.split('\n')[6] == 'char *s = "// not a comment";'
+
+
+def test_sanitize_removes_compiler_extensions():
+    source = ('__extension__ typedef unsigned long long u64;\n'
+              '__declspec(dllexport) int x __asm__("x_sym");\n'
+              'void f(void) { __asm__ __volatile__ ("nop" : : : "memory"); }\n')
+    result = pycscrape.CScrape.sanitize(source)
+    assert len(result) == len(source)
+    assert result.split() == ['typedef', 'unsigned', 'long', 'long', 'u64;',
+                              'int', 'x', ';',
+                              'void', 'f(void)', '{', ';', '}']
+    # A directive after comments on its line is removed, as remove_comments() then remove_preprocessor() do
+    source = ('/* c */ #define X 1\n'
+              '  /* a */ /* b */ # include "x.h"\n'
+              'int y; /* two\n lines */ #define Y 2\n'
+              'int z; /* c */ #define Z 3\n')
+    result = pycscrape.CScrape.sanitize(source)
+    assert [len(line) for line in result.split('\n')] == [len(line) for line in source.split('\n')]
+    assert result.split() == three_pass(source).split() == ['int', 'y;', 'int', 'z;', '#define', 'Z', '3']
+
+
+#
+# CScrape.parse_files()
+#
+
+def model(obj):
+    return (repr(obj.functions), repr(obj.variables), repr(obj.enums), repr(obj.typedefs))
+
+
+def test_parser_is_shared_and_reset_by_set_parser_table_dir(tmp_path):
+    first = pycscrape.CScrape()
+    second = pycscrape.CScrape()
+    first.parse_string('int a;\n')
+    second.parse_string('int b;\n')
+    assert first.parser is second.parser is pycscrape.CScrape.get_parser()
+    table_dir = pycscrape.CScrape.parser_table_dir
+    try:
+        pycscrape.CScrape.set_parser_table_dir(str(tmp_path))
+        assert pycscrape.CScrape.shared_parser == None
+        third = pycscrape.CScrape()
+        third.parse_string('int c;\n')
+        assert third.parser is not first.parser and third.parser is pycscrape.CScrape.get_parser()
+        assert third.var('c')['type'] == 'signed int'
+        # Setting the same folder again keeps the parser
+        pycscrape.CScrape.set_parser_table_dir(str(tmp_path))
+        assert pycscrape.CScrape.get_parser() is third.parser
+    finally:
+        pycscrape.CScrape.set_parser_table_dir(table_dir)
+
+
+def test_parse_files_matches_parse_file():
+    filenames = []
+    for test in ('test_01_sizeof', 'test_02_sizeof_user_type', 'test_03_enums', 'test_04_variables'):
+        for name in ('test.h', 'test.c'):
+            if os.path.isfile(os.path.join(SRC_FILES_DIR, test, name)):
+                filenames.append(os.path.join(SRC_FILES_DIR, test, name))
+    serial = pycscrape.CScrape()
+    for filename in filenames:
+        serial.parse_file(filename)
+    parallel = pycscrape.CScrape()
+    parallel.parse_files(filenames, workers=2)
+    assert model(parallel) == model(serial)
+
+
+def test_parse_files_raises_like_parse_file(tmp_path):
+    good = tmp_path / 'good.c'
+    good.write_text('int good_var;\n')
+    bad = tmp_path / 'bad.c'
+    bad.write_text('int bad_var = ;\n')
+    serial = pycscrape.CScrape()
+    serial.parse_file(str(good))
+    try:
+        serial.parse_file(str(bad))
+        assert False, 'No exception'
+    except Exception as e:
+        serial_exception = repr(e)
+    parallel = pycscrape.CScrape()
+    try:
+        parallel.parse_files([str(good), str(bad)], workers=2)
+        assert False, 'No exception'
+    except Exception as e:
+        assert repr(e) == serial_exception
+    assert model(parallel) == model(serial)
+
+
+def test_parse_files_uses_enums_and_variables_of_earlier_files(tmp_path):
+    (tmp_path / 'a.c').write_text('enum ea { A1 = 1, A2, A3 };\n'
+                                  'char buffer[10];\n')
+    (tmp_path / 'c.c').write_text('int arr[A3];\n'
+                                  'int copy[sizeof(buffer)];\n')
+    filenames = [str(tmp_path / 'a.c'), str(tmp_path / 'c.c')]
+    serial = pycscrape.CScrape()
+    for filename in filenames:
+        serial.parse_file(filename)
+    assert serial.var('arr')['array'] == [3] and serial.var('copy')['array'] == [10]
+    parallel = pycscrape.CScrape()
+    parallel.parse_files(filenames, workers=2)
+    assert model(parallel) == model(serial)
+
+
+def test_parse_files_worker_starts_each_file_afresh(tmp_path):
+    (tmp_path / 'a.c').write_text('enum ea { A1 };\n'
+                                  'enum eb { B1 = A1 };\n')
+    (tmp_path / 'b.c').write_text('enum ec { C1 };\n'
+                                  'enum ed { D1 };\n'
+                                  'enum ef { F1 = C1 + 1 };\n')
+    # The worker removes the two enums of a.c, then b.c adds three. The indexes must not keep those of a.c.
+    pycscrape._parse_files_worker_init(pycscrape.CScrape().scrape_state())
+    pycscrape._parse_files_worker(str(tmp_path / 'a.c'), False)
+    results = pycscrape._parse_files_worker(str(tmp_path / 'b.c'), False)[0]
+    assert [enum['exception'] for enum in results['enums']] == [None, None, None]
+    assert results['enums'][2]['values']['F1']['value'] == 1
+
+
+#
+# CScrape.set_scrape_cache()
+#
+
+def test_scrape_cache_hit_gives_same_model(tmp_path):
+    filename = os.path.join(SRC_FILES_DIR, 'test_03_enums', 'test.c')
+    cache_dir = str(tmp_path / 'cache')
+    first = pycscrape.CScrape()
+    first.set_scrape_cache(cache_dir)
+    first.parse_file(filename)
+    assert first.scrape_cache.stats()['misses'] == 1
+    second = pycscrape.CScrape()
+    second.set_scrape_cache(cache_dir)
+    second.parse_file(filename)
+    assert second.scrape_cache.stats()['hits'] == 1
+    assert model(second) == model(first)
+    assert '1 hits' in second.scrape_cache_report()
+
+
+def test_scrape_cache_refreshes_lines_and_evicts(tmp_path):
+    source = tmp_path / 'test.c'
+    cache_dir = str(tmp_path / 'cache')
+    source.write_text('int my_var; // old comment\n')
+    obj = pycscrape.CScrape()
+    obj.set_scrape_cache(cache_dir)
+    obj.parse_file(str(source))
+    # Changing only a comment is a hit, but the source line must be the new one
+    source.write_text('int my_var; // new comment\n')
+    obj = pycscrape.CScrape()
+    obj.set_scrape_cache(cache_dir, max_size=1)
+    obj.parse_file(str(source))
+    assert obj.scrape_cache.hits == 1
+    assert obj.var('my_var')['line'] == 'int my_var; // new comment'
+    # A real change is a miss. The cache is too small to keep anything.
+    source.write_text('int my_var2;\n')
+    obj.parse_file(str(source))
+    assert obj.scrape_cache.misses == 1
+    assert obj.scrape_cache.evictions >= 1
+    assert obj.scrape_cache.size <= 1
+
+
+def test_scrape_cache_with_typedefs(tmp_path):
+    # Each file is parsed after the typedefs of the headers it includes are known
+    filenames = make_include_project(tmp_path)
+    cache_dir = str(tmp_path / 'cache')
+    models = []
+    for misses in (4, 0):
+        obj = pycscrape.CScrape()
+        obj.set_scrape_cache(cache_dir)
+        for filename in filenames:
+            obj.parse_file(filename, follow_includes=True)
+        assert obj.scrape_cache.misses == misses
+        models.append(model(obj))
+    assert models[1] == models[0]
+    # The typedef digest is added to a typedef at a time, but is the same as one made from all of them at once
+    fresh = pycscrape.CScrape()
+    fresh.typedefs = dict(obj.typedefs)
+    assert fresh.scrape_cache_key('', 'x.c') == obj.scrape_cache_key('', 'x.c')
+    # A changed typedef is a miss for the files using it
+    (tmp_path / 'types.h').write_text('typedef struct { int a; } point_t;\n')
+    obj = pycscrape.CScrape()
+    obj.set_scrape_cache(cache_dir)
+    obj.parse_file(filenames[0], follow_includes=True)
+    assert obj.scrape_cache.hits == 0
+    assert obj.var('a_point')['size'] == 32
+
+
+def test_scrape_cache_with_enums_of_earlier_files(tmp_path):
+    # A changed enum value is a miss for the files using it, but not for the others
+    cache_dir = str(tmp_path / 'cache')
+    (tmp_path / 'b.c').write_text('int arr[A3];\n')
+    (tmp_path / 'c.c').write_text('int other;\n')
+    for value, hits in (('A3', 0), ('A3', 3), ('A3 = 5', 1)):
+        (tmp_path / 'a.c').write_text('enum ea { A1 = 1, A2, %s };\n' % value)
+        obj = pycscrape.CScrape()
+        obj.set_scrape_cache(cache_dir)
+        for name in ('a.c', 'b.c', 'c.c'):
+            obj.parse_file(str(tmp_path / name))
+        assert obj.scrape_cache.hits == hits
+        assert obj.var('arr')['array'] == [obj.enum('A3')]
+
+
+#
+# Headers and CScrape.parse_file(follow_includes=True)
+#
+
+def make_include_project(folder):
+    (folder / 'types.h').write_text('typedef struct\n'
+                                    '{\n'
+                                    '    int a;\n'
+                                    '    char b;\n'
+                                    '} point_t;\n'
+                                    'enum colour_e { RED, GREEN };\n')
+    (folder / 'shapes.h').write_text('#include "types.h"\n'
+                                     'typedef point_t line_t[2];\n')
+    (folder / 'a.c').write_text('#include <stdint.h>\n'
+                                '#include "types.h"\n'
+                                'point_t a_point;\n')
+    (folder / 'b.c').write_text('#include "shapes.h"\n'
+                                '#include "types.h"\n'
+                                'point_t b_points[3];\n')
+    return [str(folder / 'a.c'), str(folder / 'b.c')]
+
+
+def test_header_parsed_once():
+    filename = os.path.join(SRC_FILES_DIR, 'test_04_variables', 'test.h')
+    obj = pycscrape.CScrape()
+    obj.parse_file(filename)
+    obj.parse_file(filename)
+    assert len(obj.enums) == 2
+    assert obj.enum('MY_ENUM_H99') == 99
+
+
+def test_follow_includes(tmp_path):
+    filenames = make_include_project(tmp_path)
+    obj = pycscrape.CScrape()
+    for filename in filenames:
+        obj.parse_file(filename, follow_includes=True)
+    assert len(obj.enums) == 1
+    assert sorted(obj.typedefs) == ['line_t', 'point_t']
+    assert obj.var('a_point')['size'] == 64
+    assert obj.var('b_points')['size'] == 3 * 64
+    assert obj.enum('GREEN', filename='types.h') == 1
+
+
+def test_find_includes_skips_comments_and_unused_blocks(tmp_path):
+    for name in 'abcdefg':
+        (tmp_path / ('%s.h' % name)).write_text('typedef int %s_t;\n' % name)
+    source = ('/* #include "a.h" */\n'
+              '#include "b.h" /* c */\n'
+              '// #include "c.h"\n'
+              '#if 0\n'
+              '#include "d.h"\n'
+              '#elif 1\n'
+              '#include "e.h"\n'
+              '#else\n'
+              '#include "f.h"\n'
+              '#endif\n'
+              '/* two\n'
+              '   lines */ #include "g.h"\n'
+              'b_t x;\n')
+    filename = str(tmp_path / 'test.c')
+    obj = pycscrape.CScrape()
+    includes = obj.find_includes(source, filename)
+    assert [(line_number, os.path.basename(name)) for line_number, name in includes] == \
+           [(2, 'b.h'), (7, 'e.h'), (12, 'g.h')]
+    (tmp_path / 'test.c').write_text(source)
+    obj.parse_file(filename, follow_includes=True)
+    assert sorted(obj.typedefs) == ['b_t', 'e_t', 'g_t']
+    assert obj.var('x')['type'] == 'b_t'
+
+
+def test_parse_files_follow_includes(tmp_path):
+    filenames = make_include_project(tmp_path)
+    serial = pycscrape.CScrape()
+    serial.parse_files(filenames, workers=1, follow_includes=True)
+    parallel = pycscrape.CScrape()
+    parallel.parse_files(filenames, workers=2, follow_includes=True)
+    assert model(parallel) == model(serial)
+    assert [v['name'] for v in parallel.variables] == ['a_point', 'b_points']
+
+
+#
+# CScrape.parse_node()
+#
+
+def test_parse_node_function_scopes():
+    obj = pycscrape.CScrape()
+    obj.parse_string('int before;\n'
+                     'int f1(int x) { int local = x; return local * 2; }\n'
+                     'int f2(void)\n'
+                     '{\n'
+                     '    int local;\n'
+                     '    if (local)\n'
+                     '    {\n'
+                     '        static int count;\n'
+                     '        enum { F2_ENUM = 3 } e;\n'
+                     '    }\n'
+                     '    return 0;\n'
+                     '}\n'
+                     'int after;\n', filename='scopes.c')
+    assert [(v['name'], v['function']) for v in obj.variables] == [('before', None), ('count', 'f2'), ('after', None)]
+    assert [f['name'] for f in obj.functions] == ['f1', 'f2']
+    assert obj.enum('F2_ENUM', function='f2') == 3
+
+
+def test_parse_node_deep_nesting():
+    # pycparser needs several stack frames per level, so build the tree first, then walk it with
+    # a recursion limit the old recursive walker could not work with.
+    depth = 200
+    source = 'int deep[1] = ' + '{' * depth + '1' + '}' * depth + ';\n'
+    obj = pycscrape.CScrape()
+    obj.source_lines = [''] + source.split('\n')
+    ast = pycscrape.CScrape.get_parser().parse(source)
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(len(inspect.stack()) + depth // 2)
+    try:
+        obj.parse_node(ast)
+    finally:
+        sys.setrecursionlimit(limit)
+    assert obj.var('deep')['size'] == 32
+
+
+#
+# Indexed var(), enum() and enum_type()
+#
+
+# The original linear search used by var(), for comparison
+def linear_var(obj, name, filename='*', function='*', typename='*'):
+    query = 'var:' + filename + ':' + function + ':' + typename + ':' + name
+    match = None
+    for index in range(len(obj.variables)):
+        v = obj.variables[index]
+        if (name == '*' or name == v['name']) and \
+           (function == '*' or function == v['function']) and \
+           (filename == '*' or filename == os.path.basename(v['filename'])) and \
+           (typename == '*' or typename == v['type']):
+            if match != None:
+                raise Exception("Duplicate variables '%s'  %s:%d and %s:%d" % (query,
+                           v['filename'], v['line_number'],
+                           obj.variables[match]['filename'], obj.variables[match]['line_number']))
+            match = index
+    if match == None:
+        raise Exception("Missing variable '%s'" % query)
+    return dict(obj.variables[match], addr=None)  # There is no map data
+
+
+def outcome(function, *args, **kwargs):
+    try:
+        return repr(function(*args, **kwargs))
+    except Exception as e:
+        return repr(e)
+
+
+def test_indexed_var_matches_linear_search():
+    obj = pycscrape.CScrape()
+    for n, filename in enumerate(['dir1/a.c', 'dir2/a.c', 'b.c']):
+        obj.parse_string('int shared;\n'
+                         'char only_%d;\n'
+                         'void f(void) { static int count; static char name; }\n'
+                         'void g_%d(void) { static int count; }\n' % (n, n), filename=filename)
+        # Query between parses, so the index has to catch up with new records
+        assert obj.var('only_%d' % n)['type'] == 'signed char'
+    for name in ('shared', 'count', 'name', 'only_1', 'missing', '*'):
+        for filename in ('*', 'a.c', 'b.c', 'c.c'):
+            for function in ('*', 'f', 'g_2'):
+                for typename in ('*', 'signed int', 'signed char'):
+                    assert outcome(obj.var, name, filename, function, typename) == \
+                           outcome(linear_var, obj, name, filename, function, typename)
+
+
+def linear_addr(obj, value):
+    match = None
+    for data in obj.map_var_data:
+        if value['name'] == data['name'] and (data['func'] == None or value['function'] == data['func']) and \
+           (data['file'] == None or os.path.basename(value['filename']) == os.path.basename(data['file'])):
+            if match != None:
+                raise Exception("Duplicate variable in map")
+            match = data
+    if match == None:
+        return None
+    return match['addr']
+
+
+def test_var_addresses_match_linear_join():
+    obj = pycscrape.CScrape()
+    obj.parse_string('int global;\nstatic int local;\nvoid f(void) { static int count; }\n', filename='src/a.c')
+    obj.parse_string('static int local;\nint unmapped;\n', filename='src/b.c')
+    obj.map_var_data = [{'name': 'global', 'addr': 0x100, 'size': 4, 'file': None, 'func': None},
+                        {'name': 'local', 'addr': 0x104, 'size': 4, 'file': 'a.c', 'func': None},
+                        {'name': 'local', 'addr': 0x108, 'size': 4, 'file': 'b.c', 'func': None},
+                        {'name': 'count', 'addr': 0x10c, 'size': 4, 'file': 'a.c', 'func': None}]
+    for value in obj.variables:
+        assert obj.var(value['name'], os.path.basename(value['filename']))['addr'] == linear_addr(obj, value)
+    # A symbol appended later is picked up by the index
+    obj.map_var_data.append({'name': 'unmapped', 'addr': 0x200, 'size': 4, 'file': 'b.c', 'func': None})
+    assert obj.resolve_all_addresses() == 5
+    for value in obj.variables:
+        assert value['addr'] == linear_addr(obj, value)
+    # Two symbols for the same variable
+    obj.map_var_data.append({'name': 'global', 'addr': 0x300, 'size': 4, 'file': 'a.c', 'func': None})
+    assert 'Duplicate variable in map' in outcome(obj.var, 'global')
+    assert 'Duplicate variable in map' in outcome(obj.resolve_all_addresses)
+
+
+def test_query_cache_is_invalidated_and_bounded(tmp_path):
+    obj = pycscrape.CScrape()
+    obj.parse_string('int a;\nenum colour { RED, GREEN };\n', filename='a.c')
+    assert obj.var('a')['addr'] == None
+    # Changing the map data must not leave the stale address in the cache
+    map_file = tmp_path / 'a.readelf'
+    map_file.write_text("Symbol table '.symtab' contains 2 entries:\n"
+                        "   Num:    Value  Size Type    Bind   Vis      Ndx Name\n"
+                        "     0: 00000000     0 FILE    LOCAL  DEFAULT  ABS a.c\n"
+                        "     1: 20000000     4 OBJECT  GLOBAL DEFAULT    3 a\n\n")
+    obj.parse_readelf_output(str(map_file))
+    assert obj.var('a')['addr'] == 0x20000000
+    # Results are copies, so changing them does not change the cache or the records
+    obj.var('a')['type'] = 'float'
+    obj.enum_type(typename='colour')['RED']['value'] = 7
+    assert obj.var('a')['type'] == 'signed int'
+    assert obj.enum_type(typename='colour')['RED']['value'] == 0
+    assert 'addr' not in obj.variables[0]
+    # New records are seen by the next query
+    obj.parse_string('int b;\n', filename='b.c')
+    assert obj.var('b')['name'] == 'b'
+    obj.set_query_cache_size(2)
+    for name in ('a', 'b', 'a', 'RED', 'GREEN'):
+        if name in ('RED', 'GREEN'):
+            obj.enum(name)
+        else:
+            obj.var(name)
+    stats = obj.query_cache.stats()
+    assert stats['entries'] == 2
+    assert stats['evictions'] > 0
+    assert stats['hits'] > 0
+    assert stats['generation'] >= 2
+    assert 'Query cache:' in obj.query_cache_report()
+
+
+def test_bulk_queries_match_single_queries():
+    obj = pycscrape.CScrape()
+    obj.parse_string('int a;\nint dup;\nenum colour { RED, GREEN };\nvoid f(void) { static int a; }\n', filename='a.c')
+    obj.parse_string('int dup;\nenum fruit { APPLE, RED_APPLE };\n', filename='b.c')
+    var_queries = ['a', ('a', 'a.c', 'f'), ('a', '*', 'None'), 'dup', ('dup', 'b.c'), 'missing', 'dup', ('a', 'a.c', 'f')]
+    enum_queries = ['RED', ('GREEN', 'a.c'), 'APPLE', ('APPLE', '*', '*', 'colour'), 'RED']
+    results = obj.vars_bulk(var_queries) + obj.enums_bulk(enum_queries)
+    obj.model_changed()
+    expected = [outcome(obj.var, *((query,) if isinstance(query, str) else query)) for query in var_queries] + \
+               [outcome(obj.enum, *((query,) if isinstance(query, str) else query)) for query in enum_queries]
+    assert [repr(result) for result in results] == expected
+    assert isinstance(results[5], Exception)
+    # Repeated queries give separate copies
+    assert results[1] == results[7] and results[1] is not results[7]
+    assert isinstance(obj.vars_bulk([('a', '*', '*', '*', 'extra')])[0], Exception)
+
+
+def test_records_behave_like_dicts():
+    obj = pycscrape.CScrape()
+    obj.parse_string('typedef struct { int a[2]; char b; } pair_t;\n'
+                     'enum colour { RED, GREEN };\n'
+                     'pair_t pairs[3];\n'
+                     'unsigned int counter;\n'
+                     'int f(int x) { return x; }\n', filename='a.c')
+    record = obj.variables[0]
+    assert dict(record) == {'name': 'pairs', 'filename': 'a.c', 'line_number': 3, 'line': 'pair_t pairs[3];',
+                            'exception': None, 'type': 'pair_t', 'ptr': 0, 'function': None, 'array': [3],
+                            'size': 3 * 96}
+    assert record == dict(record) and 'enum_name' not in record and record.get('enum_name') == None
+    assert list(record.keys())[:3] == ['name', 'filename', 'line_number']
+    record['note'] = 'extra'
+    assert record['note'] == 'extra' and len(record) == 11
+    del record['note']
+    # The array of a query result is a list, which can be changed without changing the record
+    array = obj.var('pairs')['array']
+    array.append(4)
+    assert array == [3, 4] and record['array'] == [3]
+    # Type names are shared between records
+    obj.parse_string('unsigned int other;\n', filename='b.c')
+    assert obj.var('counter')['type'] is obj.var('other')['type']
+    # json_dump()/json_load() and pickle give back the same records
+    new = pycscrape.CScrape()
+    new.json_load(obj.json_dump())
+    assert model(new) == model(obj)
+    assert isinstance(new.typedefs['pair_t']['types'][0], pycscrape.records.TypedefElementRecord)
+    assert isinstance(new.enums[0]['values']['RED'], pycscrape.records.EnumValueRecord)
+    assert repr(pickle.loads(pickle.dumps(obj.enums))) == repr(obj.enums)
+
+
+def test_snapshot_matches_json_dump(tmp_path):
+    obj = pycscrape.CScrape()
+    for test in ('test_01_sizeof', 'test_02_sizeof_user_type', 'test_03_enums', 'test_04_variables'):
+        for name in ('test.h', 'test.c'):
+            if os.path.isfile(os.path.join(SRC_FILES_DIR, test, name)):
+                obj.parse_file(os.path.join(SRC_FILES_DIR, test, name))
+    obj.parse_string('int not_constant[count];\n', filename='bad.c')
+    map_file = tmp_path / 'test.readelf'
+    map_file.write_text("Symbol table '.symtab' contains 3 entries:\n"
+                        "   Num:    Value  Size Type    Bind   Vis      Ndx Name\n"
+                        "     0: 00000000     0 FILE    LOCAL  DEFAULT  ABS test.c\n"
+                        "     1: 20000010     4 OBJECT  LOCAL  DEFAULT    3 my_var\n"
+                        "     2: 00010000    20 FUNC    GLOBAL DEFAULT    2 main\n\n")
+    obj.parse_readelf_output(str(map_file))
+    errors = [record for record in obj.variables + obj.functions + obj.enums if record['exception'] != None]
+    assert len(errors) > 0
+    obj.snapshot_dump(str(tmp_path / 'model.snapshot'))
+    new = pycscrape.CScrape()
+    new.snapshot_load(str(tmp_path / 'model.snapshot'))
+    # Exceptions are stored as their class name and message
+    for record in errors:
+        matches = [other for other in new.variables + new.functions + new.enums
+                   if other['line_number'] == record['line_number'] and other['filename'] == record['filename']]
+        assert [repr(other['exception']) for other in matches] == [repr(record['exception'])]
+        record['exception'] = None
+    for record in new.variables + new.functions + new.enums:
+        record['exception'] = None
+    assert json.loads(new.json_dump()) == json.loads(obj.json_dump())
+    # Queries give the same results
+    for record in obj.variables:
+        assert outcome(new.var, record['name'], os.path.basename(record['filename'])) == \
+               outcome(obj.var, record['name'], os.path.basename(record['filename']))
+    for record in obj.enums:
+        assert outcome(new.enum_type, typename=record['name']) == outcome(obj.enum_type, typename=record['name'])
+        for name in record['values']:
+            assert outcome(new.enum, name, os.path.basename(record['filename'])) == \
+                   outcome(obj.enum, name, os.path.basename(record['filename']))
+    assert new.type_size('my_type1') == obj.type_size('my_type1')
+    # Parsing more source reads the whole snapshot first
+    new.parse_string('int extra;\n', filename='extra.c')
+    assert new.snapshot == None and new.var('extra')['name'] == 'extra'
+    assert len(new.variables) == len(obj.variables) + 1
+
+
+def test_json_dump_to_and_load_from_stream_records(tmp_path):
+    obj = pycscrape.CScrape()
+    obj.parse_file(os.path.join(SRC_FILES_DIR, 'test_02_sizeof_user_type', 'test.c'))
+    obj.parse_string('int cafe; /* µs é */\nenum e { A, B };\nint not_constant[count];\n', filename='unicode.c')
+    assert any(record['exception'] != None for record in obj.variables)
+    # The streamed text is what json.dumps() would give, with exceptions as portable error records
+    text = obj.json_dump()
+    assert text == json.dumps(dict(obj.json_sections()), default=pycscrape.records.portable_default)
+    assert '"error": "SyntaxError"' in text
+    filename = str(tmp_path / 'model.json')
+    with open(filename, 'w') as f:
+        obj.json_dump_to(f)
+    assert open(filename).read() == text
+    for mode in ('r', 'rb'):
+        new = pycscrape.CScrape()
+        with open(filename, mode) as f:
+            new.json_load_from(f)
+        assert model(new) == model(obj)
+    # Values split across chunks, including part way through a UTF-8 character
+    reader = pycscrape.json_stream.JsonStreamReader(io.BytesIO(text.encode('utf8')), chunk_size=3)
+    data = dict()
+    for key in reader.members():
+        data[key] = reader.value()
+    assert data == json.loads(text)
+
+
+def test_duplicate_typedefs_are_compared_by_structure():
+    header = 'typedef struct {\n  unsigned char a;\n  int b[2];\n} pair_t;\ntypedef unsigned int id_t;\n'
+    obj = pycscrape.CScrape()
+    obj.parse_string(header, filename='a.c')
+    # The same typedefs on other lines of another file are not duplicates
+    obj.parse_string('\n\n' + header, filename='b.c')
+    assert obj.typedefs['pair_t']['filename'] == 'a.c'
+    assert obj.typedefs['pair_t'].fingerprint() == \
+           pycscrape.records.typedef_fingerprint(dict(obj.typedefs['pair_t']))
+    # A different element type is found, and reported
+    message = outcome(obj.parse_string, header.replace('unsigned char a', 'signed char a'), 'c.c')
+    assert "Duplicate typedef name 'pair_t' in c.c:4 and a.c:4" in message
+    assert "types[0].type_name 'signed char' != 'unsigned char'" in message
+    message = outcome(obj.parse_string, header.replace('b[2]', 'b[3]'), 'd.c')
+    assert 'size 96 != 64' in message and 'types[1].array [3] != [2]' in message
+
+
+def test_layout_of_nested_structs_unions_and_bit_fields():
+    # The offsets below are those given by gcc for x86-64, which lays out these types as AAPCS does.
+    header = ('typedef struct {\n'
+              '  char c;\n'
+              '  unsigned int a:3;\n'
+              '  unsigned int b:30;\n'
+              '  int :0;\n'
+              '  short s:4;\n'
+              '  struct inner { char x; double d; } in[2];\n'
+              '  union { int i; char ch[6]; };\n'
+              '  unsigned char *p;\n'
+              '} outer_t;\n'
+              'typedef struct {\n'
+              '  outer_t o;\n'
+              '  union { short h; int w; } u;\n'
+              '} wrapper_t;\n')
+    obj = pycscrape.CScrape()
+    obj.POINTER_SIZE = 64
+    obj.parse_string(header)
+    assert obj.variables == []
+    layout = obj.layout('outer_t')
+    assert (layout.size, layout.alignment) == (512, 64)
+    offsets = [(field.path, field.offset, field.size) for field in layout.fields]
+    assert offsets == [('c', 0, 8), ('a', 8, 3), ('b', 32, 30), ('s', 64, 4), ('in', 128, 256), ('in.x', 128, 8),
+                       ('in.d', 192, 64), ('i', 384, 32), ('ch', 384, 48), ('p', 448, 64)]
+    a = obj.member('outer_t', 'a')
+    assert (a.unit_offset, a.unit_size, a.shift, a.mask) == (0, 32, 8, 0x700)
+    assert a.extract(0x5 << 8) == 5
+    assert obj.member('wrapper_t', 'o.in.d').offset == 192
+    assert obj.member('wrapper_t', 'u.w').offset == obj.member('wrapper_t', 'u.h').offset == 512
+    assert obj.type_size('wrapper_t') == obj.layout('wrapper_t').size == 576
+    assert 'unknown member' in outcome(obj.member, 'outer_t', 'z').lower()
+    # Layouts are only built once, but are built again for a big endian configuration
+    builds = obj.layout_engine.builds
+    obj.layout('wrapper_t')
+    assert obj.layout_engine.builds == builds
+    obj.endian = 'big'
+    assert obj.member('outer_t', 'a').shift == 32 - 8 - 3
+    # The nested types are kept by json_dump()
+    copy = pycscrape.CScrape()
+    copy.json_load(obj.json_dump())
+    assert copy.typedefs['outer_t'].fingerprint() == obj.typedefs['outer_t'].fingerprint()
+
+
+def test_collate_types_table():
+    obj = pycscrape.CScrape()
+    for names, expected in ((['int'], 'signed int'), (['short', 'unsigned', 'int'], 'unsigned short'),
+                            (['long', 'signed', 'long'], 'signed long long'), (['long', 'double'], 'double long'),
+                            (['unsigned'], 'unsigned int'), (['char'], 'signed char'), (['my_t'], 'my_t')):
+        assert obj.collate_types(list(names)) == expected
+    # Canonical names are canonical
+    for name in obj.types:
+        assert obj.canonical_type(name) == name
+    assert obj.type_size('long long') == obj.type_size('signed long long') == 64
+    assert obj.type_alignment('short int') == 16
+    obj.DEFAULT_CHAR_SIGN = 'unsigned'
+    assert obj.collate_types(['char']) == 'unsigned char'
+
+
+def test_constant_expressions_are_evaluated_as_c():
+    # The expected values are those printed by gcc, with a 32 bit long
+    source = ("enum { A = 0x10UL, B = 017, C = 0b101, D = 'a', E = '\\n', F = '\\x41', G = '\\101', H = 7 / -2,\n"
+              "       I = -7 % 3, J = -1 < 0u, K = (1 ? 5 : 6), L = (unsigned char)300, M = (signed char)200,\n"
+              "       N = sizeof(int) * 3, O = sizeof(long long), P = !0 + (3 > 2) + (2 >= 3) + (1 && 0) + (0 || 2),\n"
+              "       Q = ~0u >> 28, R = 1 << 4 | 3, S = (short)-1 & 0xF, T = A + B, U = sizeof(char[10]),\n"
+              "       V = (int)2.9, W = '\\xff', X = 10 % -3, Y = sizeof(1L), Z = 'ab', AB = -0x80000000 > 0 };\n"
+              "int table[T * 2];\n"
+              "int copy[sizeof(table) / sizeof(table[0]) + 1];\n")
+    obj = pycscrape.CScrape()
+    obj.parse_string(source)
+    values = { name: value['value'] for name, value in obj.enums[0]['values'].items() }
+    assert values == { 'A': 16, 'B': 15, 'C': 5, 'D': 97, 'E': 10, 'F': 65, 'G': 65, 'H': -3, 'I': -1, 'J': 0,
+                       'K': 5, 'L': 44, 'M': -56, 'N': 12, 'O': 8, 'P': 3, 'Q': 15, 'R': 19, 'S': 15, 'T': 31,
+                       'U': 10, 'V': 2, 'W': -1, 'X': 1, 'Y': 4, 'Z': 24930, 'AB': 1 }
+    assert obj.var('table')['array'] == [62]
+    # 'table[0]' is not a constant expression that can be evaluated
+    assert 'ArrayRef' in repr(obj.variables[1]['exception'])
+    for bad in ('int x[1 / 0];', 'int x[unknown];', 'int x[1.5 % 2];'):
+        obj = pycscrape.CScrape()
+        obj.parse_string(bad + '\n')
+        assert isinstance(obj.variables[0]['exception'], SyntaxError)
+
+
+def test_decode_and_encode_match_gcc_bytes():
+    # The bytes of 'rec' written by a program built with gcc for x86-64, which has 64 bit pointers and
+    # aligns structs to their largest member.
+    header = ('typedef unsigned int uint;\n'
+              'typedef struct { short x; unsigned char y[3]; } point_t;\n'
+              'typedef struct {\n'
+              '  char c;\n'
+              '  unsigned int a:3;\n'
+              '  int b:5;\n'
+              '  unsigned int z:24;\n'
+              '  point_t pts[2];\n'
+              '  struct { int q; float f; } inner;\n'
+              '  union { int i; unsigned char ch[4]; };\n'
+              '  double d;\n'
+              '  uint u;\n'
+              '  int m[2][3];\n'
+              '  char *p;\n'
+              '} rec_t;\n'
+              'rec_t rec;\n'
+              'enum colour { RED, GREEN } colour;\n')
+    data = bytes.fromhex('fdcd0000efcdab00feff0000000000000000c800f7ffffff0000c03f040302010000000000000240'
+                         '4d0000000000000000000000000000000000000000000000faffffff000000003412000000000000')
+    obj = pycscrape.CScrape()
+    obj.POINTER_SIZE = 64
+    obj.STRUCT_ALIGNMENT = 8
+    obj.parse_string(header)
+    value = obj.decode('rec', memoryview(b'\xff' * 16 + data), 16)
+    assert value == { 'c': -3, 'a': 5, 'b': -7, 'z': 0xABCDEF, 'pts': [{ 'x': -2, 'y': [0, 0, 0] },
+                      { 'x': 0, 'y': [0, 0, 200] }], 'inner': { 'q': -9, 'f': 1.5 }, 'i': 0x01020304,
+                      'ch': [4, 3, 2, 1], 'd': 2.25, 'u': 77, 'm': [[0, 0, 0], [0, 0, -6]], 'p': 0x1234 }
+    assert obj.encode('rec_t', value) == data
+    # Missing members are zero and only the given member of a union is written
+    value = obj.decode('rec_t', obj.encode('rec_t', { 'ch': [9], 'b': -3 }))
+    assert (value['b'], value['ch'], value['i'], value['a'], value['pts'][1]) == \
+           (-3, [9, 0, 0, 0], 9, 0, { 'x': 0, 'y': [0, 0, 0] })
+    assert obj.decode('colour', (1).to_bytes(4, 'little')) == 1
+    assert obj.codec('rec') is obj.codec('rec')
+    # Values of a typedef'd enum take the space of an ENUM_TYPE, as 'enum colour' does
+    obj.parse_string('typedef enum { A, B } e_t;\n'
+                     'typedef struct { e_t e; char c; } s_t;\n'
+                     'e_t v;\n')
+    assert obj.layout('s_t').size == 64 and obj.member('s_t', 'c').offset == 32
+    assert obj.encode('s_t', { 'e': 1, 'c': 2 }) == b'\x01\0\0\0\x02\0\0\0'
+    assert obj.decode('s_t', b'\x01\0\0\0\x02\0\0\0') == { 'e': 1, 'c': 2 }
+    assert obj.encode('v', 1) == b'\x01\0\0\0'
+    # Big endian bit fields are placed from the most significant bit
+    obj.endian = 'big'
+    assert obj.encode('rec_t', { 'a': 5, 'b': -7, 'z': 0xABCDEF })[:8].hex() == '00b90000abcdef00'
+    assert obj.decode('colour', (1).to_bytes(4, 'big')) == 1
+
+
+def test_numpy_dtype_decodes_arrays_of_structs():
+    header = ('typedef struct { short x; unsigned char y[3]; } point_t;\n'
+              'typedef struct {\n'
+              '  char c;\n'
+              '  unsigned int a:3;\n'
+              '  int b:5;\n'
+              '  point_t pts[2];\n'
+              '  union { int i; unsigned char ch[4]; };\n'
+              '  double d;\n'
+              '  char *p;\n'
+              '} sample_t;\n'
+              'sample_t samples[3];\n')
+    obj = pycscrape.CScrape()
+    obj.POINTER_SIZE = 64
+    obj.STRUCT_ALIGNMENT = 8
+    obj.parse_string(header)
+    numpy = pycscrape.dtypes.numpy
+    if numpy == None:
+        assert outcome(obj.numpy_dtype, 'sample_t') == repr(ImportError("numpy_dtype() needs NumPy, which is not installed"))
+        return
+    values = [{ 'c': -n, 'a': n, 'b': -n, 'pts': [{ 'x': n, 'y': [1, 2, n] }, { 'x': -1, 'y': [] }],
+                'i': 0x01020300 + n, 'd': n / 4.0, 'p': 0x1000 + n } for n in range(3)]
+    for endian in ('little', 'big'):
+        obj.endian = endian
+        dtype = obj.numpy_dtype('sample_t')
+        assert dtype.itemsize == 40 and obj.numpy_dtype('samples').shape == (3,)
+        data = b''.join([obj.encode('sample_t', value) for value in values])
+        samples = numpy.frombuffer(data, dtype)
+        assert list(samples['c']) == [0, -1, -2] and list(samples['d']) == [0.0, 0.25, 0.5]
+        assert samples['pts']['y'][2].tolist() == [[1, 2, 2], [0, 0, 0]]
+        assert list(samples['ch'][1]) == ([1, 3, 2, 1] if endian == 'little' else [1, 2, 3, 1])
+        assert list(obj.member('sample_t', 'a').extract(samples['a'])) == [0, 1, 2]
+        assert list(obj.member('sample_t', 'b').extract(samples['b'])) == [0, -1, -2]
+        assert list(samples['p']) == [0x1000, 0x1001, 0x1002]
+
+
+def test_ctype_views_of_a_memory_image(tmp_path):
+    header = ('typedef struct { short x; unsigned char y[3]; } point_t;\n'
+              'typedef union { int i; unsigned char ch[4]; } word_t;\n'
+              'typedef struct {\n'
+              '  char c;\n'
+              '  unsigned int a:3;\n'
+              '  int b:5;\n'
+              '  point_t pts[2];\n'
+              '  union { int i; struct { unsigned char lo; unsigned int hi:4; }; };\n'
+              '  word_t w;\n'
+              '  double d;\n'
+              '  char *p;\n'
+              '} rec_t;\n'
+              'rec_t recs[2];\n')
+    obj = pycscrape.CScrape()
+    obj.POINTER_SIZE = 64
+    obj.STRUCT_ALIGNMENT = 8
+    obj.parse_string(header)
+    value = { 'c': -3, 'a': 5, 'b': -7, 'pts': [{ 'x': -2, 'y': [1, 2, 3] }, { 'x': 9 }], 'i': 0x2A7,
+              'w': { 'ch': [1, 2, 3, 4] }, 'd': 2.25, 'p': 0x1234 }
+    for endian in ('little', 'big'):
+        obj.endian = endian
+        filename = tmp_path / ('image_%s.bin' % endian)
+        filename.write_bytes(b'\xff' * 8 + obj.encode('rec_t', value) * 2)
+        with open(filename, 'r+b') as f:
+            image = mmap.mmap(f.fileno(), 0)
+            recs = obj.view('recs', image, 8)
+            rec = recs[1]
+            assert ctypes_size(obj, 'rec_t') == 40 and len(recs) == 2
+            assert (rec.c, rec.a, rec.b, rec.pts[0].x, list(rec.pts[0].y), rec.pts[1].x, rec.d, rec.p) == \
+                   (-3, 5, -7, -2, [1, 2, 3], 9, 2.25, 0x1234)
+            lo, hi = (0xA7, 2) if endian == 'little' else (0, 0)
+            assert (rec.i, rec.lo, rec.hi, list(rec.w.ch)) == (0x2A7, lo, hi, [1, 2, 3, 4])
+            # Writes go to the image
+            rec.b = -2
+            rec.pts[1].y[2] = 7
+            assert obj.decode('rec_t', image, 8 + 40)['b'] == -2
+            assert obj.decode('rec_t', image, 8 + 40)['pts'][1]['y'] == [0, 0, 7]
+            del recs, rec
+            image.close()
+    # The classes are kept for each configuration
+    assert obj.ctype('rec_t') is obj.ctype('rec_t')
+    big = obj.ctype('rec_t')
+    obj.endian = 'little'
+    assert obj.ctype('rec_t') is not big
+    obj.endian = 'big'
+    assert obj.ctype('rec_t') is big
+
+
+def ctypes_size(obj, name):
+    return pycscrape.ctype_classes.ctypes.sizeof(obj.ctype(name))
+
+
+def test_readelf_symbols_are_streamed():
+    text = ("ELF Header:\n  Magic:   7f 45 4c 46\n\n"
+            "Symbol table '.dynsym' contains 2 entries:\n"
+            "   Num:    Value  Size Type    Bind   Vis      Ndx Name\n"
+            "     0: 00000000     0 NOTYPE  LOCAL  DEFAULT  UND \n"
+            "     1: 00010044    76 FUNC    GLOBAL DEFAULT    2 print_str\n"
+            "\n"
+            "Relocation section '.rel.text' at offset 0x1000 contains 1 entry:\n"
+            " Offset     Info    Type            Sym.Value  Sym. Name\n"
+            "00010010  00000102 R_ARM_ABS32       00010044   print_str\n\n"
+            "Symbol table '.symtab' contains 5 entries:\n"
+            "   Num:    Value  Size Type    Bind   Vis      Ndx Name\n"
+            "    28: 00000000     0 FILE    LOCAL  DEFAULT  ABS test.c\n"
+            "    34: 00010438     4 OBJECT  LOCAL  DEFAULT    6 my_static_function_var.4270\n"
+            "    35: 20000000 0x186a0 OBJECT  GLOBAL DEFAULT    6 big_buffer\n"
+            "    36: 000102b4   384 FUNC    LOCAL  DEFAULT    5 helper\r\n"
+            "    37: 00010440     4 OBJECT  GLOBAL DEFAULT    6 my_int_var\n")
+    symbols = list(pycscrape.readelf.iter_symbols(io.StringIO(text)))
+    assert symbols == [('func', { 'name': 'print_str', 'addr': 0x10044, 'size': 76, 'file': None, 'func': None }),
+                       ('var',  { 'name': 'my_static_function_var', 'addr': 0x10438, 'size': 4, 'file': 'test.c',
+                                  'func': None }),
+                       ('var',  { 'name': 'big_buffer', 'addr': 0x20000000, 'size': 100000, 'file': None,
+                                  'func': None }),
+                       ('func', { 'name': 'helper', 'addr': 0x102b4, 'size': 384, 'file': 'test.c', 'func': None }),
+                       ('var',  { 'name': 'my_int_var', 'addr': 0x10440, 'size': 4, 'file': None, 'func': None })]
+    # Binary files (e.g. the stdout of readelf) give the same symbols
+    obj = pycscrape.CScrape()
+    obj.parse_string('int my_int_var;\n', filename='test.c')
+    obj.parse_readelf_output(io.BytesIO(text.encode('utf8')))
+    assert obj.map_func_data == [symbols[0][1], symbols[3][1]]
+    assert obj.map_var_data == [symbols[1][1], symbols[2][1], symbols[4][1]]
+    assert obj.var('my_int_var')['addr'] == 0x10440
+    # Symbols are given as the lines are read
+    def lines():
+        for line in io.StringIO(text):
+            yield line
+        raise AssertionError('Read past the first symbol')
+    assert next(pycscrape.readelf.iter_symbols(lines()))[1]['name'] == 'print_str'
+    assert outcome(list, pycscrape.readelf.iter_symbols(io.StringIO('ELF Header:\n'), 'a.readelf')) == \
+           repr(Exception('No symbol table found in a.readelf'))
+
+
+# Return the bytes of an ELF file with a '.symtab' section holding the symbols, which are tuples of
+# (name, value, size, type, bind) e.g. ('main', 0x8000, 20, 2, 1). The types are 1 OBJECT, 2 FUNC and 4 FILE.
+def make_elf(elf_class, endian, symbols):
+    prefix = '<' if endian == 'little' else '>'
+    if elf_class == 32:
+        header, section, symbol = 'HHIIIIIHHHHHH', 'IIIIIIIIII', 'IIIBBH'
+    else:
+        header, section, symbol = 'HHIQQQIHHHHHH', 'IIQQQQIIQQ', 'IBBHQQ'
+    strings = b'\0'
+    entries = [struct.pack(prefix + symbol, *([0] * 6))]
+    for name, value, size, kind, bind in symbols:
+        info = (bind << 4) | kind
+        if elf_class == 32:
+            entries.append(struct.pack(prefix + symbol, len(strings), value, size, info, 0, 1))
+        else:
+            entries.append(struct.pack(prefix + symbol, len(strings), info, 0, 1, value, size))
+        strings += name.encode('utf8') + b'\0'
+    symtab = b''.join(entries)
+    section_names = b'\0.strtab\0.symtab\0.shstrtab\0'
+    ident = b'\x7fELF' + bytes([1 if elf_class == 32 else 2, 1 if endian == 'little' else 2, 1]) + b'\0' * 9
+    header_size = 16 + struct.calcsize(prefix + header)
+    strtab_offset = header_size
+    symtab_offset = strtab_offset + len(strings)
+    names_offset = symtab_offset + len(symtab)
+    sections_offset = names_offset + len(section_names)
+    section_size = struct.calcsize(prefix + section)
+    data = ident + struct.pack(prefix + header, 2, 40, 1, 0x8000, 0, sections_offset, 0, header_size, 0, 0,
+                               section_size, 4, 3)
+    data += strings + symtab + section_names
+    data += struct.pack(prefix + section, *([0] * 10))
+    data += struct.pack(prefix + section, 1, 3, 0, 0, strtab_offset, len(strings), 0, 0, 1, 0)
+    # sh_info is the index of the first GLOBAL symbol
+    data += struct.pack(prefix + section, 9, 2, 0, 0, symtab_offset, len(symtab), 1,
+                        1 + len([s for s in symbols if s[4] == 0]), 4, len(entries[0]))
+    data += struct.pack(prefix + section, 17, 3, 0, 0, names_offset, len(section_names), 0, 0, 1, 0)
+    return data
+
+
+def test_elf_symbols_match_readelf_output(tmp_path):
+    symbols = [('crt0.s', 0, 0, 4, 0),
+               ('test.c', 0, 0, 4, 0),
+               ('my_static_function_var.4270', 0x10438, 4, 1, 0),
+               ('helper', 0x102b5, 384, 2, 0),
+               ('$d', 0x10160, 0, 0, 0),
+               ('', 0, 0, 4, 0),
+               ('my_int_var', 0x10440, 4, 1, 1),
+               ('main', 0x80000000, 0x186a0, 2, 1)]
+    lines = ["Symbol table '.symtab' contains %d entries:" % (len(symbols) + 1),
+             "   Num:    Value  Size Type    Bind   Vis      Ndx Name",
+             "     0: 00000000     0 NOTYPE  LOCAL  DEFAULT  UND "]
+    for n, (name, value, size, kind, bind) in enumerate(symbols):
+        lines.append('%6d: %08x %5s %-7s %-6s DEFAULT    1 %s' % (n + 1, value, size if size < 100000 else hex(size),
+                     { 0: 'NOTYPE', 1: 'OBJECT', 2: 'FUNC', 4: 'FILE' }[kind], ['LOCAL', 'GLOBAL'][bind], name))
+    text = pycscrape.CScrape()
+    text.parse_readelf_output(io.StringIO('\n'.join(lines) + '\n\n'))
+    assert [data['file'] for data in text.map_var_data + text.map_func_data] == ['test.c', None, 'test.c', None]
+    for elf_class, endian in ((32, 'big'), (32, 'little'), (64, 'little'), (64, 'big')):
+        filename = tmp_path / ('test%d%s.elf' % (elf_class, endian))
+        filename.write_bytes(make_elf(elf_class, endian, symbols))
+        obj = pycscrape.CScrape()
+        obj.parse_elf(str(filename))
+        assert obj.map_var_data == text.map_var_data
+        assert obj.map_func_data == text.map_func_data
+    filename = tmp_path / 'test.readelf'
+    filename.write_text('\n'.join(lines))
+    assert outcome(obj.parse_elf, str(filename)) == repr(Exception('%s is not an ELF file' % filename))
+
+
+def test_dwarf_records_match_the_c_source():
+    folder = os.path.join(project_folder, 'tests', 'dwarf')
+    for elf_file, bits in (('fixture.elf', 64), ('fixture32.elf', 32)):
+        obj = pycscrape.CScrape()
+        source = pycscrape.CScrape()
+        # DWARF gives the sizes of the types, so only the C source depends on the configuration
+        for scrape in (obj, source):
+            scrape.POINTER_SIZE = 64
+            scrape.STRUCT_ALIGNMENT = 8
+        obj.parse_dwarf(os.path.join(folder, elf_file))
+        source.parse_file(os.path.join(folder, 'fixture.h'))
+        symbols = pycscrape.CScrape()
+        symbols.parse_elf(os.path.join(folder, elf_file))
+        # The layouts are those of the compiler. gcc lays out rec_t for i386 with 4 byte aligned doubles and
+        # pointers, so only point_t is the same as the x86-64 C source for both.
+        assert obj.typedefs['point_t'].fingerprint() == source.typedefs['point_t'].fingerprint()
+        if bits == 64:
+            assert obj.typedefs['rec_t'].fingerprint() == source.typedefs['rec_t'].fingerprint()
+        assert obj.type_size('rec_alias_t') == obj.layout('rec_t').size
+        assert obj.var('recs')['size'] == 2 * obj.layout('rec_t').size
+        assert [(field.path, field.offset) for field in obj.layout('packed_t').fields] == [('c', 0), ('i', 8)]
+        assert obj.decode('packed_t', bytes([1, 2, 0, 0, 0])) == { 'c': 1, 'i': 2 }
+        node = obj.typedefs['struct node']['types']
+        assert [(e['var_name'], e['type_name'], e['ptr']) for e in node] == \
+               [('next', 'struct node', 1), ('value', 'signed long', 0), ('visit', 'void', 1)]
+        assert obj.var('head')['type'] == 'struct node'
+        assert (obj.enum('GREEN'), obj.enum('BLUE'), obj.enum('ZOMBIE', typename='Life_t')) == (-2, -1, 6)
+        names = obj.var('names')
+        assert (names['type'], names['ptr'], names['array'], names['size']) == ('signed char', 1, [3], 3 * bits)
+        assert obj.var('status')['type'] == 'unsigned short'
+        # The three static variables called 'calls' are told apart by their function (or file)
+        addresses = [symbol['addr'] for symbol in symbols.map_var_data if symbol['name'] == 'calls']
+        assert sorted([obj.var('calls', function='main')['addr'], obj.var('calls', function='other')['addr'],
+                       obj.var('calls', filename='fixture2.c')['addr']]) == sorted(addresses)
+        assert obj.var('calls', function='main')['addr'] != obj.var('calls', function='other')['addr']
+
+
+GNU_LD_MAP = '''Allocating common symbols
+Common symbol       size              file
+
+buffer              0x40              build/main.o
+
+Memory Configuration
+
+Name             Origin             Length             Attributes
+*default*        0x0000000000000000 0xffffffffffffffff
+
+Linker script and memory map
+
+LOAD build/main.o
+                0x0000000000400158                . = (SEGMENT_START ("text-segment", 0x400000) + SIZEOF_HEADERS)
+
+.text           0x0000000000401000       0x62
+ *(.text .stub .text.* .gnu.linkonce.t.*)
+ .text.main     0x0000000000401000       0x34 build/main.o
+                0x0000000000401000                main
+ .text.helper   0x0000000000401034        0xc build/main.o
+ .text          0x0000000000401040       0x22 lib/libutil.a(util.o)
+                0x0000000000401040                util_init
+                0x0000000000401050                util_run
+
+.rodata         0x0000000000402000        0x8
+ .rodata.str1.1
+                0x0000000000402000        0x8 build/main.o
+.data           0x0000000000403000       0x18
+ .data.counter  0x0000000000403000        0x4 build/main.o
+                0x0000000000403000                counter
+ *fill*         0x0000000000403004        0x4 
+ .data.my_static_function_var.4270
+                0x0000000000403008        0x4 build/main.o
+                0x0000000000403018                _edata = .
+                [!provide]                        PROVIDE (edata = .)
+.bss            0x0000000000403020       0x40
+ COMMON         0x0000000000403020       0x40 build/main.o
+                0x0000000000403020                buffer
+OUTPUT(results.elf elf64-x86-64)
+'''
+
+ARMLINK_MAP = '''Component: ARM Compiler 5.06 update 6 (build 750) Tool: armlink [4d35ed]
+
+==============================================================================
+
+Image Symbol Table
+
+    Local Symbols
+
+    Symbol Name                              Value     Ov Type        Size  Object(Section)
+
+    main.c                                   0x00000000   Number         0  main.o ABSOLUTE
+    i.main                                   0x08000110   Section        0  main.o(i.main)
+    calls                                    0x20000000   Data           4  main.o(.data)
+
+    Global Symbols
+
+    Symbol Name                              Value     Ov Type        Size  Object(Section)
+
+    main                                     0x08000111   Thumb Code    40  main.o(i.main)
+    counter                                  0x20000004   Data           4  main.o(.data)
+
+==============================================================================
+
+Memory Map of the image
+'''
+
+
+def test_parse_output_sniffs_the_format(tmp_path):
+    elf_file = os.path.join(project_folder, 'tests', 'dwarf', 'fixture.elf')
+    symbols = pycscrape.CScrape()
+    symbols.parse_elf(elf_file)
+    obj = pycscrape.CScrape()
+    obj.parse_output(elf_file)
+    assert obj.map_var_data == symbols.map_var_data and obj.map_func_data == symbols.map_func_data
+    readelf_output = ("Symbol table '.symtab' contains 3 entries:\n"
+                      "   Num:    Value  Size Type    Bind   Vis      Ndx Name\n"
+                      "     1: 00000000     0 FILE    LOCAL  DEFAULT  ABS main.c\n"
+                      "     2: 20000000     4 OBJECT  LOCAL  DEFAULT    2 calls.1\n\n")
+    obj = pycscrape.CScrape()
+    obj.parse_output(io.StringIO(readelf_output))
+    assert obj.map_var_data == [{ 'name': 'calls', 'addr': 0x20000000, 'size': 4, 'file': 'main.c', 'func': None }]
+    gnu = pycscrape.CScrape()
+    filename = tmp_path / 'results.map'
+    filename.write_text(GNU_LD_MAP)
+    gnu.parse_output(str(filename))
+    assert [(d['name'], d['addr'], d['size'], d['file']) for d in gnu.map_func_data] == \
+           [('main', 0x401000, 0x34, None), ('helper', 0x401034, 0xc, 'main.c'), ('util_init', 0x401040, None, None),
+            ('util_run', 0x401050, None, None)]
+    assert [(d['name'], d['addr'], d['size'], d['file']) for d in gnu.map_var_data] == \
+           [('counter', 0x403000, 4, None), ('my_static_function_var', 0x403008, 4, 'main.c'),
+            ('buffer', 0x403020, 0x40, None)]
+    # A pipe (or any file object) is read once, in text or binary mode
+    for stream in (io.BytesIO(GNU_LD_MAP.encode('utf8')), io.StringIO(GNU_LD_MAP)):
+        obj = pycscrape.CScrape()
+        obj.parse_output(stream)
+        assert obj.map_var_data == gnu.map_var_data and obj.map_func_data == gnu.map_func_data
+    obj = pycscrape.CScrape()
+    obj.parse_output(io.BytesIO(ARMLINK_MAP.encode('utf8')))
+    assert obj.map_var_data == [{ 'name': 'calls', 'addr': 0x20000000, 'size': 4, 'file': 'main.c', 'func': None },
+                                { 'name': 'counter', 'addr': 0x20000004, 'size': 4, 'file': None, 'func': None }]
+    assert obj.map_func_data == [{ 'name': 'main', 'addr': 0x08000111, 'size': 40, 'file': None, 'func': None }]
+    # Errors are reported, rather than another format being tried
+    assert outcome(obj.parse_output, io.StringIO('Hello\n')) == repr(Exception('Unknown map file format of map file'))
+    filename.write_text(GNU_LD_MAP[:GNU_LD_MAP.index('Linker script')])
+    assert outcome(obj.parse_output, str(filename)) == repr(Exception('No memory map found in %s' % filename))
+    filename.write_text(ARMLINK_MAP[:ARMLINK_MAP.index('Image Symbol')])
+    assert 'No image symbol table found' in outcome(obj.parse_output, str(filename))
+
+
+def test_addr_lookup_finds_members_and_array_items():
+    obj = pycscrape.CScrape()
+    obj.POINTER_SIZE = 64
+    obj.STRUCT_ALIGNMENT = 8
+    obj.parse_dwarf(os.path.join(project_folder, 'tests', 'dwarf', 'fixture.elf'))
+    recs = obj.var('recs')['addr']
+    size = obj.layout('rec_t').size // 8
+    pts = obj.member('rec_t', 'pts').offset // 8
+    match = obj.addr_lookup(recs + size + pts + 6 + 2)
+    assert (match.kind, match.name, match.offset, match.path, match.index) == ('var', 'recs', size + pts + 8,
+                                                                              '[1].pts[1].y[0]', (1, 1, 0))
+    assert match.field is obj.member('rec_t', 'pts.y') and match.remainder == 0
+    assert obj.addr_lookup(recs + size + obj.member('rec_t', 'inner.q').offset // 8 + 2).location() == \
+           'recs[1].inner.q+0x2'
+    assert obj.addr_lookup(obj.var('calls', function='other')['addr']).variable['function'] == 'other'
+    main = [data for data in obj.map_func_data if data['name'] == 'main'][0]
+    assert obj.addr_lookup(main['addr'] + 3).location() == 'main+0x3'
+    # The bulk lookup (NumPy searchsorted if installed) gives the same as a linear search of the map data
+    symbols = [(data['name'], data['addr'], data['size']) for data in obj.map_var_data + obj.map_func_data]
+    addresses = list(range(min(s[1] for s in symbols) - 4, max(s[1] + s[2] for s in symbols) + 4))
+    expected = []
+    for address in addresses:
+        names = [s for s in symbols if s[1] <= address < s[1] + max(s[2], 1)]
+        expected.append(names[0][0] if len(names) == 1 else None)
+    matches = obj.addr_lookup_bulk(addresses)
+    assert [match and match.name for match in matches] == expected
+    numpy = pycscrape.address_index.numpy
+    try:
+        pycscrape.address_index.numpy = None      # bisect
+        obj.address_index.reset()
+        assert [match and match.name for match in obj.addr_lookup_bulk(addresses)] == expected
+    finally:
+        pycscrape.address_index.numpy = numpy
+    assert [obj.addr_lookup(address) and obj.addr_lookup(address).path for address in addresses[::7]] == \
+           [match and match.path for match in matches[::7]]
+    # The index is built again when the map data changes
+    obj.map_var_data.append({ 'name': 'extra', 'addr': 0x10, 'size': 4, 'file': None, 'func': None })
+    assert obj.addr_lookup(0x12).location() == 'extra+0x2' and obj.addr_lookup(0x14) == None